@@ -75,19 +75,252 @@ def calculate_spread_cost(contracts_closed, config):
         return 0.0
     return contracts_closed * config['lot_size'] * config['avg_spread_points']
 
+# --- Array versions (vectors of contracts, prices and SOFR rates) ---
+
+def build_margin_tier_table(config):
+    """Precomputes sorted tier limits/rates and the cumulative margin rate at each tier boundary."""
+    tiers = sorted(config['margin_tiers'], key=lambda x: x['limit'])
+    limits = np.array([tier['limit'] for tier in tiers], dtype=float)
+    rates = np.array([tier['rate'] for tier in tiers], dtype=float)
+    lower_limits = np.concatenate([[0.0], limits[:-1]])
+    # cumulative[k] = margin (per unit of price * lot size) for all contracts below tier k
+    cumulative = np.concatenate([[0.0], np.cumsum((limits - lower_limits) * rates)])
+    return {'limits': limits, 'lower_limits': lower_limits, 'rates': rates, 'cumulative': cumulative}
+
+
+def _valid_positions(contracts, prices):
+    return (contracts > 0) & (prices > 0) & ~np.isnan(contracts) & ~np.isnan(prices)
+
+
+def calculate_margin_array(num_contracts, index_prices, config, tier_table=None):
+    """Vectorised calculate_margin: tiered margin looked up with searchsorted on a precomputed tier table."""
+    num_contracts = np.asarray(num_contracts, dtype=float)
+    index_prices = np.asarray(index_prices, dtype=float)
+    if tier_table is None:
+        tier_table = build_margin_tier_table(config)
+    limits = tier_table['limits']
+    lot_size = config['lot_size']
+    notional_value = num_contracts * index_prices * lot_size
+    valid = _valid_positions(num_contracts, index_prices)
+    if len(limits) == 0:
+        return np.zeros(np.broadcast(num_contracts, index_prices).shape)
+
+    # Contracts beyond the last tier limit carry no margin, as in the scalar loop.
+    contracts_in_tiers = np.clip(np.where(valid, num_contracts, 0.0), 0.0, limits[-1])
+    tier = np.minimum(np.searchsorted(limits, contracts_in_tiers, side='left'), len(limits) - 1)
+    margin_rate_units = (tier_table['cumulative'][tier]
+                         + (contracts_in_tiers - tier_table['lower_limits'][tier]) * tier_table['rates'][tier])
+    margin = margin_rate_units * index_prices * lot_size
+
+    fallback = np.minimum(notional_value, config.get('initial_capital', 1e9))
+    margin = np.where(np.isfinite(margin), np.minimum(margin, notional_value), fallback)
+    return np.where(valid, margin, 0.0)
+
+
+def calculate_daily_financing_cost_array(contracts, prices, sofr_rates, config, is_short):
+    """Vectorised calculate_daily_financing_cost (positive = cost, negative = credit)."""
+    contracts = np.asarray(contracts, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    sofr_rates = np.asarray(sofr_rates, dtype=float)
+    fee = config['broker_annual_financing_fee']
+    notional = contracts * config['lot_size'] * prices
+    # Short positions receive (SOFR - fee); long positions pay (SOFR + fee).
+    financing = np.where(is_short, -(notional * (sofr_rates - fee)), notional * (sofr_rates + fee))
+    financing = financing / config['days_in_year_financing']
+    valid = _valid_positions(contracts, prices) & ~np.isnan(sofr_rates)
+    return np.where(valid, financing, 0.0)
+
+
+def calculate_daily_borrowing_cost_array(contracts, prices, config, is_short):
+    """Vectorised calculate_daily_borrowing_cost (short positions only)."""
+    contracts = np.asarray(contracts, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+    notional = contracts * config['lot_size'] * prices
+    borrowing_cost = (notional * config['borrowing_cost_annual']) / config['days_in_year_financing']
+    return np.where(_valid_positions(contracts, prices) & np.asarray(is_short, dtype=bool), borrowing_cost, 0.0)
+
+
+def calculate_spread_cost_array(contracts_closed, config):
+    """Vectorised calculate_spread_cost."""
+    contracts_closed = np.asarray(contracts_closed, dtype=float)
+    spread_cost = contracts_closed * config['lot_size'] * config['avg_spread_points']
+    return np.where((contracts_closed > 0) & ~np.isnan(contracts_closed), spread_cost, 0.0)
+
+
+def calculate_position_costs_array(contracts, prices, sofr_rates, contracts_closed, config, is_short, tier_table=None):
+    """Margin, daily financing, daily borrowing and spread costs for vectors of positions in one call."""
+    return {
+        'margin': calculate_margin_array(contracts, prices, config, tier_table),
+        'financing': calculate_daily_financing_cost_array(contracts, prices, sofr_rates, config, is_short),
+        'borrowing': calculate_daily_borrowing_cost_array(contracts, prices, config, is_short),
+        'spread': calculate_spread_cost_array(contracts_closed, config),
+    }
+
+# --- Cost-model backends for the Model B engine ---
+# A cost model turns SOFR and S&P 500 price series into per-day financing/borrow
+# accrual factors (and their running sums) before the simulation loop, and exposes
+# the scalar margin/spread parameters the engine kernel needs. Financing accrues
+# per "financing unit" of an open short CFD: the entry notional for FlatCostModel,
+# the number of index units (contracts * lot size) for TieredCostModel.
+
+class FlatCostModel:
+    """
+    The original Model B cost model: the short CFD earns (SOFR - broker fee) / 365
+    on its entry notional, margin is a flat percentage of notional and closing
+    costs a percentage of the notional at close.
+    """
+    name = 'flat'
+
+    def __init__(self, broker_fee_annualized, spread_cost_percent, margin_percent, days_in_year=365.0):
+        self.broker_fee_annualized = float(broker_fee_annualized)
+        self.spread_cost_percent = float(spread_cost_percent)
+        self.margin_percent = float(margin_percent)
+        self.days_in_year = float(days_in_year)
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(cfg.BROKER_FEE_ANNUALIZED, cfg.SPREAD_COST_PERCENT, cfg.CFD_INITIAL_MARGIN_PERCENT)
+
+    def daily_financing_factors(self, sofr_rates, sp500_prices):
+        """Financing credit per unit of entry notional for each day held."""
+        return (np.asarray(sofr_rates, dtype=float) - self.broker_fee_annualized) / self.days_in_year
+
+    def daily_borrow_factors(self, sofr_rates, sp500_prices):
+        return np.zeros(np.shape(sofr_rates))
+
+    def kernel_params(self):
+        """(margin_percent, spread_cost_percent, spread_points, financing_per_index_unit, lot_size, tier table...)"""
+        empty = np.empty(0)
+        return (self.margin_percent, self.spread_cost_percent, 0.0, False, 1.0, empty, empty, empty, empty)
+
+    def accrual_curves(self, sofr_rates, sp500_prices):
+        return accrual_curves(self, sofr_rates, sp500_prices)
+
+    def financing_units(self, notional, entry_price):
+        return notional
+
+    def margin(self, amount_to_hedge, price):
+        return self.margin_percent * amount_to_hedge
+
+    def close_cost(self, notional, entry_price, price):
+        return self.spread_cost_percent * (notional * (price / entry_price))
+
+    def as_dict(self):
+        return {'name': self.name, 'broker_fee_annualized': self.broker_fee_annualized,
+                'spread_cost_percent': self.spread_cost_percent, 'margin_percent': self.margin_percent,
+                'days_in_year': self.days_in_year}
+
+
+class TieredCostModel:
+    """
+    The tiered CFD cost model of this module: tiered margin on the number of
+    contracts, (SOFR - fee) financing credit and a borrowing charge on the
+    current notional, and a fixed number of spread points per contract closed.
+    """
+    name = 'tiered'
+
+    def __init__(self, config):
+        self.config = dict(config)
+        self.tier_table = build_margin_tier_table(self.config)
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(cfg.CFD_TIERED_COSTS)
+
+    def daily_financing_factors(self, sofr_rates, sp500_prices):
+        """Financing credit per index unit held; -calculate_daily_financing_cost for one unit."""
+        sofr_rates = np.asarray(sofr_rates, dtype=float)
+        annual_rate = sofr_rates - self.config['broker_annual_financing_fee']
+        return np.asarray(sp500_prices, dtype=float) * annual_rate / self.config['days_in_year_financing']
+
+    def daily_borrow_factors(self, sofr_rates, sp500_prices):
+        """Borrowing charge per index unit held; calculate_daily_borrowing_cost for one unit."""
+        borrow_rate = self.config['borrowing_cost_annual']
+        return np.asarray(sp500_prices, dtype=float) * borrow_rate / self.config['days_in_year_financing']
+
+    def kernel_params(self):
+        table = self.tier_table
+        return (0.0, 0.0, self.config['avg_spread_points'], True, self.config['lot_size'],
+                table['limits'], table['lower_limits'], table['rates'], table['cumulative'])
+
+    def accrual_curves(self, sofr_rates, sp500_prices):
+        return accrual_curves(self, sofr_rates, sp500_prices)
+
+    def financing_units(self, notional, entry_price):
+        return notional / entry_price
+
+    def margin(self, amount_to_hedge, price):
+        contracts = amount_to_hedge / (price * self.config['lot_size'])
+        margin = calculate_margin_array(contracts, price, self.config, self.tier_table)
+        return margin if np.ndim(margin) else float(margin)
+
+    def close_cost(self, notional, entry_price, price):
+        spread_cost = calculate_spread_cost_array(notional / (entry_price * self.config['lot_size']), self.config)
+        return spread_cost if np.ndim(spread_cost) else float(spread_cost)
+
+    def as_dict(self):
+        return {'name': self.name, 'config': self.config}
+
+
+COST_MODELS = {FlatCostModel.name: FlatCostModel, TieredCostModel.name: TieredCostModel}
+
+
+def cost_model_from_config(cfg):
+    """Builds the cost model selected by cfg.CFD_COST_MODEL ('flat' if unset)."""
+    name = getattr(cfg, 'CFD_COST_MODEL', FlatCostModel.name)
+    if name not in COST_MODELS:
+        raise ValueError(f"Unknown CFD cost model '{name}'. Choose from {sorted(COST_MODELS)}.")
+    return COST_MODELS[name].from_config(cfg)
+
+
+def cost_model_from_dict(data):
+    """Rebuilds a cost model from its as_dict() form (e.g. a simulator checkpoint)."""
+    data = dict(data)
+    name = data.pop('name')
+    if name == TieredCostModel.name:
+        return TieredCostModel(data['config'])
+    return FlatCostModel(**data)
+
+
+def accrual_curves(cost_model, sofr_rates, sp500_prices):
+    """
+    Per-day net financing factors plus cumulative financing and borrow curves.
+    Each cumulative array has a leading 0 so the accrual for holding one
+    financing unit over days [start, end) is curve[end] - curve[start].
+    NaN SOFR rates count as 0, as in the engine. The engines only use 'net_daily';
+    the cumulative curves serve holding_cost for ad-hoc per-position queries.
+    """
+    sofr_rates = np.nan_to_num(np.asarray(sofr_rates, dtype=float), nan=0.0)
+    financing = cost_model.daily_financing_factors(sofr_rates, sp500_prices)
+    borrow = cost_model.daily_borrow_factors(sofr_rates, sp500_prices)
+    return {
+        'net_daily': financing - borrow,
+        'financing_cumulative': np.concatenate([[0.0], np.cumsum(financing)]),
+        'borrow_cumulative': np.concatenate([[0.0], np.cumsum(borrow)]),
+    }
+
+
+def holding_cost(curves, financing_units, start, end):
+    """
+    Net carrying cost (positive = cost) of financing_units held over days [start, end).
+    An analysis helper on accrual_curves; no simulation engine calls it.
+    """
+    financing = curves['financing_cumulative'][end] - curves['financing_cumulative'][start]
+    borrow = curves['borrow_cumulative'][end] - curves['borrow_cumulative'][start]
+    return financing_units * (borrow - financing)
+
 if __name__ == '__main__':
-     # Example requires config_loader
-    from CFD_Simulation.scripts.config import load_config
+    import config as cfg
+    cost_config = dict(cfg.CFD_TIERED_COSTS, initial_capital=cfg.INITIAL_CAPITAL)
     try:
-        cfg = load_config('../../config/params.yaml') # Adjust path
         print("\nCost Model Examples:")
-        print(f"Margin for 10 contracts at 4000: {calculate_margin(10, 4000, cfg):.2f}")
-        print(f"Margin for 30 contracts at 4000: {calculate_margin(30, 4000, cfg):.2f}")
-        print(f"Financing (short, SOFR=0.015): {calculate_daily_financing_cost(10, 4000, 0.015, cfg, True):.2f}") # Should be credit
-        print(f"Financing (short, SOFR=0.05): {calculate_daily_financing_cost(10, 4000, 0.05, cfg, True):.2f}") # Should be more credit
-        print(f"Financing (long, SOFR=0.015): {calculate_daily_financing_cost(10, 4000, 0.015, cfg, False):.2f}") # Should be cost
-        print(f"Borrowing (short): {calculate_daily_borrowing_cost(10, 4000, cfg, True):.2f}")
-        print(f"Borrowing (long): {calculate_daily_borrowing_cost(10, 4000, cfg, False):.2f}")
-        print(f"Spread cost closing 10 contracts: {calculate_spread_cost(10, cfg):.2f}")
+        print(f"Margin for 10 contracts at 4000: {calculate_margin(10, 4000, cost_config):.2f}")
+        print(f"Margin for 30 contracts at 4000: {calculate_margin(30, 4000, cost_config):.2f}")
+        print(f"Financing (short, SOFR=0.015): {calculate_daily_financing_cost(10, 4000, 0.015, cost_config, True):.2f}") # Cost while SOFR < fee
+        print(f"Financing (short, SOFR=0.05): {calculate_daily_financing_cost(10, 4000, 0.05, cost_config, True):.2f}") # Credit
+        print(f"Financing (long, SOFR=0.015): {calculate_daily_financing_cost(10, 4000, 0.015, cost_config, False):.2f}") # Should be cost
+        print(f"Borrowing (short): {calculate_daily_borrowing_cost(10, 4000, cost_config, True):.2f}")
+        print(f"Borrowing (long): {calculate_daily_borrowing_cost(10, 4000, cost_config, False):.2f}")
+        print(f"Spread cost closing 10 contracts: {calculate_spread_cost(10, cost_config):.2f}")
     except Exception as e:
         print(f"Failed cost model tests: {e}")
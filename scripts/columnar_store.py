@@ -0,0 +1,124 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import pandas as pd
+import numpy as np
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def _column_file(name, used):
+    """File name for a column: sanitised, and unique within the store."""
+    base = re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+    file_name, suffix = f"{base}.npy", 1
+    while file_name in used:
+        file_name, suffix = f"{base}_{suffix}.npy", suffix + 1
+    used.add(file_name)
+    return file_name
+
+
+def _write_columns(df, tmp_path, float32_columns, metadata):
+    """Writes the column files and manifest of a store into tmp_path."""
+    columns, used = [], set()
+    for name in df.columns:
+        series = df[name]
+        file_name = _column_file(str(name), used)
+        if pd.api.types.is_datetime64_any_dtype(series):
+            kind, values = 'datetime', series.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        elif pd.api.types.is_bool_dtype(series):
+            kind, values = 'bool', np.packbits(series.to_numpy(dtype=bool))
+        elif pd.api.types.is_integer_dtype(series):
+            kind, values = 'int', series.to_numpy(dtype=np.int64)
+        else:
+            dtype = np.float32 if name in float32_columns else np.float64
+            kind, values = 'float', series.to_numpy(dtype=dtype)
+        np.save(os.path.join(tmp_path, file_name), np.ascontiguousarray(values))
+        columns.append({'name': str(name), 'file': file_name, 'kind': kind, 'dtype': str(values.dtype)})
+
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump({'n_rows': len(df), 'columns': columns, 'metadata': metadata or {}}, f, indent=1)
+
+
+def write_columnar_store(df, path, float32_columns=(), metadata=None):
+    """
+    Writes a DataFrame as a directory of one .npy file per column plus a JSON manifest.
+    Datetimes are stored as int64 nanoseconds, booleans bit-packed, floats as float64
+    (or float32 for `float32_columns`). The store is built in a private temporary
+    directory next to `path`, then the old store is renamed aside, the new one renamed
+    into place and the old one removed, so readers never see a half-written store and
+    concurrent writers never share a build directory (the last one to finish wins).
+    """
+    parent, base = os.path.split(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=f".{base}.", suffix='.tmp', dir=parent)
+    try:
+        _write_columns(df, tmp_path, float32_columns, metadata)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    old_path = f"{tmp_path[:-len('.tmp')]}.old"
+    while True:
+        try:
+            os.replace(path, old_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(tmp_path, path)
+            break
+        except OSError:
+            if not os.path.exists(path):
+                raise
+            # Another writer swapped its store in between our renames; move it aside too.
+            shutil.rmtree(old_path, ignore_errors=True)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+class ColumnarStore:
+    """
+    Read side of a columnar store: every column is opened as a read-only memory map,
+    so only the pages of the columns (and rows) actually used are ever read.
+    Dates come back as datetime64[ns] views of the mapped int64 data; bit-packed
+    booleans are the one column kind that has to be unpacked into memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        self.n_rows = manifest['n_rows']
+        self.metadata = manifest.get('metadata', {})
+        self._columns = {column['name']: column for column in manifest['columns']}
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def column(self, name, rows=slice(None)):
+        """Zero-copy view of one column (except booleans), optionally restricted to a row slice."""
+        spec = self._columns[name]
+        values = np.load(os.path.join(self.path, spec['file']), mmap_mode='r')
+        if spec['kind'] == 'bool':
+            return np.unpackbits(values, count=self.n_rows).astype(bool)[rows]
+        if spec['kind'] == 'datetime':
+            return values.view('datetime64[ns]')[rows]
+        return values[rows]
+
+    def row_range(self, start_date=None, end_date=None, date_column='date'):
+        """Row slice covering [start_date, end_date], found by binary search on the sorted date column."""
+        dates = self.column(date_column)
+        start = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), 'left'))
+        end = len(dates) if end_date is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date)), 'right'))
+        return slice(start, end)
+
+    def to_frame(self, columns=None, rows=slice(None)):
+        """DataFrame over the mapped arrays for the requested columns (all by default)."""
+        names = self.columns if columns is None else [name for name in self.columns if name in columns]
+        return pd.DataFrame({name: self.column(name, rows) for name in names}, copy=False)
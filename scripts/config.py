@@ -3,6 +3,24 @@ FMP_API_KEY = "m8TZJWQFGH7G6x2nowAqKdzDfAyakr0T" # Please use your own API key
 SOFR_CSV_FILEPATH = 'SOFR.csv'
 TARGET_SOFR_COL_NAME = 'SOFR' # Column name for processed SOFR rate
 
+# --- Market Data Fetching ---
+FMP_BASE_URL = "https://financialmodelingprep.com/api/v3" # Point at a local FMPStubServer for offline tests
+FETCH_BACKEND = 'threads' # 'threads' or 'asyncio'
+FETCH_MAX_WORKERS = 8 # Concurrent requests / pooled connections
+FETCH_MAX_RETRIES = 3 # Retries for network errors, HTTP 429 and 5xx responses
+FETCH_BACKOFF_SECONDS = 0.5 # Exponential backoff base between retries
+
+# --- Market Data Cache ---
+MARKET_DATA_CACHE_DIR = 'data/cache' # Set to None to always download the full history from FMP
+MARKET_DATA_SEED_CSV = 'data/combined_market_data_from_api.csv' # Seeds an empty cache (offline start)
+
+# --- Prepared Market Data Store ---
+MARKET_DATA_STORE_DIR = 'data/store' # Memory-mapped columnar copy of the prepared frame; None to disable
+
+# --- Pipeline Stage Cache ---
+STAGE_CACHE_DIR = 'data/stage_cache' # Memoised data/signal/simulation/metric stages; None to disable
+STAGE_CACHE_MAX_BYTES = 512 * 1024 ** 2 # Least recently used entries are evicted beyond this size
+
 # --- Data Fetching & General Simulation Period ---
 START_DATE = "2019-01-01"
 END_DATE = "2025-05-21" # Ensure this covers all analysis periods
@@ -18,6 +36,9 @@ CASH_ALLOC_A = 1.0 - EQUITY_ALLOC_A # Calculated for consistency
 EQUITY_ALLOC_B = 0.80
 CASH_ALLOC_B = 1.0 - EQUITY_ALLOC_B # Calculated for consistency
 MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM = 0.70 # Hedge ratio for the VIX momentum strategy
+MODEL_B_REBALANCE_POLICY = 'daily' # Event engine only: 'daily', 'periodic', 'drift' or 'signal_only'
+MODEL_B_REBALANCE_PERIOD_DAYS = 21 # 'periodic': rebalance every N trading days
+MODEL_B_REBALANCE_DRIFT_THRESHOLD = 0.05 # 'drift': rebalance when the equity weight is off target by more than this
 
 # --- VIX Momentum Signal Generation Parameters ---
 MOMENTUM_LOOKBACK_PERIOD = 5
@@ -31,6 +52,19 @@ VIX_ABSOLUTE_COVER_THRESHOLD = 20.0
 BROKER_FEE_ANNUALIZED = 0.025 # 2.5% annual fee for CFD financing (subtracted from SOFR for CFD P&L)
 SPREAD_COST_PERCENT = 0.0002 # 0.02% of notional value as spread cost on closing CFD
 CFD_INITIAL_MARGIN_PERCENT = 0.05 # 5% initial margin on CFD notional
+CFD_COST_MODEL = 'flat' # 'flat' (the three parameters above) or 'tiered' (CFD_TIERED_COSTS via cfd_cost_model.py)
+CFD_TIERED_COSTS = {
+    'lot_size': 1.0, # Index points per contract ($1 per point)
+    'margin_tiers': [ # Margin rate per tier of contracts (limit = cumulative contract count)
+        {'limit': 50, 'rate': 0.05},
+        {'limit': 200, 'rate': 0.10},
+        {'limit': 1_000_000, 'rate': 0.20},
+    ],
+    'broker_annual_financing_fee': 0.025, # Subtracted from SOFR for short financing
+    'days_in_year_financing': 360,
+    'borrowing_cost_annual': 0.0025, # Extra charge on short notional
+    'avg_spread_points': 0.5, # Index points paid per contract closed
+}
 
 # --- Crisis Period Definitions ---
 # For H5 (Acute COVID Crisis)
@@ -49,6 +83,11 @@ CRISIS_2025_START_DATE = "2025-03-01"
 # --- Metrics Calculation ---
 TRADING_DAYS_PER_YEAR = 252
 
+# --- Hypothesis Significance (permutation_test.py) ---
+HYPOTHESIS_PERMUTATIONS = 2000 # Null signal series per test; 0 to skip the p-values
+HYPOTHESIS_PERMUTATION_METHOD = 'circular' # 'circular' shifts or 'block' shuffles of the hedge signals
+HYPOTHESIS_PERMUTATION_BLOCK_DAYS = 21 # Block length / minimum circular shift in trading days
+
 # --- Plotting ---
 PORTFOLIO_A_LABEL = "A (Classic)"
 # PORTFOLIO_B_LABEL will be f-string formatted in main script for dynamic hedge ratio
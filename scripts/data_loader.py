@@ -1,7 +1,12 @@
+import os
+
 import pandas as pd
-import requests
 import numpy as np # For np.nan if needed in future extensions
 
+from columnar_store import ColumnarStore, write_columnar_store
+from market_data_cache import MarketDataCache
+from market_data_fetcher import FMPFetcher
+
 def load_sofr_data(filepath, target_col_name='SOFR_Rate', start_date_str=None, end_date_str=None):
     """Loads and processes SOFR data from a CSV file."""
     try:
@@ -34,43 +39,148 @@ def load_sofr_data(filepath, target_col_name='SOFR_Rate', start_date_str=None, e
 
 def fetch_fmp_historical_data(symbol, api_key, from_date, to_date):
     """Fetches historical 'close' price data for a symbol from FMP."""
-    url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{symbol}?from={from_date}&to={to_date}&apikey={api_key}"
-    try:
-        response = requests.get(url, timeout=10) # Added timeout
-        response.raise_for_status()
-        data = response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data for {symbol}: {e}")
-        return pd.DataFrame(columns=['date', 'close'])
-
-
-    if not data or not data.get('historical'):
-        print(f"Warning: No historical data found or 'historical' key missing for {symbol} from {from_date} to {to_date}.")
-        return pd.DataFrame(columns=['date', 'close'])
-        
-    df = pd.DataFrame(data['historical'])
-    if 'date' not in df.columns or 'close' not in df.columns:
-        print(f"Warning: 'date' or 'close' column missing in FMP data for {symbol}.")
-        return pd.DataFrame(columns=['date', 'close'])
-
-    df = df[['date', 'close']].copy()
-    df['date'] = pd.to_datetime(df['date'])
-    df['close'] = pd.to_numeric(df['close'], errors='coerce')
-    df = df.sort_values(by='date', ascending=True).reset_index(drop=True)
-    return df
-
-def load_and_prepare_market_data(cfg):
-    """Loads S&P500, VIX, and SOFR data, merges, and prepares them."""
+    df = FMPFetcher(api_key, max_retries=0).fetch(symbol, from_date, to_date)
+    return pd.DataFrame(columns=['date', 'close']) if df is None else df
+
+def fetch_close_histories(symbols, from_date, to_date, fetcher, cache=None):
+    """
+    Fetches 'close' histories for several symbols concurrently through `fetcher`.
+    With a cache, only the date ranges it does not cover yet are requested and the
+    window is then served from disk. Returns {symbol: DataFrame}.
+    """
+    if cache is None:
+        frames = fetcher.fetch_many([(symbol, from_date, to_date) for symbol in symbols])
+        return {symbol: pd.DataFrame(columns=['date', 'close']) if df is None else df
+                for symbol, df in zip(symbols, frames)}
+
+    jobs = [(symbol, gap_from, gap_to) for symbol in symbols
+            for gap_from, gap_to in cache.missing_ranges(symbol, from_date, to_date)]
+    for symbol, gap_from, gap_to in jobs:
+        print(f"Fetching {symbol} from FMP for uncached range {gap_from} to {gap_to}.")
+    for (symbol, gap_from, gap_to), df_gap in zip(jobs, fetcher.fetch_many(jobs)):
+        # A failed request leaves the range uncovered so it is retried next run; an empty
+        # but successful response (no trading days in the gap) still marks it covered.
+        if df_gap is not None:
+            cache.merge(symbol, df_gap, gap_from, gap_to)
+    return {symbol: cache.get(symbol, from_date, to_date) for symbol in symbols}
+
+def build_price_matrix(close_histories, symbols, how='inner', ffill_limit=5):
+    """
+    Aligns per-symbol close histories ({symbol: DataFrame with 'date', 'close'}) into
+    a (days x instruments) price DataFrame indexed by date, columns in `symbols` order.
+    how='inner' keeps the dates every symbol traded; how='outer' keeps all dates and
+    forward-fills holiday gaps of up to ffill_limit days.
+    """
+    columns = []
+    for symbol in symbols:
+        df_symbol = close_histories.get(symbol, pd.DataFrame())
+        if df_symbol.empty:
+            print(f"Warning: No price history for {symbol}; dropped from the price matrix.")
+            continue
+        columns.append(df_symbol.drop_duplicates('date').set_index('date')['close'].rename(symbol))
+    if not columns:
+        return pd.DataFrame()
+
+    df_prices = pd.concat(columns, axis=1, join='inner' if how == 'inner' else 'outer').sort_index()
+    if how != 'inner':
+        df_prices = df_prices.ffill(limit=ffill_limit)
+    df_prices.index.name = 'date'
+    return df_prices.astype(float)
+
+def load_price_matrix(cfg, symbols, how='inner'):
+    """Fetches (through the cache, if configured) and aligns close prices for several instruments."""
+    cache = MarketDataCache(cfg.MARKET_DATA_CACHE_DIR) if getattr(cfg, 'MARKET_DATA_CACHE_DIR', None) else None
+    fetcher = FMPFetcher.from_config(cfg)
+    close_histories = fetch_close_histories(list(symbols), cfg.START_DATE, cfg.END_DATE, fetcher, cache)
+    df_prices = build_price_matrix(close_histories, symbols, how=how)
+    print(f"Price matrix prepared. Shape: {df_prices.shape}")
+    return df_prices
+
+def fetch_fmp_historical_data_cached(symbol, api_key, from_date, to_date, cache):
+    """Serves 'close' history from the local cache, downloading only date ranges it does not cover yet."""
+    return fetch_close_histories([symbol], from_date, to_date, FMPFetcher(api_key), cache)[symbol]
+
+MARKET_DATA_SYMBOLS = ["^GSPC", "^VIX"]
+
+def market_data_window(cfg):
+    """
+    Inputs the stored frame was built from; a mismatch means the store is stale.
+    With a cache, the cached closes and covered range of each symbol are fingerprinted
+    too, so a frame built before the cache changed never matches.
+    """
+    sofr_mtime = os.path.getmtime(cfg.SOFR_CSV_FILEPATH) if os.path.exists(cfg.SOFR_CSV_FILEPATH) else None
+    window = {'start_date': cfg.START_DATE, 'end_date': cfg.END_DATE,
+              'sofr_csv': cfg.SOFR_CSV_FILEPATH, 'sofr_mtime': sofr_mtime, 'sofr_col': cfg.TARGET_SOFR_COL_NAME}
+    if getattr(cfg, 'MARKET_DATA_CACHE_DIR', None):
+        cache = MarketDataCache(cfg.MARKET_DATA_CACHE_DIR)
+        window['closes'] = {symbol: cache.fingerprint(symbol) for symbol in MARKET_DATA_SYMBOLS}
+    return window
+
+def market_data_complete(cfg, fetcher, cache=None):
+    """
+    True once [START_DATE, END_DATE] is fully fetched for every symbol: covered by the
+    cache or, without one, downloaded without errors and entirely in the past.
+    """
+    if cache is not None:
+        return all(not cache.missing_ranges(symbol, cfg.START_DATE, cfg.END_DATE) for symbol in MARKET_DATA_SYMBOLS)
+    df_stats = fetcher.stats_frame()
+    return bool(df_stats['error'].isna().all()) and pd.Timestamp(cfg.END_DATE) < pd.Timestamp.today().normalize()
+
+def market_data_cached(cfg):
+    """
+    True if the market-data cache already covers [START_DATE, END_DATE] for every
+    symbol, so loading needs no download and the frame is determined by
+    market_data_window(cfg).
+    """
+    if not getattr(cfg, 'MARKET_DATA_CACHE_DIR', None):
+        return False
+    return market_data_complete(cfg, None, MarketDataCache(cfg.MARKET_DATA_CACHE_DIR))
+
+def load_market_data_store(cfg, columns=None):
+    """
+    Opens the prepared-market-data store memory-mapped, projecting only `columns`.
+    Returns None if no store exists for the configured START_DATE/END_DATE window.
+    """
+    store_dir = getattr(cfg, 'MARKET_DATA_STORE_DIR', None)
+    if not store_dir or not ColumnarStore.exists(store_dir):
+        return None
+    store = ColumnarStore(store_dir)
+    if store.metadata.get('window') != market_data_window(cfg):
+        return None
+    if columns is not None:
+        columns = ['date'] + [col for col in columns if col != 'date']
+    return store.to_frame(columns)
+
+def load_and_prepare_market_data(cfg, columns=None):
+    """Loads S&P500, VIX, and SOFR data, merges, and prepares them.
+    If MARKET_DATA_STORE_DIR is set, the prepared frame is served from (and saved to)
+    a memory-mapped columnar store; `columns` limits the frame to what a stage needs."""
     print("--- Loading and Preparing Market Data ---")
-    # 1. Fetch S&P 500 data
-    df_sp500 = fetch_fmp_historical_data("^GSPC", cfg.FMP_API_KEY, cfg.START_DATE, cfg.END_DATE)
+    df_stored = load_market_data_store(cfg, columns)
+    if df_stored is not None:
+        print(f"Market data opened from store '{cfg.MARKET_DATA_STORE_DIR}'. Shape: {df_stored.shape}")
+        return df_stored
+
+    cache = None
+    if getattr(cfg, 'MARKET_DATA_CACHE_DIR', None):
+        cache = MarketDataCache(cfg.MARKET_DATA_CACHE_DIR)
+        if getattr(cfg, 'MARKET_DATA_SEED_CSV', None):
+            cache.seed_from_combined_csv(cfg.MARKET_DATA_SEED_CSV, {"^GSPC": "S&P500", "^VIX": "VIX"})
+
+    # 1./2. Fetch S&P 500 and VIX data concurrently
+    fetcher = FMPFetcher.from_config(cfg)
+    close_histories = fetch_close_histories(MARKET_DATA_SYMBOLS, cfg.START_DATE, cfg.END_DATE, fetcher, cache)
+    df_stats = fetcher.stats_frame()
+    if not df_stats.empty:
+        print(f"Fetched {len(df_stats)} range(s) in {df_stats['seconds'].max():.2f}s (slowest request).")
+
+    df_sp500 = close_histories["^GSPC"]
     if df_sp500.empty:
         print("Critical error: S&P500 data could not be loaded. Exiting.")
         return pd.DataFrame()
     df_sp500 = df_sp500.rename(columns={'close': 'S&P500'})
 
-    # 2. Fetch VIX data
-    df_vix = fetch_fmp_historical_data("^VIX", cfg.FMP_API_KEY, cfg.START_DATE, cfg.END_DATE)
+    df_vix = close_histories["^VIX"]
     if df_vix.empty:
         print("Critical error: VIX data could not be loaded. Exiting.")
         return pd.DataFrame()
@@ -115,6 +225,15 @@ def load_and_prepare_market_data(cfg):
     # df_final = df_combined[final_columns_base].copy() # Removed VIX_Return_5D as it might be confusing here
     df_final = df_combined.copy() # Keep all for flexibility, filter later if needed
     
+    # A partial history (failed or not yet final fetches) is never stored, so it cannot be served later.
+    if getattr(cfg, 'MARKET_DATA_STORE_DIR', None) and not df_final.empty:
+        if market_data_complete(cfg, fetcher, cache):
+            write_columnar_store(df_final, cfg.MARKET_DATA_STORE_DIR, metadata={'window': market_data_window(cfg)})
+        else:
+            print("Market data store not updated: START_DATE to END_DATE is not fully fetched yet.")
+    if columns is not None:
+        df_final = df_final[['date'] + [col for col in columns if col != 'date' and col in df_final.columns]]
+
     print(f"Market data prepared. Shape: {df_final.shape}")
     # print("Sample of prepared data:")
     # print(df_final.head(2))
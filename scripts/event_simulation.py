@@ -0,0 +1,272 @@
+# event_simulation.py
+# Event-skipping Model B engine with configurable rebalancing policies.
+#
+# The daily engine in simulation_engine.py touches every row. Here the Python
+# loop only runs on event days (hedge signals that can change the position,
+# rebalance dates, drift breaches); every stretch in between is compounded in
+# closed form from prefix arrays:
+#   P[k] = prod_{j<k} (1 + r_j)            equity growth, no rebalancing
+#   G[k] = prod_{j<k} (1 + a * r_j)        total growth with a daily rebalance to a
+#   F[k] = sum_{j<k} f_j                    net CFD financing per financing unit
+# so an unhedged stretch costs O(1) to advance (plus a vectorised slice when values
+# are recorded). Under a daily rebalance, financing credited to cash is reinvested,
+# so a hedged stretch sums f_j * G[end] / G[j + 1] over its own days; this is kept
+# local to the stretch because a global prefix sum of f / G loses all precision once
+# G spans many orders of magnitude.
+
+import numpy as np
+import pandas as pd
+
+from cfd_cost_model import cost_model_from_config
+from simulation_engine import MODEL_B_ESSENTIAL_COLS, ModelBState
+
+
+class DailyRebalance:
+    """Rebalance to the target allocation at the end of every day (the original Model B)."""
+    name = 'daily'
+    every_day = True
+
+    def next_rebalance(self, context, start, end, state):
+        return start
+
+    def rebalance_today(self, context, day, state, hedge_changed):
+        return True
+
+
+class PeriodicRebalance:
+    """Rebalance at the end of every `period`-th trading day (e.g. 21 ~ monthly)."""
+    name = 'periodic'
+    every_day = False
+
+    def __init__(self, period=21):
+        if period < 1:
+            raise ValueError("Rebalance period must be at least 1 day.")
+        self.period = int(period)
+
+    def next_rebalance(self, context, start, end, state):
+        day = start + (-(start + 1)) % self.period
+        return day if day < end else None
+
+    def rebalance_today(self, context, day, state, hedge_changed):
+        return (day + 1) % self.period == 0
+
+
+class DriftRebalance:
+    """Rebalance when the equity weight drifts more than `threshold` from EQUITY_ALLOC_B."""
+    name = 'drift'
+    every_day = False
+
+    def __init__(self, threshold=0.05):
+        self.threshold = float(threshold)
+
+    def _breached(self, context, equity, cash):
+        total = equity + cash
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drift = np.abs(equity / total - context['equity_alloc'])
+        return drift > self.threshold
+
+    def next_rebalance(self, context, start, end, state):
+        if start >= end:
+            return None
+        equity, cash = _drifted_legs(context, start, end, state)
+        breached = np.flatnonzero(self._breached(context, equity, cash))
+        return start + int(breached[0]) if len(breached) else None
+
+    def rebalance_today(self, context, day, state, hedge_changed):
+        return bool(self._breached(context, state.equity_value, state.cash_value))
+
+
+class SignalOnlyRebalance:
+    """Rebalance only on days the hedge is opened or closed."""
+    name = 'signal_only'
+    every_day = False
+
+    def next_rebalance(self, context, start, end, state):
+        return None
+
+    def rebalance_today(self, context, day, state, hedge_changed):
+        return hedge_changed
+
+
+REBALANCE_POLICIES = {policy.name: policy for policy in
+                      (DailyRebalance, PeriodicRebalance, DriftRebalance, SignalOnlyRebalance)}
+
+
+def rebalance_policy_from_config(cfg):
+    """Builds the policy named by cfg.MODEL_B_REBALANCE_POLICY ('daily' if unset)."""
+    name = getattr(cfg, 'MODEL_B_REBALANCE_POLICY', DailyRebalance.name)
+    if name == PeriodicRebalance.name:
+        return PeriodicRebalance(getattr(cfg, 'MODEL_B_REBALANCE_PERIOD_DAYS', 21))
+    if name == DriftRebalance.name:
+        return DriftRebalance(getattr(cfg, 'MODEL_B_REBALANCE_DRIFT_THRESHOLD', 0.05))
+    if name not in REBALANCE_POLICIES:
+        raise ValueError(f"Unknown rebalance policy '{name}'. Choose from {sorted(REBALANCE_POLICIES)}.")
+    return REBALANCE_POLICIES[name]()
+
+
+def _financing_units(context, state):
+    if not state.cfd_active:
+        return 0.0
+    return context['cost_model'].financing_units(state.cfd_notional_value, state.cfd_entry_sp500_price)
+
+
+def _drifted_legs(context, start, end, state):
+    """Equity and cash at the end of each of days [start, end) with no rebalancing or hedge change."""
+    equity = state.equity_value * (context['P'][start + 1:end + 1] / context['P'][start])
+    cash = state.cash_value + _financing_units(context, state) * (context['F'][start + 1:end + 1] - context['F'][start])
+    return equity, np.broadcast_to(cash, equity.shape)
+
+
+def _advance(context, start, end, state, values):
+    """Moves state from the end of day start-1 to the end of day end-1 with no events in between."""
+    if end <= start:
+        return
+    units = _financing_units(context, state)
+    if context['policy'].every_day:
+        if units == 0.0 and values is None:
+            total = state.total_value * (context['G'][end] / context['G'][start])
+        else:
+            growth = context['G'][start + 1:end + 1] / context['G'][start]
+            totals = growth * state.total_value
+            if units != 0.0:
+                totals = totals + units * growth * np.cumsum(context['financing'][start:end] / growth)
+            if values is not None:
+                values[start:end] = totals
+            total = totals[-1]
+        state.total_value = total
+        state.equity_value = total * context['equity_alloc']
+        state.cash_value = total * context['cash_alloc']
+    else:
+        if values is not None:
+            equity, cash = _drifted_legs(context, start, end, state)
+            values[start:end] = equity + cash
+        P, F = context['P'], context['F']
+        state.equity_value = state.equity_value * (P[end] / P[start])
+        state.cash_value = state.cash_value + units * (F[end] - F[start])
+        state.total_value = state.equity_value + state.cash_value
+
+
+def _step_event_day(context, day, state):
+    """Runs one day of the Model B state machine; returns True if the hedge opened or closed."""
+    cost_model = context['cost_model']
+    price = context['prices'][day]
+    state.equity_value *= (1 + context['returns'][day])
+    if state.cfd_active:
+        units = cost_model.financing_units(state.cfd_notional_value, state.cfd_entry_sp500_price)
+        state.cash_value += units * context['financing'][day]
+
+    hedge_changed = False
+    if state.cfd_active and context['cover'][day]:
+        entry, notional = state.cfd_entry_sp500_price, state.cfd_notional_value
+        state.cash_value += notional * (1 - (price / entry))
+        state.cash_value -= cost_model.close_cost(notional, entry, price)
+        state.cash_value += state.cfd_margin_account_deduction
+        state.cfd_active = False
+        state.cfd_entry_sp500_price = 0.0
+        state.cfd_notional_value = 0.0
+        state.cfd_margin_account_deduction = 0.0
+        hedge_changed = True
+    elif not state.cfd_active and context['short'][day]:
+        amount_to_hedge = context['hedge_ratio'] * state.equity_value
+        margin_required = cost_model.margin(amount_to_hedge, price)
+        if state.cash_value >= margin_required:
+            state.cfd_active = True
+            state.cfd_notional_value = amount_to_hedge
+            state.cfd_entry_sp500_price = price
+            state.cfd_margin_account_deduction = margin_required
+            state.cash_value -= margin_required
+            hedge_changed = True
+
+    state.total_value = state.equity_value + state.cash_value
+    return hedge_changed
+
+
+def _next_index(sorted_days, start):
+    k = np.searchsorted(sorted_days, start)
+    return int(sorted_days[k]) if k < len(sorted_days) else None
+
+
+def simulate_portfolio_B_events(df_data_with_signals, initial_capital, cfg, policy=None, cost_model=None,
+                                record_values=True):
+    """
+    Event-skipping Model B simulation.
+
+    policy is one of the rebalance policies above (default from cfg.MODEL_B_REBALANCE_POLICY)
+    and cost_model a cfd_cost_model backend (default from cfg.CFD_COST_MODEL). With the
+    daily policy the values match simulate_portfolio_B_momentum to floating-point rounding.
+    Days with NaN market data hold value, as in the daily engine.
+
+    Returns a dict with 'values' (Series of end-of-day values, or None when
+    record_values is False), 'final_value', 'events' (days stepped explicitly)
+    and the final ModelBState as 'state'.
+    """
+    if policy is None:
+        policy = rebalance_policy_from_config(cfg)
+    if cost_model is None:
+        cost_model = cost_model_from_config(cfg)
+    initial_capital = float(initial_capital)
+    state = ModelBState(initial_capital, initial_capital * cfg.EQUITY_ALLOC_B, initial_capital * cfg.CASH_ALLOC_B)
+    empty = {'values': pd.Series(dtype=float) if record_values else None, 'final_value': initial_capital,
+             'events': 0, 'state': state}
+    if df_data_with_signals.empty:
+        return empty
+    for col in MODEL_B_ESSENTIAL_COLS:
+        if col not in df_data_with_signals.columns:
+            print(f"Model B: Missing essential column '{col}'.")
+            return empty
+
+    returns = df_data_with_signals['SP500_Return'].to_numpy(dtype=float)
+    prices = df_data_with_signals['S&P500'].to_numpy(dtype=float)
+    valid = ~(np.isnan(returns) | np.isnan(prices))
+    # NaN days become no-ops: no growth, no financing, no signals.
+    returns = np.where(valid, returns, 0.0)
+    financing = np.where(valid, cost_model.accrual_curves(df_data_with_signals['SOFR_Rate'].to_numpy(dtype=float),
+                                                          prices)['net_daily'], 0.0)
+    short = df_data_with_signals['Short_Signal_Today'].to_numpy(dtype=bool) & valid
+    cover = (df_data_with_signals['Cover_Signal_Momentum_Today'].to_numpy(dtype=bool)
+             | df_data_with_signals['Cover_Signal_Absolute_VIX_Today'].to_numpy(dtype=bool)) & valid
+
+    equity_alloc = cfg.EQUITY_ALLOC_B
+    context = {
+        'policy': policy, 'cost_model': cost_model, 'returns': returns, 'prices': prices,
+        'financing': financing, 'short': short, 'cover': cover,
+        'equity_alloc': equity_alloc, 'cash_alloc': cfg.CASH_ALLOC_B,
+        'hedge_ratio': cfg.MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM,
+        'P': np.concatenate([[1.0], np.cumprod(1 + returns)]),
+        'F': np.concatenate([[0.0], np.cumsum(financing)]),
+        'G': np.concatenate([[1.0], np.cumprod(1 + equity_alloc * returns)]),
+    }
+    short_days, cover_days = np.flatnonzero(short), np.flatnonzero(cover)
+
+    n_days = len(returns)
+    values = np.empty(n_days) if record_values else None
+    day = 0
+    events = 0
+    while day < n_days:
+        signal_day = _next_index(cover_days if state.cfd_active else short_days, day)
+        limit = n_days if signal_day is None else signal_day
+        rebalance_day = None if policy.every_day else policy.next_rebalance(context, day, limit, state)
+        event_day = min(limit, rebalance_day) if rebalance_day is not None else limit
+
+        _advance(context, day, event_day, state, values)
+        if event_day >= n_days:
+            break
+
+        hedge_changed = _step_event_day(context, event_day, state)
+        if policy.rebalance_today(context, event_day, state, hedge_changed):
+            state.equity_value = state.total_value * equity_alloc
+            state.cash_value = state.total_value * cfg.CASH_ALLOC_B
+        if values is not None:
+            values[event_day] = state.total_value
+        events += 1
+        day = event_day + 1
+
+    state.days_stepped = n_days
+    if 'date' in df_data_with_signals.columns:
+        state.last_date = str(pd.Timestamp(df_data_with_signals['date'].iloc[-1]).date())
+    return {
+        'values': pd.Series(values, index=df_data_with_signals.index) if record_values else None,
+        'final_value': state.total_value,
+        'events': events,
+        'state': state,
+    }
@@ -0,0 +1,187 @@
+# experiment_runner.py
+# Process-pool grid search over signal and Model B parameters.
+#
+# The prepared market columns are copied once into multiprocessing.shared_memory
+# blocks; every worker attaches to them in its pool initializer and views them as
+# NumPy arrays, so nothing but a few small parameter vectors is pickled per task.
+# Each task is a chunk of configurations: the worker computes the VIX signals for
+# every distinct signal parameter set in the chunk, runs the batched Model B kernel
+# over the whole chunk and returns its metrics rows. Results stream back as chunks
+# finish and are assembled into one table in configuration order.
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import risk_metrics
+import signal_generation
+import simulation_engine
+from cfd_cost_model import cost_model_from_config
+from parameter_sweep import expand_param_grid
+
+SHARED_MARKET_COLUMNS = ['SP500_Return', 'S&P500', 'SOFR_Rate', 'VIX']
+EXPERIMENT_PARAMS = signal_generation.SIGNAL_PARAM_NAMES + simulation_engine.MODEL_B_SWEEP_PARAMS
+
+# Set in each worker by _attach_shared_market_data.
+_shared_blocks = []
+_shared_arrays = {}
+
+
+class SharedMarketData:
+    """
+    Owns shared-memory copies of named arrays (e.g. market_arrays(df), signal tensors).
+    Use as a context manager; the blocks are unlinked on exit.
+    """
+
+    def __init__(self, arrays):
+        self.blocks = []
+        self.specs = {}
+        try:
+            for col, values in arrays.items():
+                values = np.ascontiguousarray(values)
+                block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+                self.blocks.append(block)
+                self.specs[col] = (block.name, values.shape, values.dtype.str)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _attach_shared_market_data(specs):
+    """Pool initializer: maps the shared blocks into this worker as read-only arrays."""
+    for col, (name, shape, dtype) in specs.items():
+        try:
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # track= needs Python 3.13; the owner unlinks the blocks either way
+            block = shared_memory.SharedMemory(name=name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        _shared_blocks.append(block)
+        _shared_arrays[col] = array
+
+
+def attached_arrays():
+    """Arrays mapped into this worker by the pool initializer, by name."""
+    return _shared_arrays
+
+
+def market_arrays(df_data, columns=SHARED_MARKET_COLUMNS):
+    """The market columns a configuration chunk needs, as float arrays (SOFR NaNs as 0)."""
+    arrays = {col: df_data[col].to_numpy(dtype=float) for col in columns}
+    if 'SOFR_Rate' in arrays:
+        arrays['SOFR_Rate'] = np.nan_to_num(arrays['SOFR_Rate'], nan=0.0)
+    return arrays
+
+
+def evaluate_config_chunk(market, params, initial_capital, rfr_annual, trading_days_per_year, cost_model):
+    """
+    Signals, Model B and metrics for a chunk of configurations.
+    market: arrays from market_arrays; params: {name: (n,) array} for every EXPERIMENT_PARAMS name.
+    cost_model: the run's cost model (see simulation_engine.model_b_value_matrix).
+    Returns an (n, len(METRIC_NAMES)) metrics array.
+    """
+    n_configs = len(params['EQUITY_ALLOC_B'])
+    n_days = len(market['VIX'])
+
+    short = np.empty((n_configs, n_days), dtype=bool)
+    cover_momentum = np.empty((n_configs, n_days), dtype=bool)
+    cover_absolute_vix = np.empty((n_configs, n_days), dtype=bool)
+    signal_params = np.column_stack([params[name] for name in signal_generation.SIGNAL_PARAM_NAMES])
+    unique_signal_params, signal_group = np.unique(signal_params, axis=0, return_inverse=True)
+    for group, (lookback, up, down, n_up, n_down, absolute) in enumerate(unique_signal_params):
+        rows = np.flatnonzero(signal_group.ravel() == group)
+        signals = signal_generation.compute_vix_momentum_signal_arrays(
+            market['VIX'], int(lookback), up, down, n_up, n_down, absolute)
+        short[rows], cover_momentum[rows], cover_absolute_vix[rows] = signals
+
+    # Every sweep parameter is present, so no config fallback is needed.
+    arrays = simulation_engine.model_b_param_arrays(
+        {name: params[name] for name in simulation_engine.MODEL_B_SWEEP_PARAMS}, None)
+    values = simulation_engine.model_b_value_matrix(
+        market['SP500_Return'], market['S&P500'], market['SOFR_Rate'], short, cover_momentum, cover_absolute_vix,
+        initial_capital, arrays, cost_model)
+    metrics = risk_metrics.calculate_metrics_batch(values, rfr_annual, initial_capital, trading_days_per_year)
+    return metrics[risk_metrics.METRIC_NAMES].to_numpy()
+
+
+def _run_config_chunk(chunk_start, params, initial_capital, rfr_annual, trading_days_per_year, cost_model):
+    """Pool task: evaluates one chunk on the shared market arrays."""
+    return chunk_start, evaluate_config_chunk(_shared_arrays, params, initial_capital, rfr_annual,
+                                              trading_days_per_year, cost_model)
+
+
+def _config_chunks(configs, cfg, chunk_size):
+    """Yields (start, {name: (n,) array}) for every chunk, filling unswept parameters from cfg."""
+    for start in range(0, len(configs), chunk_size):
+        chunk = configs.iloc[start:start + chunk_size]
+        yield start, {name: (chunk[name].to_numpy(dtype=float) if name in chunk.columns
+                             else np.full(len(chunk), float(getattr(cfg, name))))
+                      for name in EXPERIMENT_PARAMS}
+
+
+def iter_experiment_results(df_data, cfg, configs, chunk_size=256, max_workers=None, rfr_annual=None):
+    """
+    Streams (chunk_start, metrics ndarray) in completion order for a table of
+    configurations (columns from EXPERIMENT_PARAMS; missing ones come from cfg).
+    Metric columns follow risk_metrics.METRIC_NAMES. Costs follow cfg.CFD_COST_MODEL;
+    the flat-cost parameters can only be swept with flat costs.
+    """
+    if rfr_annual is None:
+        rfr_annual = df_data['SOFR_Rate'].mean()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    cost_model = cost_model_from_config(cfg)
+    task_args = (float(cfg.INITIAL_CAPITAL), float(rfr_annual), cfg.TRADING_DAYS_PER_YEAR, cost_model)
+
+    with SharedMarketData(market_arrays(df_data)) as shared:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_shared_market_data,
+                                 initargs=(shared.specs,)) as executor:
+            futures = [executor.submit(_run_config_chunk, start, params, *task_args)
+                       for start, params in _config_chunks(configs, cfg, chunk_size)]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def run_experiments(df_data, cfg, param_grid, chunk_size=256, max_workers=None, rfr_annual=None):
+    """
+    Grid search over signal and Model B parameters on a process pool.
+
+    param_grid maps names from EXPERIMENT_PARAMS to lists of values (others use cfg).
+    Returns (results, stats): one row per configuration with its parameters and
+    risk metrics, and the run's wall time and throughput in configurations/second.
+    """
+    configs = expand_param_grid(param_grid).reset_index(drop=True)
+    n_workers = max_workers or os.cpu_count() or 1
+    print(f"--- Running {len(configs)} configurations in chunks of {chunk_size} on {n_workers} worker(s) ---")
+
+    metrics = np.full((len(configs), len(risk_metrics.METRIC_NAMES)), np.nan)
+    started = time.perf_counter()
+    done = 0
+    for chunk_start, chunk_metrics in iter_experiment_results(df_data, cfg, configs, chunk_size,
+                                                              max_workers, rfr_annual):
+        metrics[chunk_start:chunk_start + len(chunk_metrics)] = chunk_metrics
+        done += len(chunk_metrics)
+    elapsed = time.perf_counter() - started
+
+    stats = {'configs': done, 'workers': n_workers, 'seconds': elapsed,
+             'configs_per_second': done / elapsed if elapsed > 0 else np.nan}
+    print(f"Completed {done} configurations in {elapsed:.2f}s ({stats['configs_per_second']:.1f} configs/sec).")
+    results = pd.concat([configs, pd.DataFrame(metrics, columns=risk_metrics.METRIC_NAMES)], axis=1)
+    return results, stats
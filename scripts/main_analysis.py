@@ -1,5 +1,4 @@
 import pandas as pd
-import numpy as np
 
 # Import your custom modules
 import config as cfg # Assuming your config file is named config.py
@@ -8,6 +7,19 @@ import signal_generation
 import simulation_engine
 import risk_metrics
 import plotting
+import permutation_test
+import cfd_cost_model
+import columnar_store
+import market_data_cache
+import market_data_fetcher
+from stage_cache import StageCache
+from window_index import WindowIndex
+
+# Config values each cached stage depends on (beyond its upstream stages and code).
+SIMULATION_STAGE_SETTINGS = ['INITIAL_CAPITAL', 'EQUITY_ALLOC_A', 'EQUITY_ALLOC_B', 'CASH_ALLOC_B',
+                             'MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM', 'BROKER_FEE_ANNUALIZED', 'SPREAD_COST_PERCENT',
+                             'CFD_INITIAL_MARGIN_PERCENT', 'CFD_COST_MODEL', 'CFD_TIERED_COSTS']
+METRICS_STAGE_SETTINGS = ['INITIAL_CAPITAL', 'TRADING_DAYS_PER_YEAR', 'TARGET_SOFR_COL_NAME', 'PORTFOLIO_A_LABEL']
 
 def format_metrics_for_print(metrics_dict):
     """Converts numeric metrics to appropriate string formats for printing."""
@@ -34,17 +46,8 @@ def format_metrics_for_print(metrics_dict):
     return formatted
 
 
-def main():
-    print("--- Starting Final Analysis ---")
-    pd.set_option('display.float_format', lambda x: '%.4f' % x)
-
-    # 1. Load and Prepare Data
-    df_market_data = data_loader.load_and_prepare_market_data(cfg)
-    if df_market_data.empty:
-        print("Exiting due to data loading issues.")
-        return
-
-    # 2. Generate VIX Momentum Signals
+def prepare_simulation_frame(df_market_data):
+    """Signals stage: VIX momentum signals, then drop rows missing anything the simulations need."""
     df_sim_full = signal_generation.generate_vix_momentum_signals(df_market_data, cfg)
 
     # Drop rows with NaN in essential columns for simulation after all calculations
@@ -53,36 +56,82 @@ def main():
                               'Cover_Signal_Absolute_VIX_Today']
     df_sim_full = df_sim_full.dropna(subset=essential_cols_for_sim).copy()
     df_sim_full.reset_index(drop=True, inplace=True)
+    return df_sim_full
 
-    if df_sim_full.empty:
-        print("No data available for simulation after NaN drop. Exiting.")
-        return
-        
-    RFR_ANNUAL = df_sim_full[cfg.TARGET_SOFR_COL_NAME].mean()
-    print(f"Average Annualized SOFR (Risk-Free Rate): {RFR_ANNUAL*100:.4f}%")
-    print(f"Simulation period from {df_sim_full['date'].min().date()} to {df_sim_full['date'].max().date()} ({len(df_sim_full)} days).\n")
-
-    # Plot S&P 500 and VIX
-    plotting.plot_market_data(df_sim_full[['date', 'S&P500', 'VIX']])
 
-    # --- Full Period Simulations & Metrics ---
+def run_full_period_simulations(df_sim_full):
+    """Simulations stage: Model A and Model B over the full period."""
     print("--- Running Full Period Simulations ---")
     values_A_full = simulation_engine.simulate_portfolio_A(df_sim_full, cfg.INITIAL_CAPITAL, cfg.EQUITY_ALLOC_A)
-    values_B_momentum_full = simulation_engine.simulate_portfolio_B_momentum(df_sim_full, cfg.INITIAL_CAPITAL, cfg)
+    values_B_momentum_full = simulation_engine.simulate_portfolio_B_momentum_arrays(df_sim_full, cfg.INITIAL_CAPITAL, cfg) # cfg.CFD_COST_MODEL selects the cost model
     print("Simulations complete.")
+    return values_A_full, values_B_momentum_full
+
 
+def calculate_full_period_metrics(df_sim_full, values_A_full, values_B_momentum_full, portfolio_B_label_full):
+    """Metrics stage: risk-free rate and full-period metrics for both portfolios."""
+    RFR_ANNUAL = df_sim_full[cfg.TARGET_SOFR_COL_NAME].mean()
     returns_A_full = values_A_full.pct_change().fillna(0)
     returns_B_momentum_full = values_B_momentum_full.pct_change().fillna(0)
-
-    print("\n--- Full Period Metrics ---")
-    portfolio_B_label_full = f"B (Momentum HR:{cfg.MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM:.2f})"
     metrics_A_full = risk_metrics.calculate_metrics_summary(
         cfg.PORTFOLIO_A_LABEL, values_A_full, returns_A_full, RFR_ANNUAL, cfg.INITIAL_CAPITAL, cfg.TRADING_DAYS_PER_YEAR
     )
     metrics_B_full = risk_metrics.calculate_metrics_summary(
         portfolio_B_label_full, values_B_momentum_full, returns_B_momentum_full, RFR_ANNUAL, cfg.INITIAL_CAPITAL, cfg.TRADING_DAYS_PER_YEAR
     )
-    
+    return RFR_ANNUAL, metrics_A_full, metrics_B_full
+
+
+def main():
+    print("--- Starting Final Analysis ---")
+    pd.set_option('display.float_format', lambda x: '%.4f' % x)
+
+    # Each stage is memoised under a hash of its config inputs, upstream stages and code,
+    # so a re-run only recomputes the stages downstream of what changed.
+    stage_cache = StageCache.from_config(cfg)
+
+    # 1. Load and Prepare Data
+    # Only a window the market-data cache fully covers is keyed on its inputs; anything
+    # still to be downloaded is recomputed each run and keyed on the frame itself.
+    data_inputs = data_loader.market_data_window(cfg) if data_loader.market_data_cached(cfg) else None
+    df_market_data, data_key = stage_cache.get_or_compute(
+        'data', data_inputs, lambda: data_loader.load_and_prepare_market_data(cfg),
+        modules=[data_loader, market_data_cache, market_data_fetcher, columnar_store])
+    if df_market_data.empty:
+        print("Exiting due to data loading issues.")
+        return
+
+    # 2. Generate VIX Momentum Signals
+    df_sim_full, signals_key = stage_cache.get_or_compute(
+        'signals', {name: getattr(cfg, name) for name in signal_generation.SIGNAL_PARAM_NAMES},
+        lambda: prepare_simulation_frame(df_market_data), upstream=[data_key],
+        modules=[signal_generation, prepare_simulation_frame])
+
+    if df_sim_full.empty:
+        print("No data available for simulation after NaN drop. Exiting.")
+        return
+
+    # --- Full Period Simulations & Metrics ---
+    (values_A_full, values_B_momentum_full), simulations_key = stage_cache.get_or_compute(
+        'simulations', {name: getattr(cfg, name, None) for name in SIMULATION_STAGE_SETTINGS},
+        lambda: run_full_period_simulations(df_sim_full), upstream=[signals_key],
+        modules=[simulation_engine, cfd_cost_model, run_full_period_simulations])
+
+    portfolio_B_label_full = f"B (Momentum HR:{cfg.MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM:.2f})"
+    (RFR_ANNUAL, metrics_A_full, metrics_B_full), _ = stage_cache.get_or_compute(
+        'metrics', {name: getattr(cfg, name) for name in METRICS_STAGE_SETTINGS},
+        lambda: calculate_full_period_metrics(df_sim_full, values_A_full, values_B_momentum_full,
+                                              portfolio_B_label_full),
+        upstream=[signals_key, simulations_key],
+        modules=[risk_metrics, calculate_full_period_metrics])
+
+    print(f"Average Annualized SOFR (Risk-Free Rate): {RFR_ANNUAL*100:.4f}%")
+    print(f"Simulation period from {df_sim_full['date'].min().date()} to {df_sim_full['date'].max().date()} ({len(df_sim_full)} days).\n")
+
+    # Plot S&P 500 and VIX
+    plotting.plot_market_data(df_sim_full[['date', 'S&P500', 'VIX']])
+
+    print("\n--- Full Period Metrics ---")
     # Format for printing
     formatted_metrics_A = format_metrics_for_print(metrics_A_full)
     formatted_metrics_B = format_metrics_for_print(metrics_B_full)
@@ -124,26 +173,28 @@ def main():
                    f"Volatility (B: {metrics_B_full['Annualized Volatility']*100:.2f}%, A: {metrics_A_full['Annualized Volatility']*100:.2f}%) - {'Improved' if vol_improved else 'Not Improved'}")
     print(f"H4: CFDs enhance risk reduction (lower MDD & Volatility). Finding: {h4_status}. Detail: {h4_detail}")
 
+    # Significance: how often randomly re-timed hedge signals match the observed B - A differences
+    if getattr(cfg, 'HYPOTHESIS_PERMUTATIONS', 0):
+        permutation_results = permutation_test.run_permutation_test(
+            df_sim_full, cfg, cfg.HYPOTHESIS_PERMUTATIONS, cfg.HYPOTHESIS_PERMUTATION_METHOD,
+            cfg.HYPOTHESIS_PERMUTATION_BLOCK_DAYS, rfr_annual=RFR_ANNUAL,
+            metrics_b=metrics_B_full, metrics_a=metrics_A_full)
+        print(permutation_results['summary'].set_index(['Hypothesis', 'Metric']).to_string(
+            float_format=lambda x: f"{x:.4f}"))
+
+    # Window queries over the full run, so crisis windows need no re-simulation
+    window_index = WindowIndex(df_sim_full['date'], [values_A_full.values, values_B_momentum_full.values],
+                               cfg.INITIAL_CAPITAL, names=[cfg.PORTFOLIO_A_LABEL, portfolio_B_label_full])
+
     # --- H5: COVID Acute Crisis Analysis ---
     print("\n--- H5: COVID Acute Crisis Analysis ---")
-    df_sim_covid_acute = df_sim_full[
-        (df_sim_full['date'] >= pd.to_datetime(cfg.COVID_CRISIS_START_DATE)) &
-        (df_sim_full['date'] <= pd.to_datetime(cfg.COVID_CRISIS_END_DATE))
-    ].copy().reset_index(drop=True)
-
-    if not df_sim_covid_acute.empty:
-        values_A_covid_acute = simulation_engine.simulate_portfolio_A(df_sim_covid_acute, cfg.INITIAL_CAPITAL, cfg.EQUITY_ALLOC_A)
-        values_B_covid_acute = simulation_engine.simulate_portfolio_B_momentum(df_sim_covid_acute, cfg.INITIAL_CAPITAL, cfg)
-        
-        returns_A_covid_acute = values_A_covid_acute.pct_change().fillna(0)
-        returns_B_covid_acute = values_B_covid_acute.pct_change().fillna(0)
-
-        metrics_A_covid_acute = risk_metrics.calculate_metrics_summary("A (COVID Acute)", values_A_covid_acute, returns_A_covid_acute, RFR_ANNUAL, cfg.INITIAL_CAPITAL, cfg.TRADING_DAYS_PER_YEAR)
-        metrics_B_covid_acute = risk_metrics.calculate_metrics_summary("B (COVID Acute)", values_B_covid_acute, returns_B_covid_acute, RFR_ANNUAL, cfg.INITIAL_CAPITAL, cfg.TRADING_DAYS_PER_YEAR)
-
-        if metrics_A_covid_acute.get('Total Return') is not None and metrics_B_covid_acute.get('Total Return') is not None:
-            h5_status = "Supported (Reacted More Strongly)" if abs(metrics_B_covid_acute['Total Return']) > abs(metrics_A_covid_acute['Total Return']) else "Not Supported (Reacted Less Strongly or Similarly)"
-            h5_detail = f"COVID Total Return (B: {metrics_B_covid_acute['Total Return']*100:.2f}%, A: {metrics_A_covid_acute['Total Return']*100:.2f}%)"
+    if window_index.positions(cfg.COVID_CRISIS_START_DATE, cfg.COVID_CRISIS_END_DATE) is not None:
+        total_return_A_covid_acute, total_return_B_covid_acute = window_index.total_return(
+            cfg.COVID_CRISIS_START_DATE, cfg.COVID_CRISIS_END_DATE)
+
+        if pd.notna(total_return_A_covid_acute) and pd.notna(total_return_B_covid_acute):
+            h5_status = "Supported (Reacted More Strongly)" if abs(total_return_B_covid_acute) > abs(total_return_A_covid_acute) else "Not Supported (Reacted Less Strongly or Similarly)"
+            h5_detail = f"COVID Total Return (B: {total_return_B_covid_acute*100:.2f}%, A: {total_return_A_covid_acute*100:.2f}%)"
             print(f"H5 (COVID Only): CFD portfolios react more strongly (magnitude) during the COVID crisis. Finding: {h5_status}. Detail: {h5_detail}")
         else:
             print("H5 (COVID Only): Could not calculate metrics for COVID acute period.")
@@ -153,51 +204,33 @@ def main():
 
     # --- H6: COVID Trough to Recovery Analysis ---
     print("\n--- H6: COVID Trough to Recovery Analysis ---")
-    df_h6_period_values = pd.DataFrame({
-        'date': df_sim_full['date'], 
-        'A_Value': values_A_full, 
-        'B_Value': values_B_momentum_full
-        })
-
-    # Filter for the period covering the acute crisis (to find trough) and recovery assessment
-    df_crisis_recovery_data = df_h6_period_values[
-        (df_h6_period_values['date'] >= pd.to_datetime(cfg.COVID_ANALYSIS_START_DATE)) &
-        (df_h6_period_values['date'] <= pd.to_datetime(cfg.COVID_ANALYSIS_END_DATE))
-    ].copy()
-
-    if not df_crisis_recovery_data.empty:
+    if window_index.positions(cfg.COVID_ANALYSIS_START_DATE, cfg.COVID_ANALYSIS_END_DATE) is not None:
         # Identify trough within the acute crisis phase (e.g., Feb-Apr 2020)
-        acute_crisis_window = df_crisis_recovery_data[
-            (df_crisis_recovery_data['date'] >= pd.to_datetime(cfg.COVID_CRISIS_START_DATE)) &
-            (df_crisis_recovery_data['date'] <= pd.to_datetime(cfg.COVID_CRISIS_END_DATE))
-        ]
-        if not acute_crisis_window.empty:
-            trough_A_idx = acute_crisis_window['A_Value'].idxmin()
-            trough_B_idx = acute_crisis_window['B_Value'].idxmin()
-            
-            trough_A_value = acute_crisis_window.loc[trough_A_idx, 'A_Value']
-            trough_A_date = acute_crisis_window.loc[trough_A_idx, 'date']
-            trough_B_value = acute_crisis_window.loc[trough_B_idx, 'B_Value']
-            trough_B_date = acute_crisis_window.loc[trough_B_idx, 'date']
+        if window_index.positions(cfg.COVID_CRISIS_START_DATE, cfg.COVID_CRISIS_END_DATE) is not None:
+            trough_values, trough_dates = window_index.trough(cfg.COVID_CRISIS_START_DATE, cfg.COVID_CRISIS_END_DATE)
+            trough_A_value, trough_B_value = trough_values
+            trough_A_date, trough_B_date = pd.Timestamp(trough_dates[0]), pd.Timestamp(trough_dates[1])
 
             # Value at the end of the recovery assessment period
-            end_recovery_data_A = df_crisis_recovery_data[df_crisis_recovery_data['date'] == pd.to_datetime(cfg.COVID_ANALYSIS_END_DATE)]
-            end_recovery_data_B = df_crisis_recovery_data[df_crisis_recovery_data['date'] == pd.to_datetime(cfg.COVID_ANALYSIS_END_DATE)]
-
-            if not end_recovery_data_A.empty and not end_recovery_data_B.empty:
-                end_value_A = end_recovery_data_A['A_Value'].iloc[0]
-                end_value_B = end_recovery_data_B['B_Value'].iloc[0]
+            if window_index.position_of(cfg.COVID_ANALYSIS_END_DATE) is not None:
+                recovery_A_return, recovery_B_return = window_index.recovery(
+                    cfg.COVID_CRISIS_START_DATE, cfg.COVID_CRISIS_END_DATE, cfg.COVID_ANALYSIS_END_DATE)
 
-                recovery_A_return = (end_value_A / trough_A_value) - 1 if trough_A_value > 0 else np.nan
-                recovery_B_return = (end_value_B / trough_B_value) - 1 if trough_B_value > 0 else np.nan
-                
                 if pd.notna(recovery_A_return) and pd.notna(recovery_B_return):
                     h6_status = "Supported" if recovery_B_return > recovery_A_return else "Not Supported"
                     h6_detail = f"Recovery from Trough (B: {recovery_B_return*100:.2f}% vs A: {recovery_A_return*100:.2f}% by {cfg.COVID_ANALYSIS_END_DATE})"
                     print(f"H6: Model B exhibited a stronger recovery than Model A post-COVID trough. Finding: {h6_status}. Detail: {h6_detail}")
-                    
+
                     # Plot for H6
-                    plot_df_h6 = df_crisis_recovery_data.melt(id_vars=['date', 'A_Value', 'B_Value'], value_vars=[], var_name="TempPortfolio", value_name="TempValue") # Base for melt
+                    df_crisis_recovery_data = pd.DataFrame({
+                        'date': df_sim_full['date'],
+                        'A_Value': values_A_full,
+                        'B_Value': values_B_momentum_full
+                    })
+                    df_crisis_recovery_data = df_crisis_recovery_data[
+                        (df_crisis_recovery_data['date'] >= pd.to_datetime(cfg.COVID_ANALYSIS_START_DATE)) &
+                        (df_crisis_recovery_data['date'] <= pd.to_datetime(cfg.COVID_ANALYSIS_END_DATE))
+                    ]
                     plot_df_h6_A = df_crisis_recovery_data[['date', 'A_Value']].rename(columns={'A_Value':'Value'})
                     plot_df_h6_A['Portfolio'] = cfg.PORTFOLIO_A_LABEL
                     plot_df_h6_B = df_crisis_recovery_data[['date', 'B_Value']].rename(columns={'B_Value':'Value'})
@@ -220,6 +253,7 @@ def main():
         print(f"H6: No data for specified COVID analysis period ({cfg.COVID_ANALYSIS_START_DATE} to {cfg.COVID_ANALYSIS_END_DATE}).")
 
 
+    stage_cache.report()
     print("\n--- Analysis Complete ---")
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import re
+
+import pandas as pd
+import numpy as np
+
+
+class MarketDataCache:
+    """
+    On-disk cache of daily close prices, one columnar .npz file per symbol.
+    Each file stores int64 'date' (datetime64[ns] ticks) and float64 'close' columns
+    plus the contiguous date range the cache is known to cover, so only the parts
+    of a requested window outside that range ever need to be downloaded.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, symbol):
+        return os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', symbol) + '.npz')
+
+    def load(self, symbol):
+        """Returns (df with 'date'/'close', covered_from, covered_to); covered dates are None if not cached."""
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=['date', 'close']), None, None
+        with np.load(path) as store:
+            df = pd.DataFrame({'date': pd.to_datetime(store['date']), 'close': store['close']})
+            covered_from = pd.Timestamp(int(store['covered_from']))
+            covered_to = pd.Timestamp(int(store['covered_to']))
+        return df, covered_from, covered_to
+
+    def fingerprint(self, symbol):
+        """Hash of the symbol's cached closes and covered range; None if not cached."""
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return None
+        digest = hashlib.sha256()
+        with np.load(path) as store:
+            for key in ('date', 'close', 'covered_from', 'covered_to'):
+                digest.update(np.ascontiguousarray(store[key]).tobytes())
+        return digest.hexdigest()
+
+    def _save(self, symbol, df, covered_from, covered_to):
+        path = self._path(symbol)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     date=df['date'].to_numpy(dtype='datetime64[ns]').astype(np.int64),
+                     close=df['close'].to_numpy(dtype=float),
+                     covered_from=np.int64(covered_from.value),
+                     covered_to=np.int64(covered_to.value))
+        os.replace(tmp_path, path)
+
+    def missing_ranges(self, symbol, from_date, to_date):
+        """Date ranges (as 'YYYY-MM-DD' pairs) of [from_date, to_date] not yet covered by the cache."""
+        from_date, to_date = pd.Timestamp(from_date), pd.Timestamp(to_date)
+        _, covered_from, covered_to = self.load(symbol)
+        if covered_from is None:
+            gaps = [(from_date, to_date)]
+        else:
+            gaps = []
+            if from_date < covered_from:
+                gaps.append((from_date, min(to_date, covered_from - pd.Timedelta(days=1))))
+            if to_date > covered_to:
+                gaps.append((max(from_date, covered_to + pd.Timedelta(days=1)), to_date))
+        # Gaps without a single business day (weekends) cannot contain new closes.
+        return [(str(start.date()), str(end.date())) for start, end in gaps
+                if start <= end and len(pd.bdate_range(start, end)) > 0]
+
+    def merge(self, symbol, df_new, from_date, to_date):
+        """Merges freshly fetched rows into the store and extends its covered range."""
+        df_cached, covered_from, covered_to = self.load(symbol)
+        from_date, to_date = pd.Timestamp(from_date), pd.Timestamp(to_date)
+        # Never mark today or later as covered: those closes may not exist or be final yet.
+        to_date = min(to_date, pd.Timestamp.today().normalize() - pd.Timedelta(days=1))
+        if covered_from is None and to_date < from_date:
+            return  # Nothing final to record yet
+        if covered_from is not None:
+            # Only a range touching the existing one keeps the covered range contiguous.
+            if from_date > covered_to + pd.Timedelta(days=1) or to_date < covered_from - pd.Timedelta(days=1):
+                from_date, to_date = covered_from, covered_to
+            else:
+                from_date, to_date = min(from_date, covered_from), max(to_date, covered_to)
+
+        frames = [df for df in (df_cached, df_new[['date', 'close']]) if not df.empty]
+        df_merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['date', 'close'])
+        df_merged['date'] = pd.to_datetime(df_merged['date'])
+        df_merged = (df_merged.drop_duplicates(subset=['date'], keep='last')
+                     .sort_values(by='date').reset_index(drop=True))
+        self._save(symbol, df_merged, from_date, to_date)
+
+    def get(self, symbol, from_date, to_date):
+        """Cached rows within [from_date, to_date], in the same format as data_loader.fetch_fmp_historical_data."""
+        df, _, _ = self.load(symbol)
+        mask = (df['date'] >= pd.Timestamp(from_date)) & (df['date'] <= pd.Timestamp(to_date))
+        return df[mask].reset_index(drop=True)
+
+    def seed_from_combined_csv(self, csv_path, symbol_columns):
+        """Seeds empty symbols from a combined market-data CSV, e.g. {'^GSPC': 'S&P500', '^VIX': 'VIX'}."""
+        if not os.path.exists(csv_path):
+            return
+        df_seed = None
+        for symbol, column in symbol_columns.items():
+            if os.path.exists(self._path(symbol)):
+                continue
+            if df_seed is None:
+                df_seed = pd.read_csv(csv_path, parse_dates=['date'])
+            if column not in df_seed.columns or df_seed.empty:
+                continue
+            df_symbol = df_seed[['date', column]].rename(columns={column: 'close'}).dropna()
+            self._save(symbol, df_symbol.sort_values(by='date').reset_index(drop=True),
+                       df_symbol['date'].min(), df_symbol['date'].max())
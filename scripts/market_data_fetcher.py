@@ -0,0 +1,210 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+FMP_BASE_URL = "https://financialmodelingprep.com/api/v3"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def parse_fmp_historical(symbol, data, from_date, to_date):
+    """Turns an FMP historical-price-full payload into a date-sorted 'date'/'close' DataFrame."""
+    if not data or not data.get('historical'):
+        print(f"Warning: No historical data found or 'historical' key missing for {symbol} from {from_date} to {to_date}.")
+        return pd.DataFrame(columns=['date', 'close'])
+
+    df = pd.DataFrame(data['historical'])
+    if 'date' not in df.columns or 'close' not in df.columns:
+        print(f"Warning: 'date' or 'close' column missing in FMP data for {symbol}.")
+        return pd.DataFrame(columns=['date', 'close'])
+
+    df = df[['date', 'close']].copy()
+    df['date'] = pd.to_datetime(df['date'])
+    df['close'] = pd.to_numeric(df['close'], errors='coerce')
+    df = df.sort_values(by='date', ascending=True).reset_index(drop=True)
+    return df
+
+
+class FMPFetcher:
+    """
+    Downloads FMP daily histories for many symbols concurrently.
+    All requests share one pooled requests.Session; transient failures (network
+    errors, 429 and 5xx responses) are retried with exponential backoff, and every
+    request's timing is recorded in `stats`. base_url is pluggable so tests can
+    point the fetcher at an FMPStubServer.
+    """
+
+    def __init__(self, api_key, base_url=FMP_BASE_URL, max_workers=8, max_retries=3,
+                 backoff_seconds=0.5, timeout=10, backend='threads'):
+        if backend not in ('threads', 'asyncio'):
+            raise ValueError(f"Unknown fetch backend '{backend}'. Use 'threads' or 'asyncio'.")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.backend = backend
+        self.stats = []
+        self._stats_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(cfg.FMP_API_KEY,
+                   base_url=getattr(cfg, 'FMP_BASE_URL', FMP_BASE_URL),
+                   max_workers=getattr(cfg, 'FETCH_MAX_WORKERS', 8),
+                   max_retries=getattr(cfg, 'FETCH_MAX_RETRIES', 3),
+                   backoff_seconds=getattr(cfg, 'FETCH_BACKOFF_SECONDS', 0.5),
+                   backend=getattr(cfg, 'FETCH_BACKEND', 'threads'))
+
+    def fetch(self, symbol, from_date, to_date):
+        """
+        Fetches one symbol's 'close' history. A successful response without rows (e.g. a
+        range with no trading days) gives an empty frame; None means the request failed
+        once retries were exhausted, so callers can tell the two apart.
+        """
+        url = f"{self.base_url}/historical-price-full/{symbol}"
+        params = {'from': from_date, 'to': to_date, 'apikey': self.api_key}
+        started = time.perf_counter()
+        error = None
+        data = None
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt <= self.max_retries:
+                    raise requests.exceptions.HTTPError(f"{response.status_code} Server Error", response=response)
+                response.raise_for_status()
+                data = response.json()
+                error = None
+                break
+            except requests.exceptions.RequestException as e:
+                error = e
+                status = e.response.status_code if e.response is not None else None
+                if attempt > self.max_retries or (status is not None and status not in RETRYABLE_STATUS_CODES):
+                    break
+                time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+
+        if error is not None:
+            print(f"Error fetching data for {symbol}: {error}")
+            df = None
+        else:
+            df = parse_fmp_historical(symbol, data, from_date, to_date)
+
+        with self._stats_lock:
+            self.stats.append({'symbol': symbol, 'from': from_date, 'to': to_date, 'attempts': attempt,
+                               'seconds': time.perf_counter() - started, 'rows': 0 if df is None else len(df),
+                               'error': None if error is None else str(error)})
+        return df
+
+    def fetch_many(self, jobs):
+        """Fetches (symbol, from_date, to_date) jobs concurrently; returns frames (None on failure) in job order."""
+        jobs = list(jobs)
+        if not jobs:
+            return []
+        if self.backend == 'asyncio':
+            return asyncio.run(self._fetch_many_async(jobs))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            return list(pool.map(lambda job: self.fetch(*job), jobs))
+
+    async def _fetch_many_async(self, jobs):
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch_one(job):
+            async with semaphore:
+                return await asyncio.to_thread(self.fetch, *job)
+
+        return await asyncio.gather(*(fetch_one(job) for job in jobs))
+
+    def stats_frame(self):
+        """Per-request timing stats (symbol, range, attempts, seconds, rows, error) as a DataFrame."""
+        with self._stats_lock:
+            return pd.DataFrame(self.stats, columns=['symbol', 'from', 'to', 'attempts', 'seconds', 'rows', 'error'])
+
+
+class FMPStubServer:
+    """
+    In-process stand-in for the FMP historical-price-full endpoint, for tests.
+    Serves {symbol: DataFrame with 'date'/'close'} on 127.0.0.1 and can fail the
+    first `fail_first` requests per symbol with HTTP `fail_status` (503 by default)
+    to exercise retries.
+    Use as a context manager and pass `base_url` to FMPFetcher.
+    """
+
+    def __init__(self, frames, fail_first=0, latency_seconds=0.0, fail_status=503):
+        self.frames = {symbol: df.assign(date=pd.to_datetime(df['date'])) for symbol, df in frames.items()}
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.latency_seconds = latency_seconds
+        self.request_counts = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v3"
+
+    def _handle(self, path, query):
+        prefix = '/api/v3/historical-price-full/'
+        if not path.startswith(prefix):
+            return 404, {}
+        symbol = unquote(path[len(prefix):])
+        with self._lock:
+            count = self.request_counts[symbol] = self.request_counts.get(symbol, 0) + 1
+        if count <= self.fail_first:
+            return self.fail_status, {'Error Message': 'Service unavailable'}
+        if symbol not in self.frames:
+            return 200, {}
+        df = self.frames[symbol]
+        mask = pd.Series(True, index=df.index)
+        if 'from' in query:
+            mask &= df['date'] >= pd.Timestamp(query['from'][0])
+        if 'to' in query:
+            mask &= df['date'] <= pd.Timestamp(query['to'][0])
+        rows = df[mask].sort_values(by='date', ascending=False)  # FMP returns newest first
+        return 200, {'symbol': symbol,
+                     'historical': [{'date': str(d.date()), 'close': float(c)}
+                                    for d, c in zip(rows['date'], rows['close'])]}
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if stub.latency_seconds:
+                    time.sleep(stub.latency_seconds)
+                parsed = urlparse(self.path)
+                status, payload = stub._handle(parsed.path, parse_qs(parsed.query))
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,158 @@
+# monte_carlo.py
+# Stationary block bootstrap of the prepared market data for confidence intervals
+# on the Model A / Model B comparison.
+#
+# Each synthetic path resamples joint (S&P 500 return, VIX, SOFR) rows in blocks
+# of geometric length (Politis & Romano), so volatility clustering and the
+# return/VIX relationship survive within blocks. Signals, Model A and Model B run
+# over a whole chunk of paths as (paths, days) arrays; chunks are spread over a
+# process pool and only per-path metrics are kept, so memory is bounded by the
+# chunk size rather than the number of paths.
+
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import risk_metrics
+import signal_generation
+import simulation_engine
+from cfd_cost_model import cost_model_from_config
+
+BOOTSTRAP_COLUMNS = ['SP500_Return', 'VIX', 'SOFR_Rate']
+MONTE_CARLO_SETTINGS = (['EQUITY_ALLOC_A', 'TRADING_DAYS_PER_YEAR'] + signal_generation.SIGNAL_PARAM_NAMES
+                        + simulation_engine.MODEL_B_SWEEP_PARAMS)
+
+
+def bootstrap_source_rows(df_data):
+    """(rows, 3) array of joint (SP500_Return, VIX, SOFR_Rate) days with a valid return and VIX."""
+    df_rows = df_data[BOOTSTRAP_COLUMNS].copy()
+    df_rows['SOFR_Rate'] = df_rows['SOFR_Rate'].ffill().fillna(0.0)
+    return df_rows.dropna().to_numpy(dtype=float)
+
+
+def stationary_bootstrap_indices(n_rows, n_paths, n_days, mean_block_length, rng):
+    """
+    (paths, days) row indices for a stationary block bootstrap.
+    A new block starts each day with probability 1/mean_block_length at a uniformly
+    random row; otherwise the next row follows, wrapping around at the end.
+    """
+    new_block = rng.random((n_paths, n_days)) < 1.0 / mean_block_length
+    new_block[:, 0] = True
+    block_starts = rng.integers(0, n_rows, size=(n_paths, n_days))
+    days = np.arange(n_days)
+    last_start = np.maximum.accumulate(np.where(new_block, days, 0), axis=1)
+    start_rows = np.take_along_axis(block_starts, last_start, axis=1)
+    return (start_rows + (days - last_start)) % n_rows
+
+
+def _simulate_chunk(source_rows, n_paths, n_days, mean_block_length, seed, settings,
+                    initial_capital, start_price, rfr_annual, cost_model):
+    """Bootstraps one chunk of paths and returns the per-path metric tables for Model A and Model B."""
+    cfg = types.SimpleNamespace(**settings)
+    rng = np.random.default_rng(seed)
+    indices = stationary_bootstrap_indices(len(source_rows), n_paths, n_days, mean_block_length, rng)
+    paths = source_rows[indices]  # (paths, days, 3)
+    sp500_returns = np.ascontiguousarray(paths[..., 0])
+    vix = np.ascontiguousarray(paths[..., 1])
+    sofr_rates = np.ascontiguousarray(paths[..., 2])
+    sp500_prices = start_price * np.cumprod(1 + sp500_returns, axis=1)
+
+    short, cover_momentum, cover_absolute_vix = signal_generation.compute_vix_momentum_signal_arrays(
+        vix, int(cfg.MOMENTUM_LOOKBACK_PERIOD), cfg.VIX_PCT_CHANGE_THRESHOLD_UP, cfg.VIX_PCT_CHANGE_THRESHOLD_DOWN,
+        cfg.N_CONSECUTIVE_UP_DAYS_TO_SHORT, cfg.N_CONSECUTIVE_DOWN_DAYS_TO_COVER, cfg.VIX_ABSOLUTE_COVER_THRESHOLD)
+
+    values_a = simulation_engine.model_a_value_matrix(sp500_returns, initial_capital, cfg.EQUITY_ALLOC_A)
+    arrays = simulation_engine.model_b_param_arrays(
+        {name: np.full(n_paths, getattr(cfg, name)) for name in simulation_engine.MODEL_B_SWEEP_PARAMS}, cfg)
+    values_b = simulation_engine.model_b_value_matrix(
+        sp500_returns, sp500_prices, sofr_rates, short, cover_momentum, cover_absolute_vix, initial_capital,
+        arrays, cost_model)
+
+    metrics_a = risk_metrics.calculate_metrics_batch(values_a, rfr_annual, initial_capital, cfg.TRADING_DAYS_PER_YEAR)
+    metrics_b = risk_metrics.calculate_metrics_batch(values_b, rfr_annual, initial_capital, cfg.TRADING_DAYS_PER_YEAR)
+    return metrics_a.drop(columns="Portfolio"), metrics_b.drop(columns="Portfolio")
+
+
+def run_monte_carlo(df_data, cfg, n_paths=10_000, n_days=None, mean_block_length=20, chunk_size=1_000,
+                    seed=0, max_workers=None, rfr_annual=None):
+    """
+    Simulates Model A and Model B over n_paths bootstrapped market paths.
+
+    n_days defaults to the length of the historical sample. Paths are processed in
+    chunks of chunk_size on a process pool (max_workers=None uses every core; 1
+    runs in-process). Each chunk draws from its own seed spawned from `seed`, so
+    results do not depend on the number of workers. Model B runs on the batched
+    engine with the cost model selected by cfg.CFD_COST_MODEL.
+
+    Returns {'A': metrics, 'B': metrics} with one row per path.
+    """
+    source_rows = bootstrap_source_rows(df_data)
+    if len(source_rows) == 0:
+        print("Monte Carlo: no valid market data rows to bootstrap.")
+        return {'A': pd.DataFrame(), 'B': pd.DataFrame()}
+    if n_days is None:
+        n_days = len(source_rows)
+    if rfr_annual is None:
+        rfr_annual = df_data['SOFR_Rate'].mean()
+    settings = {name: getattr(cfg, name) for name in MONTE_CARLO_SETTINGS}
+    cost_model = cost_model_from_config(cfg)
+    start_price = float(df_data['S&P500'].dropna().iloc[0]) if 'S&P500' in df_data.columns else 1.0
+
+    chunk_sizes = [min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    jobs = [(source_rows, size, n_days, mean_block_length, chunk_seed, settings,
+             cfg.INITIAL_CAPITAL, start_price, rfr_annual, cost_model) for size, chunk_seed in zip(chunk_sizes, seeds)]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(jobs))
+
+    print(f"--- Monte Carlo: {n_paths} paths x {n_days} days in {len(jobs)} chunk(s) on {max_workers} worker(s) ---")
+    if max_workers <= 1:
+        results = [_simulate_chunk(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_simulate_chunk, *zip(*jobs)))
+
+    return {
+        'A': pd.concat([metrics_a for metrics_a, _ in results], ignore_index=True),
+        'B': pd.concat([metrics_b for _, metrics_b in results], ignore_index=True),
+    }
+
+
+def summarize_monte_carlo(results, confidence=0.95):
+    """
+    Per-metric distribution summary: median and confidence interval for each model,
+    and the share of paths on which Model B's metric exceeds Model A's.
+    """
+    tail = (1.0 - confidence) / 2.0 * 100.0
+    metrics_a, metrics_b = results['A'], results['B']
+    rows = []
+    for metric in risk_metrics.METRIC_NAMES:
+        a = metrics_a[metric].to_numpy(dtype=float)
+        b = metrics_b[metric].to_numpy(dtype=float)
+        a_lo, a_mid, a_hi = np.nanpercentile(a, [tail, 50.0, 100.0 - tail])
+        b_lo, b_mid, b_hi = np.nanpercentile(b, [tail, 50.0, 100.0 - tail])
+        comparable = ~(np.isnan(a) | np.isnan(b))
+        rows.append({
+            'Metric': metric,
+            'A Median': a_mid, 'A CI Low': a_lo, 'A CI High': a_hi,
+            'B Median': b_mid, 'B CI Low': b_lo, 'B CI High': b_hi,
+            'P(B > A)': (b[comparable] > a[comparable]).mean() if comparable.any() else np.nan,
+        })
+    return pd.DataFrame(rows).set_index('Metric')
+
+
+if __name__ == '__main__':
+    import config as cfg
+    import data_loader
+
+    df_market_data = data_loader.load_and_prepare_market_data(cfg)
+    if df_market_data.empty:
+        print("Exiting due to data loading issues.")
+    else:
+        df_paths_source = df_market_data.dropna(subset=['SP500_Return', 'S&P500', 'VIX']).reset_index(drop=True)
+        summary = summarize_monte_carlo(run_monte_carlo(df_paths_source, cfg))
+        print(summary.to_string(float_format=lambda x: f"{x:.4f}"))
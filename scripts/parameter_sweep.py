@@ -0,0 +1,36 @@
+import itertools
+
+import pandas as pd
+import numpy as np
+
+import risk_metrics
+import simulation_engine
+
+
+def expand_param_grid(param_grid):
+    """Expands {config_name: [values, ...]} into one row per configuration (cartesian product)."""
+    if not param_grid:
+        return pd.DataFrame(index=pd.RangeIndex(1))
+    names = list(param_grid.keys())
+    combos = list(itertools.product(*(np.atleast_1d(param_grid[name]) for name in names)))
+    return pd.DataFrame(combos, columns=names)
+
+
+def run_model_b_sweep(df_data_with_signals, initial_capital, param_grid, cfg, rfr_annual=None):
+    """Runs every Model B configuration of a parameter grid in one batched pass.
+
+    param_grid maps names from simulation_engine.MODEL_B_SWEEP_PARAMS to lists of
+    values; names not in the grid use the value in cfg. Returns the (configs, days)
+    value matrix and a metrics table with one row per configuration.
+    """
+    configs = expand_param_grid(param_grid)
+    print(f"--- Running Model B sweep over {len(configs)} configurations ---")
+    portfolio_values = simulation_engine.simulate_portfolio_B_batch(
+        df_data_with_signals, initial_capital, configs, cfg)
+
+    if rfr_annual is None:
+        rfr_annual = df_data_with_signals['SOFR_Rate'].mean() if not df_data_with_signals.empty else np.nan
+    metrics = risk_metrics.calculate_metrics_batch(
+        portfolio_values, rfr_annual, initial_capital, cfg.TRADING_DAYS_PER_YEAR).drop(columns="Portfolio")
+    metrics_table = pd.concat([configs.reset_index(drop=True), metrics], axis=1)
+    return portfolio_values, metrics_table
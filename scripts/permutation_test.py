@@ -0,0 +1,132 @@
+# permutation_test.py
+# Permutation tests for the VIX momentum signal and the H1-H4 comparisons.
+#
+# Under the null the hedge signals carry no information about the market: the
+# observed short/cover series are re-timed -- circularly shifted by a random offset
+# or block-shuffled -- which keeps how often and how long the hedge is on (and the
+# short/cover pairing) but breaks its alignment with the S&P 500. Every null series
+# of a chunk is one row of a (permutations, days) index matrix, so the re-timed
+# signals are a single fancy-indexing gather and all of them run through the
+# batched Model B kernel and calculate_metrics_batch together. Model A does not use
+# the signals, so each p-value compares the observed B - A difference with the
+# B - A differences under the null. The nulls are priced with the same cost model
+# as the observed run (cfg.CFD_COST_MODEL).
+
+import numpy as np
+import pandas as pd
+
+import risk_metrics
+import simulation_engine
+from cfd_cost_model import cost_model_from_config
+
+SIGNAL_COLUMNS = ['Short_Signal_Today', 'Cover_Signal_Momentum_Today', 'Cover_Signal_Absolute_VIX_Today']
+
+# (hypothesis, metric, direction of B - A the hypothesis claims)
+HYPOTHESIS_TESTS = [
+    ('H1', 'Annualized Return', 'greater'),
+    ('H2', 'Annualized Volatility', 'greater'),
+    ('H3', 'Sharpe Ratio', 'greater'),
+    ('H4', 'Max Drawdown', 'greater'),  # drawdowns are negative: greater is shallower
+    ('H4', 'Annualized Volatility', 'less'),
+]
+
+
+def circular_shift_indices(n_days, n_permutations, rng, min_shift=21):
+    """(permutations, days) indices rolling the series by offsets in [min_shift, n_days - min_shift]."""
+    min_shift = min(int(min_shift), n_days // 2)
+    shifts = rng.integers(min_shift, n_days - min_shift + 1, size=n_permutations)
+    return (np.arange(n_days) + shifts[:, np.newaxis]) % n_days
+
+
+def block_shuffle_indices(n_days, n_permutations, rng, block_length=21):
+    """(permutations, days) indices putting consecutive blocks of block_length days in random order."""
+    n_blocks = -(-n_days // block_length)
+    blocks = np.arange(n_blocks * block_length).reshape(n_blocks, block_length)
+    order = np.argsort(rng.random((n_permutations, n_blocks)), axis=1)
+    indices = blocks[order].reshape(n_permutations, -1)
+    # Drop the padding of the last (short) block wherever it landed.
+    return indices[indices < n_days].reshape(n_permutations, n_days)
+
+
+NULL_METHODS = {'circular': circular_shift_indices, 'block': block_shuffle_indices}
+
+
+def _model_b_metrics(market, signals, indices, cfg, rfr_annual, cost_model):
+    """Batched Model B metrics with the signals re-timed by each row of indices."""
+    n_rows = len(indices)
+    arrays = simulation_engine.model_b_param_arrays(
+        {name: np.full(n_rows, getattr(cfg, name)) for name in simulation_engine.MODEL_B_SWEEP_PARAMS}, cfg)
+    values = simulation_engine.model_b_value_matrix(
+        market['SP500_Return'], market['S&P500'], market['SOFR_Rate'],
+        *(signal[indices] for signal in signals), cfg.INITIAL_CAPITAL, arrays, cost_model)
+    return risk_metrics.calculate_metrics_batch(values, rfr_annual, cfg.INITIAL_CAPITAL,
+                                                cfg.TRADING_DAYS_PER_YEAR).drop(columns="Portfolio")
+
+
+def run_permutation_test(df_data_with_signals, cfg, n_permutations=5_000, method='circular', block_length=21,
+                         seed=0, chunk_size=2_000, rfr_annual=None, metrics_b=None, metrics_a=None):
+    """
+    Permutation test of Model B's signal timing against Model A.
+
+    df_data_with_signals: the simulation frame (signals from generate_vix_momentum_signals).
+    method: 'circular' (random circular shifts of at least block_length days) or
+    'block' (block shuffles with blocks of block_length days). The nulls run on the
+    batched Model B kernel with the cost model selected by cfg. metrics_b /
+    metrics_a: the observed runs' metrics (e.g. main's metrics_B_full /
+    metrics_A_full), so the table matches the H1-H4 findings; if None they are
+    simulated here, on the batched kernel. The 'B Source'
+    column says which.
+
+    Returns a dict with 'summary' (one row per hypothesis test: observed B, A, B - A,
+    where B came from, the null distribution of B - A and a one-sided p-value in the claimed direction),
+    'null' (B - A per permutation for every tested metric) and 'observed'.
+    """
+    if method not in NULL_METHODS:
+        raise ValueError(f"Unknown permutation method '{method}'; expected one of {sorted(NULL_METHODS)}")
+    n_days = len(df_data_with_signals)
+    market = {col: df_data_with_signals[col].to_numpy(dtype=float) for col in ['SP500_Return', 'S&P500', 'SOFR_Rate']}
+    market['SOFR_Rate'] = np.nan_to_num(market['SOFR_Rate'], nan=0.0)
+    signals = [df_data_with_signals[col].to_numpy(dtype=bool) for col in SIGNAL_COLUMNS]
+    if rfr_annual is None:
+        rfr_annual = df_data_with_signals['SOFR_Rate'].mean()
+    metric_names = list(dict.fromkeys(metric for _, metric, _ in HYPOTHESIS_TESTS))
+    cost_model = cost_model_from_config(cfg)
+
+    if metrics_a is None:
+        values_a = simulation_engine.model_a_value_matrix(market['SP500_Return'], cfg.INITIAL_CAPITAL,
+                                                          cfg.EQUITY_ALLOC_A)
+        metrics_a = risk_metrics.calculate_metrics_batch(values_a, rfr_annual, cfg.INITIAL_CAPITAL,
+                                                         cfg.TRADING_DAYS_PER_YEAR).iloc[0]
+    metrics_a = pd.Series(metrics_a)[metric_names].astype(float)
+    if metrics_b is None:
+        b_source = f"batched kernel ({cost_model.name} costs)"
+        metrics_b = _model_b_metrics(market, signals, np.arange(n_days)[np.newaxis, :], cfg,
+                                     rfr_annual, cost_model).iloc[0]
+    else:
+        b_source = f"observed run ({cost_model.name} costs)"
+    metrics_b = pd.Series(metrics_b)[metric_names].astype(float)
+
+    print(f"--- Permutation test: {n_permutations} {method} nulls x {n_days} days ---")
+    rng = np.random.default_rng(seed)
+    null_tables = []
+    for start in range(0, n_permutations, chunk_size):
+        indices = NULL_METHODS[method](n_days, min(chunk_size, n_permutations - start), rng, block_length)
+        null_tables.append(_model_b_metrics(market, signals, indices, cfg, rfr_annual, cost_model)[metric_names])
+    null_differences = pd.concat(null_tables, ignore_index=True) - metrics_a
+
+    rows = []
+    for hypothesis, metric, direction in HYPOTHESIS_TESTS:
+        observed = metrics_b[metric] - metrics_a[metric]
+        null = null_differences[metric].to_numpy(dtype=float)
+        null = null[~np.isnan(null)]
+        extreme = (null >= observed) if direction == 'greater' else (null <= observed)
+        rows.append({
+            'Hypothesis': hypothesis, 'Metric': metric, 'Direction': f"B {'>' if direction == 'greater' else '<'} A",
+            'B': metrics_b[metric], 'A': metrics_a[metric], 'B - A': observed, 'B Source': b_source,
+            'Null Mean': null.mean() if len(null) else np.nan,
+            'Null 2.5%': np.percentile(null, 2.5) if len(null) else np.nan,
+            'Null 97.5%': np.percentile(null, 97.5) if len(null) else np.nan,
+            'p-value': (1 + extreme.sum()) / (1 + len(null)),
+        })
+    return {'summary': pd.DataFrame(rows), 'null': null_differences,
+            'observed': (metrics_b - metrics_a).rename('B - A')}
@@ -0,0 +1,156 @@
+# portfolio_engine.py
+# Multi-instrument portfolio with several concurrent short CFD hedges.
+#
+# Generalises Model B from one index and one hedge to N instruments held at target
+# weights (the rest in cash, rebalanced daily) and M short CFD hedges. Each hedge
+# targets one instrument and has its own open/cover signals; the hedge book is held
+# as (M,) arrays of active flags, entry prices, notionals and margin, and every day
+# is a handful of vector operations over the (days x instruments) price matrix.
+# With one instrument and one hedge it reproduces simulate_portfolio_B_momentum exactly
+# (returns are taken from the prices, i.e. SP500_Return = S&P500.pct_change()).
+
+import numpy as np
+import pandas as pd
+
+
+def hedge_signal_matrix(signals, n_days, n_hedges):
+    """Returns (days, hedges) booleans from a (days,) signal shared by all hedges or a (days, hedges) matrix."""
+    signals = np.asarray(signals, dtype=bool)
+    if signals.ndim == 1:
+        signals = signals[:, None]
+    return np.ascontiguousarray(np.broadcast_to(signals, (n_days, n_hedges)))
+
+
+def returns_from_prices(prices):
+    """Simple daily returns of a (days, instruments) price matrix; the first row is NaN (as pct_change)."""
+    prices = np.asarray(prices, dtype=float)
+    returns = np.full(prices.shape, np.nan)
+    returns[1:] = prices[1:] / prices[:-1] - 1
+    return returns
+
+
+def simulate_hedged_portfolio(prices, target_weights, hedge_instruments, hedge_ratios,
+                              open_signals, close_signals, sofr_rates, initial_capital,
+                              cost_model, record_hedges=False):
+    """
+    Simulates N instruments at target weights plus M short CFD hedges.
+
+    prices: (days, N) price matrix (ndarray or DataFrame, e.g. data_loader.load_price_matrix).
+    target_weights: (N,) weights; 1 - sum(weights) is held as cash.
+    hedge_instruments: (M,) column index of the instrument each hedge shorts.
+    hedge_ratios: (M,) fraction of that instrument's holding hedged when the hedge opens.
+    open_signals / close_signals: (days,) or (days, M) booleans.
+    cost_model: cfd_cost_model backend shared by all hedges (e.g. cost_model_from_config(cfg)).
+
+    Each day: holdings grow with their returns, open hedges accrue financing, hedges
+    with a close signal settle P&L, spread and margin, hedges with an open signal
+    open in hedge order while cash covers their margin, then the book is rebalanced
+    to the target weights. Days where every price is missing hold their value; an
+    instrument with a missing price has a zero return and no hedge trades.
+
+    Returns a dict with 'values' (Series if prices is a DataFrame, else ndarray) and
+    the final 'cash' and hedge arrays; with record_hedges also 'hedge_notionals' (days, M).
+    """
+    index = prices.index if isinstance(prices, pd.DataFrame) else None
+    prices = np.asarray(prices, dtype=float)
+    if prices.ndim == 1:
+        prices = prices[:, None]
+    n_days, n_instruments = prices.shape
+    target_weights = np.asarray(target_weights, dtype=float)
+    hedge_instruments = np.asarray(hedge_instruments, dtype=int)
+    hedge_ratios = np.asarray(hedge_ratios, dtype=float)
+    n_hedges = len(hedge_instruments)
+    if len(target_weights) != n_instruments:
+        raise ValueError(f"Expected {n_instruments} target weights, got {len(target_weights)}.")
+    cash_weight = 1.0 - target_weights.sum()
+
+    returns = returns_from_prices(prices)
+    price_missing = np.isnan(prices) | np.isnan(returns)
+    day_missing = price_missing.all(axis=1)
+    returns = np.where(price_missing, 0.0, returns)
+
+    hedge_prices = prices[:, hedge_instruments]
+    hedge_tradable = ~price_missing[:, hedge_instruments]
+    open_signals = hedge_signal_matrix(open_signals, n_days, n_hedges) & hedge_tradable
+    close_signals = hedge_signal_matrix(close_signals, n_days, n_hedges) & hedge_tradable
+    sofr_rates = np.nan_to_num(np.asarray(sofr_rates, dtype=float), nan=0.0)[:, None]
+    financing = np.broadcast_to(cost_model.daily_financing_factors(sofr_rates, hedge_prices)
+                                - cost_model.daily_borrow_factors(sofr_rates, hedge_prices), (n_days, n_hedges))
+
+    initial_capital = float(initial_capital)
+    total_value = initial_capital
+    holdings = initial_capital * target_weights
+    cash_value = initial_capital * cash_weight
+    active = np.zeros(n_hedges, dtype=bool)
+    entry_prices = np.zeros(n_hedges)
+    notionals = np.zeros(n_hedges)
+    margins = np.zeros(n_hedges)
+
+    values = np.empty(n_days)
+    hedge_notionals = np.zeros((n_days, n_hedges)) if record_hedges else None
+
+    for t in range(n_days):
+        if day_missing[t]:
+            values[t] = total_value
+            if record_hedges:
+                hedge_notionals[t] = notionals
+            continue
+
+        # 1. Holdings grow/shrink
+        holdings = holdings * (1 + returns[t])
+
+        # 2. CFD financing on open hedges
+        if active.any():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                units = cost_model.financing_units(notionals, entry_prices)
+            cash_value += np.where(active, units * financing[t], 0.0).sum()
+
+        # 3. Hedging logic: covers first, then opens on hedges that were flat this morning
+        price_t = hedge_prices[t]
+        closing = active & close_signals[t]
+        if closing.any():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                pnl = notionals * (1 - (price_t / entry_prices))
+                spread_cost = cost_model.close_cost(notionals, entry_prices, price_t)
+            cash_value += np.where(closing, pnl, 0.0).sum()
+            cash_value -= np.where(closing, spread_cost, 0.0).sum()
+            cash_value += np.where(closing, margins, 0.0).sum()
+
+        candidates = ~active & open_signals[t]
+        if candidates.any():
+            amounts = hedge_ratios * holdings[hedge_instruments]
+            margin_required = np.where(candidates, cost_model.margin(amounts, price_t), 0.0)
+            opening = candidates & (np.cumsum(margin_required) <= cash_value)
+            cash_value -= np.where(opening, margin_required, 0.0).sum()
+            entry_prices = np.where(opening, price_t, entry_prices)
+            notionals = np.where(opening, amounts, notionals)
+            margins = np.where(opening, margin_required, margins)
+            active = active | opening
+
+        if closing.any():
+            active = active & ~closing
+            entry_prices = np.where(closing, 0.0, entry_prices)
+            notionals = np.where(closing, 0.0, notionals)
+            margins = np.where(closing, 0.0, margins)
+
+        # 4. Update total portfolio value
+        total_value = holdings.sum() + cash_value
+        values[t] = total_value
+        if record_hedges:
+            hedge_notionals[t] = notionals
+
+        # 5. Daily rebalance to target weights
+        holdings = total_value * target_weights
+        cash_value = total_value * cash_weight
+
+    result = {
+        'values': pd.Series(values, index=index) if index is not None else values,
+        'cash': cash_value,
+        'active': active,
+        'entry_prices': entry_prices,
+        'notionals': notionals,
+        'margins': margins,
+    }
+    if record_hedges:
+        result['hedge_notionals'] = hedge_notionals
+    return result
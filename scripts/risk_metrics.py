@@ -152,4 +152,167 @@ def calculate_metrics_summary(portfolio_name: str,
     else:
         metrics["Recovery Factor"] = metrics["Total Return"] / abs(max_drawdown_value)
         
-    return metrics
\ No newline at end of file
+    return metrics
+
+METRIC_NAMES = [
+    "Total Return", "Annualized Return", "Annualized Volatility", "Sharpe Ratio",
+    "Max Drawdown", "Calmar Ratio", "Sortino Ratio", "Daily VaR 95%",
+    "Daily CVaR 95%", "Omega Ratio", "Skewness", "Kurtosis", "Best Day",
+    "Worst Day", "Win Rate %", "Average Win %", "Average Loss %",
+    "Profit Factor", "Recovery Factor"
+]
+
+
+def signed_inf_ratio(numerator, denominator):
+    """numerator / denominator, with the +/-inf (or 0 for a zero numerator) convention for a zero denominator."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = numerator / denominator
+    at_zero = np.where(numerator > 0, np.inf, np.where(numerator < 0, -np.inf, 0.0))
+    return np.where(denominator == 0, at_zero, ratio)
+
+
+def ratio_to_drawdown(numerator, max_drawdown):
+    """Calmar/Recovery convention: numerator / |MDD|, inf or 0 for a zero drawdown, NaN otherwise."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = numerator / np.abs(max_drawdown)
+    at_zero = np.where(numerator > 0, np.inf, np.where(numerator == 0, 0.0, np.nan))
+    return np.where(max_drawdown == 0, at_zero, ratio)
+
+
+def portfolio_returns_matrix(portfolio_values: np.ndarray, initial_capital: float) -> np.ndarray:
+    """
+    Daily returns experienced by each portfolio row: day 0 is measured against the
+    initial capital (and dropped if that is 0), later days follow
+    pct_change().fillna(0) semantics, as in calculate_metrics_summary.
+    """
+    portfolio_values = np.atleast_2d(np.asarray(portfolio_values, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        subsequent_returns = portfolio_values[:, 1:] / portfolio_values[:, :-1] - 1
+    subsequent_returns = np.where(np.isnan(subsequent_returns), 0.0, subsequent_returns)
+    if initial_capital == 0 or portfolio_values.shape[1] == 0:
+        return subsequent_returns
+    return np.concatenate([portfolio_values[:, :1] / initial_capital - 1, subsequent_returns], axis=1)
+
+
+def calculate_metrics_batch(portfolio_values: np.ndarray,
+                            rfr_annual: float,
+                            initial_capital: float,
+                            trading_days_per_year: int,
+                            portfolio_names=None) -> pd.DataFrame:
+    """
+    Calculates the calculate_metrics_summary metrics for every row of a
+    (portfolios, days) value matrix in one vectorised pass.
+    Row k matches calculate_metrics_summary(name, values_k, values_k.pct_change().fillna(0), ...)
+    including its zero-volatility, zero-drawdown and empty-input conventions.
+    rfr_annual may also be a (portfolios,) array, e.g. for scenarios with shifted rates.
+    """
+    portfolio_values = np.atleast_2d(np.asarray(portfolio_values, dtype=float))
+    n_portfolios, n_days = portfolio_values.shape
+    if portfolio_names is None:
+        portfolio_names = [f"Portfolio {k}" for k in range(n_portfolios)]
+    metrics = {"Portfolio": list(portfolio_names)}
+
+    if n_days == 0 or initial_capital is None:
+        for key in METRIC_NAMES:
+            metrics[key] = np.full(n_portfolios, np.nan)
+        return pd.DataFrame(metrics)
+
+    returns = portfolio_returns_matrix(portfolio_values, initial_capital)
+    n = returns.shape[1]
+    has_returns = n > 0
+
+    # 1.-2. Total and Annualized Return
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total_return = portfolio_values[:, -1] / initial_capital - 1 if initial_capital != 0 else np.full(n_portfolios, np.nan)
+    annualized_return = (1 + total_return) ** (trading_days_per_year / n) - 1 if has_returns else np.full(n_portfolios, np.nan)
+    metrics["Total Return"] = total_return
+    metrics["Annualized Return"] = annualized_return
+
+    # 3.-4. Annualized Volatility and Sharpe Ratio
+    if n > 1:
+        annualized_volatility = returns.std(axis=1, ddof=1) * np.sqrt(trading_days_per_year)
+    elif n == 1:
+        annualized_volatility = np.where(np.isnan(returns[:, 0]), np.nan, 0.0)
+    else:
+        annualized_volatility = np.full(n_portfolios, np.nan)
+    metrics["Annualized Volatility"] = annualized_volatility
+    metrics["Sharpe Ratio"] = signed_inf_ratio(annualized_return - rfr_annual, annualized_volatility)
+
+    # 5.-6. Max Drawdown (initial capital counts as the first peak) and Calmar Ratio
+    values_for_drawdown = np.concatenate([np.full((n_portfolios, 1), float(initial_capital)), portfolio_values], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_drawdown = values_for_drawdown / np.fmax.accumulate(values_for_drawdown, axis=1) - 1.0
+    max_drawdown = np.nanmin(np.where(np.isnan(daily_drawdown), np.inf, daily_drawdown), axis=1)
+    max_drawdown = np.where(np.isinf(max_drawdown) & (max_drawdown > 0), np.nan, max_drawdown)
+    metrics["Max Drawdown"] = max_drawdown
+    metrics["Calmar Ratio"] = ratio_to_drawdown(annualized_return, max_drawdown)
+
+    # 7. Sortino Ratio
+    rfr_annual = np.asarray(rfr_annual, dtype=float)
+    rfr_daily = rfr_annual[..., np.newaxis] / trading_days_per_year
+    if has_returns:
+        downside_returns_sq = np.square(np.minimum(0, returns - rfr_daily))
+        downside_dev_annualized = np.sqrt(downside_returns_sq.mean(axis=1)) * np.sqrt(trading_days_per_year)
+    else:
+        downside_dev_annualized = np.full(n_portfolios, np.nan)
+    metrics["Sortino Ratio"] = signed_inf_ratio(annualized_return - rfr_annual, downside_dev_annualized)
+
+    if not has_returns:
+        for key in METRIC_NAMES[7:18]:
+            metrics[key] = np.full(n_portfolios, np.nan)
+    else:
+        # 8.-9. Historical VaR / CVaR 95%
+        var_95 = np.quantile(returns, 0.05, axis=1)
+        in_tail = returns <= var_95[:, np.newaxis]
+        tail_count = in_tail.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tail_mean = np.where(in_tail, returns, 0.0).sum(axis=1) / tail_count
+        metrics["Daily VaR 95%"] = var_95
+        metrics["Daily CVaR 95%"] = np.where(tail_count > 0, tail_mean, var_95)
+
+        # 10. Omega Ratio
+        gains_over_rfr = np.where(returns > rfr_daily, returns - rfr_daily, 0.0).sum(axis=1)
+        losses_under_rfr = np.where(returns < rfr_daily, rfr_daily - returns, 0.0).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            omega = gains_over_rfr / losses_under_rfr
+        metrics["Omega Ratio"] = np.where(losses_under_rfr != 0, omega, np.where(gains_over_rfr > 0, np.inf, np.nan))
+
+        # 11.-12. Sample skewness and excess kurtosis (pandas' bias-corrected estimators)
+        deviations = returns - returns.mean(axis=1, keepdims=True)
+        squared_deviations = deviations * deviations
+        m2 = squared_deviations.sum(axis=1)
+        m3 = (squared_deviations * deviations).sum(axis=1)
+        m4 = (squared_deviations * squared_deviations).sum(axis=1)
+        eps_scale = np.finfo(float).eps * np.abs(returns).max(axis=1)
+        m2 = np.where(np.abs(m2) <= eps_scale ** 2 * n, 0.0, m2)
+        m3 = np.where(np.abs(m3) <= eps_scale ** 3 * n, 0.0, m3)
+        m4 = np.where(np.abs(m4) <= eps_scale ** 4 * n, 0.0, m4)
+        metrics["Skewness"] = np.full(n_portfolios, np.nan)
+        metrics["Kurtosis"] = np.full(n_portfolios, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if n >= 3:
+                skewness = (n * (n - 1) ** 0.5 / (n - 2)) * (m3 / m2 ** 1.5)
+                metrics["Skewness"] = np.where(m2 == 0, 0.0, skewness)
+            if n >= 4:
+                kurt_denominator = (n - 2) * (n - 3) * m2 ** 2
+                kurtosis = n * (n + 1) * (n - 1) * m4 / kurt_denominator - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+                metrics["Kurtosis"] = np.where(kurt_denominator == 0, 0.0, kurtosis)
+        metrics["Best Day"] = returns.max(axis=1)
+        metrics["Worst Day"] = returns.min(axis=1)
+
+        # 13.-18. Win/loss statistics
+        is_win, is_loss = returns > 0, returns < 0
+        win_count, loss_count = is_win.sum(axis=1), is_loss.sum(axis=1)
+        gross_profit = np.where(is_win, returns, 0.0).sum(axis=1)
+        gross_loss = np.where(is_loss, returns, 0.0).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics["Win Rate %"] = win_count / n * 100
+            metrics["Average Win %"] = np.where(win_count > 0, gross_profit / win_count * 100, 0.0)
+            metrics["Average Loss %"] = np.where(loss_count > 0, gross_loss / loss_count * 100, 0.0)
+            profit_factor = gross_profit / np.abs(gross_loss)
+        metrics["Profit Factor"] = np.where(gross_loss != 0, profit_factor, np.where(gross_profit > 0, np.inf, np.nan))
+
+    # 19. Recovery Factor
+    metrics["Recovery Factor"] = ratio_to_drawdown(total_return, max_drawdown)
+
+    return pd.DataFrame(metrics)
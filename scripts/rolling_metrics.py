@@ -0,0 +1,180 @@
+import pandas as pd
+import numpy as np
+
+import risk_metrics
+
+
+def _prefix_window_sums(x, window):
+    """Trailing `window`-length sums along the last axis in one prefix-sum pass (partial until the window fills)."""
+    prefix = np.concatenate([np.zeros(x.shape[:-1] + (1,)), np.cumsum(x, axis=-1)], axis=-1)
+    sums = prefix[..., 1:].copy()
+    if window <= x.shape[-1]:
+        sums[..., window - 1:] = prefix[..., window:] - prefix[..., :-window]
+    return sums
+
+
+def _window_sums(x, window):
+    """
+    Trailing sums of the valid (non-NaN) points of each window and their count.
+    NaNs are summed as zero and counted in a second prefix sum, so a missing value
+    only affects the windows that contain it.
+    """
+    valid = ~np.isnan(x)
+    return _prefix_window_sums(np.where(valid, x, 0.0), window), _prefix_window_sums(valid.astype(float), window)
+
+
+def _min_periods(window, min_periods):
+    """pandas-style min_periods: defaults to the full window."""
+    return window if min_periods is None else max(int(min_periods), 1)
+
+
+def _blocked(x, length, fill):
+    """Pads the last axis to a multiple of `length` and reshapes it into (..., blocks, length)."""
+    n = x.shape[-1]
+    n_blocks = -(-n // length)
+    padded = np.full(x.shape[:-1] + (n_blocks * length,), fill)
+    padded[..., :n] = x
+    return padded.reshape(x.shape[:-1] + (n_blocks, length))
+
+
+def _rolling_max_drawdown_values(values, length):
+    """
+    Exact max drawdown of every trailing `length`-point window of `values` (last axis), in O(n).
+    Uses the van Herk/Gil-Werman block decomposition: each window is the suffix of one
+    block followed by the prefix of the next. Prefix and suffix (max, min, max drawdown)
+    are running accumulations, and two adjacent segments A, B merge exactly as
+    mdd = min(mdd_A, mdd_B, min_B / max_A - 1). NaN values are skipped (fmax/fmin).
+    """
+    n = values.shape[-1]
+    out = np.full(values.shape, np.nan)
+    if length > n or length < 1:
+        return out
+    if length == 1:
+        out[...] = 0.0
+        return out
+
+    blocks = _blocked(values, length, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Prefix aggregates, left to right within each block.
+        prefix_max = np.fmax.accumulate(blocks, axis=-1)
+        prefix_min = np.fmin.accumulate(blocks, axis=-1)
+        prefix_mdd = np.fmin.accumulate(blocks / prefix_max - 1.0, axis=-1)
+
+        # Suffix aggregates, right to left within each block.
+        reversed_blocks = blocks[..., ::-1]
+        suffix_max = np.fmax.accumulate(reversed_blocks, axis=-1)[..., ::-1]
+        suffix_min = np.fmin.accumulate(reversed_blocks, axis=-1)[..., ::-1]
+        # mdd([s..e]) = min(mdd([s+1..e]), min([s+1..e]) / v_s - 1), with 0 for a single point.
+        step = np.zeros_like(blocks)
+        step[..., :-1] = suffix_min[..., 1:] / blocks[..., :-1] - 1.0
+        suffix_mdd = np.fmin.accumulate(np.fmin(step, 0.0)[..., ::-1], axis=-1)[..., ::-1]
+
+    flat = lambda a: a.reshape(values.shape[:-1] + (-1,))[..., :n]
+    prefix_max, prefix_min, prefix_mdd = flat(prefix_max), flat(prefix_min), flat(prefix_mdd)
+    suffix_max, suffix_mdd = flat(suffix_max), flat(suffix_mdd)
+
+    ends = np.arange(length - 1, n)
+    starts = ends - length + 1
+    aligned = (ends + 1) % length == 0  # window is exactly one block
+    with np.errstate(divide='ignore', invalid='ignore'):
+        merged = np.fmin(np.fmin(suffix_mdd[..., starts], prefix_mdd[..., ends]),
+                         prefix_min[..., ends] / suffix_max[..., starts] - 1.0)
+    out[..., length - 1:] = np.where(aligned, prefix_mdd[..., ends], merged)
+    return out
+
+
+def rolling_volatility(returns, window, trading_days_per_year, min_periods=None):
+    """Annualized rolling volatility (ddof=1) from running sums of centred returns; NaN returns are skipped."""
+    returns = np.asarray(returns, dtype=float)
+    min_periods = max(_min_periods(window, min_periods), 2)
+    if window < 2 or not returns.shape[-1]:
+        return np.full(returns.shape, np.nan)
+    # Centring on the overall mean of the valid returns keeps the sum-of-squares
+    # subtraction well conditioned.
+    valid = ~np.isnan(returns)
+    overall_mean = np.where(valid, returns, 0.0).sum(axis=-1, keepdims=True) / np.maximum(
+        valid.sum(axis=-1, keepdims=True), 1)
+    centred = returns - overall_mean
+    sum_x, count = _window_sums(centred, window)
+    sum_x2, _ = _window_sums(centred * centred, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.maximum((sum_x2 - sum_x * sum_x / count) / (count - 1), 0.0)
+    return np.where(count >= min_periods, np.sqrt(variance) * np.sqrt(trading_days_per_year), np.nan)
+
+
+def rolling_annualized_return(returns, window, trading_days_per_year, min_periods=None):
+    """Geometric annualized return of each trailing window, from running sums of log returns of its valid days."""
+    returns = np.asarray(returns, dtype=float)
+    log_growth, count = _window_sums(np.log1p(returns), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annualized = np.expm1(log_growth * (trading_days_per_year / count))
+    return np.where(count >= _min_periods(window, min_periods), annualized, np.nan)
+
+
+def rolling_sharpe(returns, window, rfr_annual, trading_days_per_year, min_periods=None):
+    """Rolling Sharpe ratio with calculate_metrics_summary's definition and zero-volatility convention."""
+    annualized_return = rolling_annualized_return(returns, window, trading_days_per_year, min_periods)
+    volatility = rolling_volatility(returns, window, trading_days_per_year, min_periods)
+    return risk_metrics.signed_inf_ratio(annualized_return - rfr_annual, volatility)
+
+
+def rolling_sortino(returns, window, rfr_annual, trading_days_per_year, min_periods=None):
+    """Rolling Sortino ratio (downside deviation against the daily risk-free rate)."""
+    returns = np.asarray(returns, dtype=float)
+    rfr_daily = rfr_annual / trading_days_per_year
+    downside_sq, count = _window_sums(np.square(np.minimum(0, returns - rfr_daily)), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        downside_dev = np.sqrt(np.maximum(downside_sq / count, 0.0)) * np.sqrt(trading_days_per_year)
+    downside_dev = np.where(count >= _min_periods(window, min_periods), downside_dev, np.nan)
+    annualized_return = rolling_annualized_return(returns, window, trading_days_per_year, min_periods)
+    return risk_metrics.signed_inf_ratio(annualized_return - rfr_annual, downside_dev)
+
+
+def rolling_max_drawdown(portfolio_values, window, initial_capital, min_periods=None):
+    """
+    Max drawdown over the trailing `window` returns, i.e. the window's values plus the
+    value the window starts from (the initial capital for the first window). NaN
+    values are skipped.
+    """
+    values = np.asarray(portfolio_values, dtype=float)
+    values_with_start = np.concatenate([np.full(values.shape[:-1] + (1,), float(initial_capital)), values], axis=-1)
+    drawdown = _rolling_max_drawdown_values(values_with_start, window + 1)[..., 1:]
+    # Windows that are not full yet start at the initial capital: their drawdown is the running one.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        running = np.fmin.accumulate(values_with_start / np.fmax.accumulate(values_with_start, axis=-1) - 1.0, axis=-1)
+    leading = min(window - 1, values.shape[-1])
+    drawdown[..., :leading] = running[..., 1:leading + 1]
+    _, count = _window_sums(values, window)
+    return np.where(count >= _min_periods(window, min_periods), drawdown, np.nan)
+
+
+def rolling_var(returns, window, quantile=0.05, min_periods=None):
+    """Historical rolling VaR (linear-interpolated quantile). Uses pandas' skiplist: O(n log window)."""
+    returns = np.asarray(returns, dtype=float)
+    flat = returns.reshape(-1, returns.shape[-1]) if returns.ndim > 1 else returns[np.newaxis, :]
+    var = pd.DataFrame(flat.T).rolling(window, min_periods=_min_periods(window, min_periods)).quantile(
+        quantile, interpolation='linear')
+    return var.to_numpy().T.reshape(returns.shape)
+
+
+def calculate_rolling_metrics(portfolio_values, window, rfr_annual, initial_capital, trading_days_per_year,
+                              min_periods=None):
+    """
+    Rolling volatility, Sharpe, Sortino, max drawdown and 95% VaR for one portfolio
+    (1-D values) or many ((portfolios, days) values), each in one linear pass.
+    Returns {metric name: array shaped like portfolio_values}. Missing returns (e.g.
+    day 0 when initial_capital is 0) are skipped as in pandas' rolling: a window
+    needs min_periods valid points (default: the full window), otherwise it is NaN.
+    """
+    portfolio_values = np.asarray(portfolio_values, dtype=float)
+    returns = risk_metrics.portfolio_returns_matrix(np.atleast_2d(portfolio_values), initial_capital)
+    if initial_capital == 0:
+        returns = np.concatenate([np.full((returns.shape[0], 1), np.nan), returns], axis=1)
+    returns = returns.reshape(portfolio_values.shape)
+    return {
+        "Rolling Volatility": rolling_volatility(returns, window, trading_days_per_year, min_periods),
+        "Rolling Sharpe Ratio": rolling_sharpe(returns, window, rfr_annual, trading_days_per_year, min_periods),
+        "Rolling Sortino Ratio": rolling_sortino(returns, window, rfr_annual, trading_days_per_year, min_periods),
+        "Rolling Max Drawdown": rolling_max_drawdown(portfolio_values, window, initial_capital, min_periods),
+        "Rolling VaR 95%": rolling_var(returns, window, min_periods=min_periods),
+    }
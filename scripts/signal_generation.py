@@ -35,4 +35,145 @@ def generate_vix_momentum_signals(df, cfg):
     df_signal['Cover_Signal_Absolute_VIX_Today'] = df_signal['VIX'] < cfg.VIX_ABSOLUTE_COVER_THRESHOLD
     
     print("VIX Momentum signals calculated.")
-    return df_signal
\ No newline at end of file
+    return df_signal
+
+SIGNAL_PARAM_NAMES = ['MOMENTUM_LOOKBACK_PERIOD', 'VIX_PCT_CHANGE_THRESHOLD_UP', 'VIX_PCT_CHANGE_THRESHOLD_DOWN',
+                      'N_CONSECUTIVE_UP_DAYS_TO_SHORT', 'N_CONSECUTIVE_DOWN_DAYS_TO_COVER', 'VIX_ABSOLUTE_COVER_THRESHOLD']
+
+
+def _vix_pct_change(vix, lookback):
+    """Lookback-day VIX percentage change along the last axis (NaN for the first `lookback` days)."""
+    vix = np.asarray(vix, dtype=float)
+    lagged = np.full_like(vix, np.nan)
+    if lookback == 0:
+        lagged[...] = vix
+    elif lookback < vix.shape[-1]:
+        lagged[..., lookback:] = vix[..., :-lookback]
+    return (vix - lagged) / lagged
+
+
+def _streak_lengths(condition):
+    """Length of the run of True values ending at each position along the last axis (0 where False)."""
+    counts = np.cumsum(condition, axis=-1)
+    resets = np.maximum.accumulate(np.where(condition, 0, counts), axis=-1)
+    return counts - resets
+
+
+def compute_vix_momentum_signal_arrays(vix, lookback, threshold_up, threshold_down,
+                                       n_up_to_short, n_down_to_cover, absolute_cover_threshold):
+    """Signals for one parameter set on a (..., days) VIX array, e.g. many simulated paths.
+
+    Returns (short, cover_momentum, cover_absolute_vix) boolean arrays shaped like vix,
+    with the same semantics as generate_vix_momentum_signals.
+    """
+    vix = np.asarray(vix, dtype=float)
+    pct_change = _vix_pct_change(vix, lookback)
+    short = _streak_lengths(pct_change > threshold_up) >= n_up_to_short
+    cover_momentum = _streak_lengths(pct_change < threshold_down) >= n_down_to_cover
+    cover_absolute_vix = vix < absolute_cover_threshold
+    return short, cover_momentum, cover_absolute_vix
+
+
+def generate_vix_momentum_signal_tensor(df, lookbacks, thresholds_up, thresholds_down,
+                                        n_up_days_to_short, n_down_days_to_cover, absolute_cover_thresholds):
+    """
+    Generates VIX momentum signals for many parameter sets at once.
+    Every combination of the given lists is one parameter set. The lagged-VIX
+    percentage changes are computed once per lookback and the up/down streaks once
+    per (lookback, threshold) pair, then shared by all sets that use them.
+    Returns a dict with 'params' (one row per set, named like the config entries)
+    and (param_set, day) boolean arrays under 'Short_Signal_Today',
+    'Cover_Signal_Momentum_Today' and 'Cover_Signal_Absolute_VIX_Today'.
+    """
+    vix = df['VIX'].to_numpy(dtype=float)
+    lookbacks = [int(x) for x in np.atleast_1d(lookbacks)]
+    thresholds_up = np.atleast_1d(np.asarray(thresholds_up, dtype=float))
+    thresholds_down = np.atleast_1d(np.asarray(thresholds_down, dtype=float))
+    n_up_days_to_short = np.atleast_1d(np.asarray(n_up_days_to_short))
+    n_down_days_to_cover = np.atleast_1d(np.asarray(n_down_days_to_cover))
+    absolute_cover_thresholds = np.atleast_1d(np.asarray(absolute_cover_thresholds, dtype=float))
+
+    # Shared intermediates: (lookback, threshold, day) streak lengths and (level, day) cover flags.
+    pct_changes = np.stack([_vix_pct_change(vix, lookback) for lookback in lookbacks])
+    up_streaks = _streak_lengths(pct_changes[:, np.newaxis, :] > thresholds_up[np.newaxis, :, np.newaxis])
+    down_streaks = _streak_lengths(pct_changes[:, np.newaxis, :] < thresholds_down[np.newaxis, :, np.newaxis])
+    absolute_covers = vix[np.newaxis, :] < absolute_cover_thresholds[:, np.newaxis]
+
+    # Index grid of every combination, in the same order as itertools.product.
+    shape = (len(lookbacks), len(thresholds_up), len(thresholds_down),
+             len(n_up_days_to_short), len(n_down_days_to_cover), len(absolute_cover_thresholds))
+    idx_lb, idx_up, idx_down, idx_n_up, idx_n_down, idx_abs = (
+        axis_idx.ravel() for axis_idx in np.indices(shape))
+
+    params = pd.DataFrame({
+        'MOMENTUM_LOOKBACK_PERIOD': np.asarray(lookbacks)[idx_lb],
+        'VIX_PCT_CHANGE_THRESHOLD_UP': thresholds_up[idx_up],
+        'VIX_PCT_CHANGE_THRESHOLD_DOWN': thresholds_down[idx_down],
+        'N_CONSECUTIVE_UP_DAYS_TO_SHORT': n_up_days_to_short[idx_n_up],
+        'N_CONSECUTIVE_DOWN_DAYS_TO_COVER': n_down_days_to_cover[idx_n_down],
+        'VIX_ABSOLUTE_COVER_THRESHOLD': absolute_cover_thresholds[idx_abs],
+    })
+    return {
+        'params': params,
+        'Short_Signal_Today': up_streaks[idx_lb, idx_up] >= n_up_days_to_short[idx_n_up, np.newaxis],
+        'Cover_Signal_Momentum_Today': down_streaks[idx_lb, idx_down] >= n_down_days_to_cover[idx_n_down, np.newaxis],
+        'Cover_Signal_Absolute_VIX_Today': absolute_covers[idx_abs],
+    }
+
+
+class VixMomentumSignalStream:
+    """
+    Incremental VIX momentum signal generator for live, one-bar-per-day operation.
+    Keeps a ring buffer of the last MOMENTUM_LOOKBACK_PERIOD VIX values plus the
+    current up/down streak counters, so each update() is O(1). Replaying history
+    through update() yields the same signals as generate_vix_momentum_signals.
+    """
+    __slots__ = ('lookback', 'threshold_up', 'threshold_down', 'n_up_to_short', 'n_down_to_cover',
+                 'absolute_cover_threshold', 'vix_buffer', 'buffer_pos', 'bars_seen',
+                 'consecutive_up_days', 'consecutive_down_days')
+
+    def __init__(self, cfg):
+        self.lookback = int(cfg.MOMENTUM_LOOKBACK_PERIOD)
+        self.threshold_up = cfg.VIX_PCT_CHANGE_THRESHOLD_UP
+        self.threshold_down = cfg.VIX_PCT_CHANGE_THRESHOLD_DOWN
+        self.n_up_to_short = cfg.N_CONSECUTIVE_UP_DAYS_TO_SHORT
+        self.n_down_to_cover = cfg.N_CONSECUTIVE_DOWN_DAYS_TO_COVER
+        self.absolute_cover_threshold = cfg.VIX_ABSOLUTE_COVER_THRESHOLD
+        self.vix_buffer = [np.nan] * max(self.lookback, 1)
+        self.buffer_pos = 0
+        self.bars_seen = 0
+        self.consecutive_up_days = 0
+        self.consecutive_down_days = 0
+
+    def update(self, vix):
+        """Consumes one VIX close and returns today's signals as a dict."""
+        vix = float(vix)
+        if self.lookback == 0:
+            vix_lagged = vix
+        elif self.bars_seen >= self.lookback:
+            # The slot about to be overwritten holds the value from `lookback` bars ago.
+            vix_lagged = self.vix_buffer[self.buffer_pos]
+        else:
+            vix_lagged = np.nan
+        if self.lookback > 0:
+            self.vix_buffer[self.buffer_pos] = vix
+            self.buffer_pos = (self.buffer_pos + 1) % self.lookback
+        self.bars_seen += 1
+
+        # A zero VIX never occurs in practice; treat it as 'no momentum reading'.
+        vix_pct_change = (vix - vix_lagged) / vix_lagged if vix_lagged != 0 else np.nan
+
+        # NaN comparisons are False, which resets the streaks like the batch version.
+        self.consecutive_up_days = self.consecutive_up_days + 1 if vix_pct_change > self.threshold_up else 0
+        self.consecutive_down_days = self.consecutive_down_days + 1 if vix_pct_change < self.threshold_down else 0
+
+        return {
+            'VIX_Pct_Change': vix_pct_change,
+            'Short_Signal_Today': self.consecutive_up_days >= self.n_up_to_short,
+            'Cover_Signal_Momentum_Today': self.consecutive_down_days >= self.n_down_to_cover,
+            'Cover_Signal_Absolute_VIX_Today': vix < self.absolute_cover_threshold,
+        }
+
+    def replay(self, vix_values):
+        """Feeds a history of VIX closes and returns the signals as a DataFrame (one row per bar)."""
+        return pd.DataFrame([self.update(vix) for vix in vix_values])
@@ -1,6 +1,43 @@
+import json
+import os
+
 import pandas as pd
 import numpy as np
 
+from cfd_cost_model import FlatCostModel, cost_model_from_config, cost_model_from_dict
+
+def model_a_value_matrix(sp500_returns, initial_capital, equity_allocs):
+    """Cumulative-product core of Model A, for batched callers working on raw arrays.
+
+    sp500_returns and equity_allocs must already broadcast against each other
+    (e.g. returns of shape (days,) and allocations of shape (n, 1)). NaN returns
+    are treated as a zero portfolio return, matching the row loop.
+    """
+    sp500_returns = np.asarray(sp500_returns, dtype=float)
+    equity_allocs = np.asarray(equity_allocs, dtype=float)
+    portfolio_returns = np.where(np.isnan(sp500_returns), 0.0, equity_allocs * sp500_returns)
+    growth = 1.0 + portfolio_returns
+    if growth.shape[-1] == 0:
+        return growth
+    # Apply the first day's growth to the initial capital before accumulating so the
+    # multiplication order (and therefore every float) matches the sequential loop.
+    growth[..., 0] = initial_capital * growth[..., 0]
+    return np.cumprod(growth, axis=-1)
+
+
+def simulate_portfolio_A_vectorized(df_data, initial_capital, equity_allocs):
+    """Simulates Model A for any number of static equity allocations at once.
+
+    Returns a 2-D array of end-of-day values shaped (len(equity_allocs), len(df_data)).
+    """
+    equity_allocs = np.atleast_1d(np.asarray(equity_allocs, dtype=float))
+    if df_data.empty or 'SP500_Return' not in df_data.columns:
+        return np.empty((len(equity_allocs), 0))
+
+    sp500_returns = df_data['SP500_Return'].to_numpy(dtype=float)
+    return model_a_value_matrix(sp500_returns, initial_capital, equity_allocs[:, np.newaxis])
+
+
 def simulate_portfolio_A(df_data, initial_capital, equity_alloc_A):
     """Simulates Model A: Static allocation."""
     # print(f"Simulating Model A with initial capital: {initial_capital}, equity_alloc: {equity_alloc_A}")
@@ -8,28 +45,9 @@ def simulate_portfolio_A(df_data, initial_capital, equity_alloc_A):
         # print("Model A: Empty data or missing SP500_Return column.")
         return pd.Series(dtype=float)
 
-    portfolio_values_list = []
-    current_value = initial_capital
-    
-    # The first day's return applies to the initial capital.
-    # The loop should start from the first row of df_data.
-    # portfolio_values_list will store end-of-day values.
-
-    for i in range(len(df_data)):
-        sp500_return = df_data['SP500_Return'].iloc[i]
-        if pd.isna(sp500_return): # Handle potential NaNs in returns
-            # print(f"Model A: NaN SP500_Return at index {i}, date {df_data['date'].iloc[i]}. Holding value.")
-            portfolio_return = 0
-        else:
-            portfolio_return = equity_alloc_A * sp500_return
-        
-        current_value *= (1 + portfolio_return)
-        portfolio_values_list.append(current_value)
-        
-    if not portfolio_values_list:
-        return pd.Series(dtype=float)
-        
-    return pd.Series(portfolio_values_list, index=df_data.index)
+    # The first day's return applies to the initial capital; values are end-of-day.
+    portfolio_values = simulate_portfolio_A_vectorized(df_data, initial_capital, [equity_alloc_A])[0]
+    return pd.Series(portfolio_values, index=df_data.index)
 
 
 def simulate_portfolio_B_momentum(df_data_with_signals, initial_capital, cfg):
@@ -149,4 +167,441 @@ def simulate_portfolio_B_momentum(df_data_with_signals, initial_capital, cfg):
     if not portfolio_values_history:
         return pd.Series(dtype=float)
 
-    return pd.Series(portfolio_values_history, index=df_data_with_signals.index)
\ No newline at end of file
+    return pd.Series(portfolio_values_history, index=df_data_with_signals.index)
+
+MODEL_B_ESSENTIAL_COLS = ['SP500_Return', 'S&P500', 'SOFR_Rate',
+                          'Short_Signal_Today', 'Cover_Signal_Momentum_Today', 'Cover_Signal_Absolute_VIX_Today']
+
+
+def _model_b_kernel(sp500_returns, sp500_prices, financing_factors,
+                    short_signals, cover_momentum_signals, cover_absolute_vix_signals,
+                    equity_alloc, cash_alloc, hedge_ratio,
+                    margin_percent, spread_cost_percent, spread_points, financing_per_index_unit, lot_size,
+                    tier_limits, tier_lower_limits, tier_rates, tier_cumulative,
+                    total_value, equity_value, cash_value,
+                    cfd_active, cfd_entry_sp500_price, cfd_notional_value, cfd_margin_account_deduction,
+                    out):
+    """Model B state machine over plain sequences, writing end-of-day values into `out`.
+
+    Mirrors simulate_portfolio_B_momentum operation for operation so results are
+    bit-for-bit identical. Works on Python lists (fallback) or NumPy arrays (numba).
+    The portfolio/CFD state is passed in and the final state returned alongside
+    `out`, so a run can be resumed.
+
+    Costs come from a cost model's kernel_params() and its precomputed net daily
+    financing factors (see cfd_cost_model.accrual_curves). With FlatCostModel the
+    factors are (SOFR - fee) / 365 and the kernel reduces exactly to the original.
+    An empty tier table means flat percentage margin.
+    """
+    for i in range(len(sp500_returns)):
+        sp500_return_t = sp500_returns[i]
+        sp500_price_t = sp500_prices[i]
+
+        # x != x is a NaN test that works for both Python floats and numba.
+        if sp500_return_t != sp500_return_t or sp500_price_t != sp500_price_t:
+            out[i] = total_value
+            continue
+
+        # 1. Equity component grows/shrinks
+        equity_value *= (1 + sp500_return_t)
+
+        # 2. CFD Financing (if active)
+        if cfd_active:
+            if financing_per_index_unit:
+                cash_value += (cfd_notional_value / cfd_entry_sp500_price) * financing_factors[i]
+            else:
+                cash_value += cfd_notional_value * financing_factors[i]
+
+        # 3. Hedging Logic
+        if cfd_active and (cover_momentum_signals[i] or cover_absolute_vix_signals[i]):
+            cfd_pnl = cfd_notional_value * (1 - (sp500_price_t / cfd_entry_sp500_price))
+            cash_value += cfd_pnl
+            notional_at_close_for_spread = cfd_notional_value * (sp500_price_t / cfd_entry_sp500_price)
+            cash_value -= spread_cost_percent * notional_at_close_for_spread
+            if spread_points != 0.0:
+                cash_value -= spread_points * (cfd_notional_value / cfd_entry_sp500_price)
+            cash_value += cfd_margin_account_deduction
+
+            cfd_active = False
+            cfd_entry_sp500_price = 0.0
+            cfd_notional_value = 0.0
+            cfd_margin_account_deduction = 0.0
+
+        elif not cfd_active and short_signals[i]:
+            amount_to_hedge = hedge_ratio * equity_value
+            if len(tier_limits) == 0:
+                margin_required = margin_percent * amount_to_hedge
+            else:
+                # Tiered margin on the contract count; contracts past the last limit are uncharged.
+                contracts = min(max(amount_to_hedge / (sp500_price_t * lot_size), 0.0), tier_limits[-1])
+                k = 0
+                while k < len(tier_limits) - 1 and tier_limits[k] < contracts:
+                    k += 1
+                margin_units = tier_cumulative[k] + (contracts - tier_lower_limits[k]) * tier_rates[k]
+                margin_required = min(margin_units * sp500_price_t * lot_size, amount_to_hedge)
+
+            if cash_value >= margin_required:
+                cfd_active = True
+                cfd_notional_value = amount_to_hedge
+                cfd_entry_sp500_price = sp500_price_t
+                cfd_margin_account_deduction = margin_required
+                cash_value -= cfd_margin_account_deduction
+
+        # 4. Update total portfolio value
+        total_value = equity_value + cash_value
+        out[i] = total_value
+
+        # 5. Daily Rebalance (Simplified)
+        equity_value = total_value * equity_alloc
+        cash_value = total_value * cash_alloc
+
+    return (out, total_value, equity_value, cash_value,
+            cfd_active, cfd_entry_sp500_price, cfd_notional_value, cfd_margin_account_deduction)
+
+
+try:
+    from numba import njit
+    _model_b_kernel_compiled = njit(cache=True)(_model_b_kernel)
+except ImportError:  # numba is optional; the pure-Python kernel gives identical values
+    _model_b_kernel_compiled = None
+
+# Loading the compiled kernel costs about 0.25 s per process, while the list loop
+# runs about 0.65 us per row, so by default only frames this long are compiled.
+COMPILED_KERNEL_MIN_ROWS = 400_000
+
+
+def simulate_portfolio_B_momentum_arrays(df_data_with_signals, initial_capital, cfg, use_compiled=None,
+                                         cost_model=None):
+    """Array-backed Model B engine. With FlatCostModel its output is identical to
+    simulate_portfolio_B_momentum; TieredCostModel changes margin, financing and spread.
+
+    The six essential columns are read into contiguous NumPy arrays once and the
+    open/cover/financing/rebalance state machine runs over them, as a pure-Python
+    loop over lists or, with numba installed, a compiled kernel. use_compiled=None
+    compiles only frames of at least COMPILED_KERNEL_MIN_ROWS rows; True / False
+    force the choice (True still needs numba).
+    cost_model is a cfd_cost_model backend (FlatCostModel / TieredCostModel);
+    by default the one selected by cfg.CFD_COST_MODEL.
+    """
+    if df_data_with_signals.empty:
+        return pd.Series(dtype=float)
+
+    for col in MODEL_B_ESSENTIAL_COLS:
+        if col not in df_data_with_signals.columns:
+            print(f"Model B: Missing essential column '{col}'.")
+            return pd.Series(dtype=float)
+
+    sp500_returns = np.ascontiguousarray(df_data_with_signals['SP500_Return'].to_numpy(dtype=float))
+    sp500_prices = np.ascontiguousarray(df_data_with_signals['S&P500'].to_numpy(dtype=float))
+    if cost_model is None:
+        cost_model = cost_model_from_config(cfg)
+    financing_factors = cost_model.accrual_curves(df_data_with_signals['SOFR_Rate'].to_numpy(dtype=float),
+                                                  sp500_prices)['net_daily']
+    short_signals = np.ascontiguousarray(df_data_with_signals['Short_Signal_Today'].to_numpy(dtype=bool))
+    cover_momentum = np.ascontiguousarray(df_data_with_signals['Cover_Signal_Momentum_Today'].to_numpy(dtype=bool))
+    cover_absolute_vix = np.ascontiguousarray(df_data_with_signals['Cover_Signal_Absolute_VIX_Today'].to_numpy(dtype=bool))
+
+    initial_capital = float(initial_capital)
+    params = (cfg.EQUITY_ALLOC_B, cfg.CASH_ALLOC_B, cfg.MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM,
+              *cost_model.kernel_params(),
+              initial_capital, initial_capital * cfg.EQUITY_ALLOC_B, initial_capital * cfg.CASH_ALLOC_B,
+              False, 0.0, 0.0, 0.0)
+
+    if use_compiled is None:
+        use_compiled = len(sp500_returns) >= COMPILED_KERNEL_MIN_ROWS
+    if use_compiled and _model_b_kernel_compiled is not None:
+        portfolio_values = _model_b_kernel_compiled(
+            sp500_returns, sp500_prices, financing_factors, short_signals, cover_momentum, cover_absolute_vix,
+            *params, np.empty(len(sp500_returns)))[0]
+    else:
+        # Python floats/bools from lists are much cheaper to index than NumPy scalars.
+        portfolio_values = _model_b_kernel(
+            sp500_returns.tolist(), sp500_prices.tolist(), financing_factors.tolist(),
+            short_signals.tolist(), cover_momentum.tolist(), cover_absolute_vix.tolist(),
+            *params, [0.0] * len(sp500_returns))[0]
+
+    return pd.Series(np.asarray(portfolio_values, dtype=float), index=df_data_with_signals.index)
+
+
+MODEL_B_SWEEP_PARAMS = ['MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM', 'EQUITY_ALLOC_B', 'CFD_INITIAL_MARGIN_PERCENT',
+                        'BROKER_FEE_ANNUALIZED', 'SPREAD_COST_PERCENT']
+
+
+def _model_b_batch_kernel(sp500_returns, sp500_prices, financing_factors,
+                          short_signals, cover_momentum_signals, cover_absolute_vix_signals,
+                          initial_capital, equity_alloc, cash_alloc, hedge_ratio,
+                          margin_percent, spread_cost_percent, spread_points, financing_per_index_unit, lot_size,
+                          tier_limits, tier_lower_limits, tier_rates, tier_cumulative):
+    """Advances many Model B configurations together, one day at a time.
+
+    Takes the same cost inputs as _model_b_kernel (net daily financing factors,
+    margin/spread parameters and tier table). Allocation, hedge, margin and spread
+    parameters are scalars or (configs,) arrays and the CFD state is held as
+    (configs,) vectors. Market, financing and signal arrays are either shared
+    (days,) or per-configuration (configs, days). Each configuration follows exactly
+    the same float operations as _model_b_kernel, so every row matches a
+    single-configuration run bit for bit. Returns a (configs, days) value matrix.
+    """
+    n_configs = len(hedge_ratio)
+    n_days = np.shape(sp500_returns)[-1]
+    portfolio_values = np.empty((n_configs, n_days))
+
+    total_value = np.full(n_configs, float(initial_capital))
+    equity_value = total_value * equity_alloc
+    cash_value = total_value * cash_alloc
+
+    cfd_active = np.zeros(n_configs, dtype=bool)
+    cfd_entry_sp500_price = np.zeros(n_configs)
+    cfd_notional_value = np.zeros(n_configs)
+    cfd_margin_account_deduction = np.zeros(n_configs)
+
+    for i in range(n_days):
+        sp500_return_t = sp500_returns[..., i]
+        sp500_price_t = sp500_prices[..., i]
+        valid = ~(np.isnan(sp500_return_t) | np.isnan(sp500_price_t))
+        if not np.any(valid):
+            portfolio_values[:, i] = total_value
+            continue
+
+        # 1. Equity component grows/shrinks
+        new_equity = equity_value * (1 + sp500_return_t)
+
+        # Inactive rows divide by a zero entry price; np.where discards them below.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 2. CFD Financing (if active)
+            if financing_per_index_unit:
+                financing = (cfd_notional_value / cfd_entry_sp500_price) * financing_factors[..., i]
+            else:
+                financing = cfd_notional_value * financing_factors[..., i]
+            new_cash = np.where(cfd_active, cash_value + financing, cash_value)
+
+            # 3. Hedging Logic
+            closing = cfd_active & (cover_momentum_signals[..., i] | cover_absolute_vix_signals[..., i])
+            price_ratio = sp500_price_t / cfd_entry_sp500_price
+            closed_cash = new_cash + cfd_notional_value * (1 - price_ratio)
+            closed_cash = closed_cash - spread_cost_percent * (cfd_notional_value * price_ratio)
+            if spread_points != 0.0:
+                closed_cash = closed_cash - spread_points * (cfd_notional_value / cfd_entry_sp500_price)
+        closed_cash = closed_cash + cfd_margin_account_deduction
+        new_cash = np.where(closing, closed_cash, new_cash)
+
+        amount_to_hedge = hedge_ratio * new_equity
+        if len(tier_limits) == 0:
+            margin_required = margin_percent * amount_to_hedge
+        else:
+            # Tiered margin on the contract count; contracts past the last limit are uncharged.
+            contracts = np.minimum(np.maximum(amount_to_hedge / (sp500_price_t * lot_size), 0.0), tier_limits[-1])
+            k = np.minimum(np.searchsorted(tier_limits, contracts, side='left'), len(tier_limits) - 1)
+            margin_units = tier_cumulative[k] + (contracts - tier_lower_limits[k]) * tier_rates[k]
+            margin_required = np.minimum(margin_units * sp500_price_t * lot_size, amount_to_hedge)
+        opening = ~cfd_active & short_signals[..., i] & (new_cash >= margin_required)
+        new_cash = np.where(opening, new_cash - margin_required, new_cash)
+
+        new_active = (cfd_active & ~closing) | opening
+        new_entry = np.where(opening, sp500_price_t, np.where(closing, 0.0, cfd_entry_sp500_price))
+        new_notional = np.where(opening, amount_to_hedge, np.where(closing, 0.0, cfd_notional_value))
+        new_margin = np.where(opening, margin_required, np.where(closing, 0.0, cfd_margin_account_deduction))
+
+        # 4. Update total portfolio value
+        new_total = new_equity + new_cash
+
+        # 5. Daily Rebalance (Simplified); rows with NaN market data hold their state.
+        total_value = np.where(valid, new_total, total_value)
+        portfolio_values[:, i] = total_value
+        equity_value = np.where(valid, new_total * equity_alloc, equity_value)
+        cash_value = np.where(valid, new_total * cash_alloc, cash_value)
+        cfd_active = np.where(valid, new_active, cfd_active)
+        cfd_entry_sp500_price = np.where(valid, new_entry, cfd_entry_sp500_price)
+        cfd_notional_value = np.where(valid, new_notional, cfd_notional_value)
+        cfd_margin_account_deduction = np.where(valid, new_margin, cfd_margin_account_deduction)
+
+    return portfolio_values
+
+
+FLAT_COST_PARAMS = ['CFD_INITIAL_MARGIN_PERCENT', 'BROKER_FEE_ANNUALIZED', 'SPREAD_COST_PERCENT']
+
+
+def model_b_value_matrix(sp500_returns, sp500_prices, sofr_rates,
+                         short_signals, cover_momentum_signals, cover_absolute_vix_signals,
+                         initial_capital, param_arrays, cost_model):
+    """Batched Model B over raw arrays: a (configs, days) value matrix.
+
+    param_arrays are the (configs,) vectors from model_b_param_arrays. Market and
+    signal arrays are shared (days,) or per-configuration (configs, days); SOFR NaNs
+    must already be 0. cost_model is the run's cost model (cost_model_from_config).
+    With FlatCostModel each configuration uses its own FLAT_COST_PARAMS, so they can
+    be swept; other cost models bring their own costs, and sweeping the flat ones
+    under them raises ValueError. Row k matches simulate_portfolio_B_momentum_arrays
+    with the k-th configuration and the same cost model.
+    """
+    if isinstance(cost_model, FlatCostModel):
+        fees = param_arrays['BROKER_FEE_ANNUALIZED']
+        if len(fees) and np.all(fees == fees[0]):
+            financing_factors = (sofr_rates - fees[0]) / cost_model.days_in_year
+        else:
+            financing_factors = (sofr_rates - fees[:, np.newaxis]) / cost_model.days_in_year
+        cost_params = (param_arrays['CFD_INITIAL_MARGIN_PERCENT'], param_arrays['SPREAD_COST_PERCENT'],
+                       *cost_model.kernel_params()[2:])
+    else:
+        swept = [name for name in FLAT_COST_PARAMS
+                 if len(param_arrays[name]) and np.any(param_arrays[name] != param_arrays[name][0])]
+        if swept:
+            raise ValueError(f"{swept} only apply to the flat CFD cost model; the '{cost_model.name}' "
+                             f"cost model takes its costs from its own configuration.")
+        financing_factors = cost_model.accrual_curves(sofr_rates, sp500_prices)['net_daily']
+        cost_params = cost_model.kernel_params()
+    return _model_b_batch_kernel(
+        sp500_returns, sp500_prices, financing_factors,
+        short_signals, cover_momentum_signals, cover_absolute_vix_signals,
+        initial_capital, param_arrays['EQUITY_ALLOC_B'], param_arrays['CASH_ALLOC_B'],
+        param_arrays['MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM'], *cost_params)
+
+
+def model_b_param_arrays(params, cfg):
+    """Returns the (configs,) parameter vectors used by the batched Model B kernel.
+
+    params maps config names from MODEL_B_SWEEP_PARAMS to per-configuration
+    values (e.g. a DataFrame from parameter_sweep.expand_param_grid); names that
+    are missing fall back to the scalar value in cfg.
+    """
+    if isinstance(params, pd.DataFrame):
+        n_configs = len(params)
+    else:
+        n_configs = max((np.size(values) for values in params.values()), default=1)
+    arrays = {}
+    for name in MODEL_B_SWEEP_PARAMS:
+        values = params[name] if name in params else getattr(cfg, name)
+        arrays[name] = np.broadcast_to(np.asarray(values, dtype=float), (n_configs,)).copy()
+    # Same expression as config.py so the default configuration matches exactly.
+    arrays['CASH_ALLOC_B'] = 1.0 - arrays['EQUITY_ALLOC_B']
+    return arrays
+
+
+def simulate_portfolio_B_batch(df_data_with_signals, initial_capital, params, cfg, cost_model=None):
+    """Simulates many Model B configurations in one pass over the data.
+
+    Returns a (configs, days) array of end-of-day values; row k is identical to
+    simulate_portfolio_B_momentum_arrays run with the k-th configuration and the
+    same cost model (cfg's by default; with flat costs, simulate_portfolio_B_momentum).
+    """
+    if cost_model is None:
+        cost_model = cost_model_from_config(cfg)
+    arrays = model_b_param_arrays(params, cfg)
+    n_configs = len(arrays['EQUITY_ALLOC_B'])
+    if df_data_with_signals.empty:
+        return np.empty((n_configs, 0))
+
+    for col in MODEL_B_ESSENTIAL_COLS:
+        if col not in df_data_with_signals.columns:
+            print(f"Model B: Missing essential column '{col}'.")
+            return np.empty((n_configs, 0))
+
+    return model_b_value_matrix(
+        df_data_with_signals['SP500_Return'].to_numpy(dtype=float),
+        df_data_with_signals['S&P500'].to_numpy(dtype=float),
+        np.nan_to_num(df_data_with_signals['SOFR_Rate'].to_numpy(dtype=float), nan=0.0),
+        df_data_with_signals['Short_Signal_Today'].to_numpy(dtype=bool),
+        df_data_with_signals['Cover_Signal_Momentum_Today'].to_numpy(dtype=bool),
+        df_data_with_signals['Cover_Signal_Absolute_VIX_Today'].to_numpy(dtype=bool),
+        initial_capital, arrays, cost_model)
+
+
+class ModelBState:
+    """Compact Model B portfolio and CFD state carried between simulation steps."""
+    __slots__ = ('total_value', 'equity_value', 'cash_value', 'cfd_active', 'cfd_entry_sp500_price',
+                 'cfd_notional_value', 'cfd_margin_account_deduction', 'days_stepped', 'last_date')
+
+    def __init__(self, total_value, equity_value, cash_value, cfd_active=False, cfd_entry_sp500_price=0.0,
+                 cfd_notional_value=0.0, cfd_margin_account_deduction=0.0, days_stepped=0, last_date=None):
+        self.total_value = total_value
+        self.equity_value = equity_value
+        self.cash_value = cash_value
+        self.cfd_active = cfd_active
+        self.cfd_entry_sp500_price = cfd_entry_sp500_price
+        self.cfd_notional_value = cfd_notional_value
+        self.cfd_margin_account_deduction = cfd_margin_account_deduction
+        self.days_stepped = days_stepped
+        self.last_date = last_date
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ModelBSimulator:
+    """
+    Steppable Model B simulator for live/daily operation.
+    step(bar) advances one day using the same kernel as the array engine, so
+    stepping through a DataFrame reproduces simulate_portfolio_B_momentum_arrays
+    with the same cost model exactly. The state can be saved to and resumed from a
+    small JSON checkpoint. cost_model defaults to the one selected by cfg.CFD_COST_MODEL.
+    """
+    PARAM_NAMES = ['EQUITY_ALLOC_B', 'CASH_ALLOC_B', 'MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM',
+                   'CFD_INITIAL_MARGIN_PERCENT', 'BROKER_FEE_ANNUALIZED', 'SPREAD_COST_PERCENT']
+
+    def __init__(self, initial_capital, cfg, state=None, cost_model=None):
+        self.params = {name: float(getattr(cfg, name)) for name in self.PARAM_NAMES}
+        if cost_model is None:
+            cost_model = cost_model_from_config(cfg)
+        self.cost_model = cost_model
+        if state is None:
+            initial_capital = float(initial_capital)
+            state = ModelBState(initial_capital,
+                                initial_capital * self.params['EQUITY_ALLOC_B'],
+                                initial_capital * self.params['CASH_ALLOC_B'])
+        self.state = state
+
+    def step(self, bar):
+        """Advances one day. bar is a mapping (dict or row Series) with the six Model B columns."""
+        sofr_rate = bar['SOFR_Rate']
+        sp500_price = float(bar['S&P500'])
+        financing_factor = float(self.cost_model.accrual_curves([sofr_rate], [sp500_price])['net_daily'][0])
+        state = self.state
+        p = self.params
+        (out, state.total_value, state.equity_value, state.cash_value, state.cfd_active,
+         state.cfd_entry_sp500_price, state.cfd_notional_value, state.cfd_margin_account_deduction) = _model_b_kernel(
+            (float(bar['SP500_Return']),), (sp500_price,), (financing_factor,),
+            (bool(bar['Short_Signal_Today']),), (bool(bar['Cover_Signal_Momentum_Today']),),
+            (bool(bar['Cover_Signal_Absolute_VIX_Today']),),
+            p['EQUITY_ALLOC_B'], p['CASH_ALLOC_B'], p['MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM'],
+            *self.cost_model.kernel_params(),
+            state.total_value, state.equity_value, state.cash_value, state.cfd_active,
+            state.cfd_entry_sp500_price, state.cfd_notional_value, state.cfd_margin_account_deduction, [0.0])
+        state.days_stepped += 1
+        if 'date' in bar:
+            state.last_date = str(pd.Timestamp(bar['date']).date())
+        return out[0]
+
+    def run(self, df_data_with_signals):
+        """Steps through every row of a DataFrame and returns the end-of-day values."""
+        values = [self.step(row) for row in df_data_with_signals.to_dict('records')]
+        return pd.Series(values, index=df_data_with_signals.index, dtype=float)
+
+    def save_checkpoint(self, filepath):
+        """Writes parameters and state to a JSON checkpoint (atomically replaced)."""
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'params': self.params, 'cost_model': self.cost_model.as_dict(),
+                       'state': self.state.as_dict()}, f)
+        os.replace(tmp_path, filepath)
+
+    @classmethod
+    def from_checkpoint(cls, filepath, cfg=None):
+        """
+        Resumes a simulator from a checkpoint written by save_checkpoint. Checkpoints
+        without a stored cost model use the one selected by cfg.CFD_COST_MODEL, or
+        flat costs from the checkpoint parameters if no cfg is given.
+        """
+        with open(filepath) as f:
+            checkpoint = json.load(f)
+        simulator = cls.__new__(cls)
+        simulator.params = checkpoint['params']
+        if 'cost_model' in checkpoint:
+            simulator.cost_model = cost_model_from_dict(checkpoint['cost_model'])
+        elif cfg is not None:
+            simulator.cost_model = cost_model_from_config(cfg)
+        else:
+            p = simulator.params
+            simulator.cost_model = FlatCostModel(p['BROKER_FEE_ANNUALIZED'], p['SPREAD_COST_PERCENT'],
+                                                 p['CFD_INITIAL_MARGIN_PERCENT'])
+        simulator.state = ModelBState(**checkpoint['state'])
+        return simulator
@@ -0,0 +1,172 @@
+# stage_cache.py
+# Content-addressed, size-bounded on-disk memoisation of pipeline stages.
+#
+# A stage's key is a SHA-256 over its name, its inputs (config values), the keys
+# of the stages it consumes and the source code of the modules and functions that
+# compute it.
+# Changing a signal parameter therefore changes the signal key and, through it,
+# every downstream key, while stages upstream of the change are served from disk.
+# Entries are pickles named by key; reading one refreshes its mtime, and the least
+# recently used entries are evicted once the directory exceeds max_bytes.
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+
+import pandas as pd
+
+CACHE_FORMAT_VERSION = 1
+
+
+def code_version(modules):
+    """
+    Hash of the source of the given modules (whole files) and functions (their own
+    source only); it changes whenever their code does.
+    """
+    digest = hashlib.sha256()
+    for obj in modules:
+        if inspect.ismodule(obj):
+            with open(inspect.getsourcefile(obj), 'rb') as f:
+                digest.update(f.read())
+        else:
+            digest.update(inspect.getsource(obj).encode())
+    return digest.hexdigest()
+
+
+def stage_key(stage, inputs, upstream=(), code=''):
+    """Content address of a stage result."""
+    payload = json.dumps({'format': CACHE_FORMAT_VERSION, 'stage': stage, 'inputs': inputs,
+                          'upstream': list(upstream), 'code': code}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def content_hash(value):
+    """Hash of a stage result's content (pandas objects by value, anything else by pickle)."""
+    digest = hashlib.sha256()
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        columns = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+        digest.update(json.dumps([str(col) for col in columns]).encode())
+    else:
+        digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    return digest.hexdigest()
+
+
+def _is_empty(value):
+    return value is None or (isinstance(value, (pd.DataFrame, pd.Series)) and value.empty)
+
+
+class StageCache:
+    """
+    Memoises stage results under cache_dir (None disables storage but still
+    computes keys, so callers need no special case). Keeps per-stage hit/miss
+    counts and timings for stats_frame().
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 ** 2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {}
+        self.evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(getattr(cfg, 'STAGE_CACHE_DIR', None), getattr(cfg, 'STAGE_CACHE_MAX_BYTES', 512 * 1024 ** 2))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _record(self, stage, outcome, seconds, key):
+        entry = self.stats.setdefault(stage, {'stage': stage, 'hits': 0, 'misses': 0, 'seconds': 0.0, 'key': key})
+        entry[outcome] += 1
+        entry['seconds'] += seconds
+        entry['key'] = key
+
+    def get_or_compute(self, stage, inputs, compute, upstream=(), modules=()):
+        """
+        Returns (value, key): the cached result for this stage/inputs/upstream/code,
+        or compute() stored under the new key. Empty results are not cached.
+        inputs=None marks a result that is not a function of its inputs (e.g. data
+        still being downloaded): it is always computed, never stored, and keyed on
+        its content so downstream stages stay correctly addressed.
+        modules: the modules and functions whose code computes the stage, including
+        the stage function compute() calls (see code_version).
+        """
+        started = time.perf_counter()
+        if inputs is None:
+            value = compute()
+            key = stage_key(stage, {'content': content_hash(value)}, upstream, code_version(modules))
+            self._record(stage, 'misses', time.perf_counter() - started, key)
+            return value, key
+        key = stage_key(stage, inputs, upstream, code_version(modules))
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    value = pickle.load(f)
+                os.utime(path)  # LRU recency
+                self._record(stage, 'hits', time.perf_counter() - started, key)
+                return value, key
+            except FileNotFoundError:
+                pass
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+                print(f"Warning: Discarding unreadable stage cache entry for '{stage}': {e}")
+                os.remove(path)
+
+        value = compute()
+        if self.cache_dir and not _is_empty(value):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.evict()
+        self._record(stage, 'misses', time.perf_counter() - started, key)
+        return value, key
+
+    def entries(self):
+        """DataFrame of cache entries (key, bytes, last_used), most recently used first."""
+        rows = []
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                    rows.append({'key': name[:-4], 'bytes': st.st_size, 'last_used': st.st_mtime})
+        df_entries = pd.DataFrame(rows, columns=['key', 'bytes', 'last_used'])
+        return df_entries.sort_values('last_used', ascending=False, ignore_index=True)
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        df_entries = self.entries()
+        over = df_entries['bytes'].cumsum() > self.max_bytes
+        for key in df_entries.loc[over, 'key']:
+            try:
+                os.remove(self._path(key))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for key in self.entries()['key']:
+            os.remove(self._path(key))
+
+    def stats_frame(self):
+        """Per-stage hits, misses and time spent (loading on hits, computing on misses)."""
+        return pd.DataFrame(list(self.stats.values()), columns=['stage', 'hits', 'misses', 'seconds', 'key'])
+
+    def report(self):
+        df_stats = self.stats_frame()
+        df_entries = self.entries()
+        print("\n--- Stage Cache ---")
+        if self.cache_dir is None:
+            print("Stage cache disabled (STAGE_CACHE_DIR is None).")
+            return
+        if not df_stats.empty:
+            df_stats = df_stats.assign(key=df_stats['key'].str[:12])
+            print(df_stats.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+        print(f"{len(df_entries)} entries, {df_entries['bytes'].sum() / 1024 ** 2:.1f} MB of "
+              f"{self.max_bytes / 1024 ** 2:.0f} MB; {self.evictions} evicted this run.")
@@ -0,0 +1,194 @@
+# stress_testing.py
+# Scenario stress tests: shocks applied to the historical market data in one batch.
+#
+# A scenario is a row of shock parameters plus the day the shock starts:
+#   vix_spike / vix_ramp_days / vix_decay_days   VIX multiplied up to (1 + vix_spike)
+#       geometrically over vix_ramp_days, then back to 1 over vix_decay_days
+#   sofr_shift                                   parallel SOFR shift from the shock day on
+#   sp500_gap                                    one-day S&P 500 gap; later prices keep the level shift
+# Every scenario shares the historical frame, so a chunk of scenarios becomes
+# (scenarios, days) arrays by broadcasting the shock parameters against the day
+# index. Signals, Model A, Model B and the risk metrics then run on the whole chunk
+# at once, as in monte_carlo.py.
+
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import risk_metrics
+import signal_generation
+import simulation_engine
+from cfd_cost_model import cost_model_from_config
+from monte_carlo import MONTE_CARLO_SETTINGS
+from parameter_sweep import expand_param_grid
+
+SHOCK_PARAMS = ['vix_spike', 'vix_ramp_days', 'vix_decay_days', 'sofr_shift', 'sp500_gap']
+NO_SHOCK = {'vix_spike': 0.0, 'vix_ramp_days': 1, 'vix_decay_days': 0, 'sofr_shift': 0.0, 'sp500_gap': 0.0}
+
+# Named shock templates: each expands (cartesian product) into one scenario per
+# parameter combination and shock date; parameters not listed stay at NO_SHOCK.
+SHOCK_TEMPLATES = {
+    'vix_spike': {'vix_spike': [0.5, 1.0, 2.0, 3.0], 'vix_ramp_days': [1, 5, 10], 'vix_decay_days': [10, 40]},
+    'sofr_shift': {'sofr_shift': [-0.02, -0.01, 0.01, 0.02, 0.03]},
+    'sp500_gap': {'sp500_gap': [-0.05, -0.10, -0.20]},
+    'crash': {'sp500_gap': [-0.07, -0.12, -0.20], 'vix_spike': [1.0, 2.0, 3.0], 'vix_ramp_days': [1, 3],
+              'vix_decay_days': [20]},
+}
+
+
+def build_scenarios(templates, shock_days):
+    """
+    One row per (template, parameter combination, shock day), preceded by an
+    unshocked 'baseline' row. Columns: Scenario, shock_day and SHOCK_PARAMS.
+    """
+    frames = [pd.DataFrame([{'Scenario': 'baseline', 'shock_day': 0, **NO_SHOCK}])]
+    for name, grid in templates.items():
+        unknown = set(grid) - set(SHOCK_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown shock parameters in template '{name}': {sorted(unknown)}")
+        combos = expand_param_grid({**{key: [value] for key, value in NO_SHOCK.items()}, **grid,
+                                    'shock_day': list(shock_days)})
+        frames.append(combos.assign(Scenario=name))
+    scenarios = pd.concat(frames, ignore_index=True)
+    return scenarios[['Scenario', 'shock_day'] + SHOCK_PARAMS]
+
+
+def apply_shocks(market, scenarios):
+    """
+    Shocked (scenarios, days) arrays for every row of `scenarios`.
+    market: (days,) arrays 'SP500_Return', 'S&P500', 'VIX' and 'SOFR_Rate' (NaNs kept).
+    """
+    def column(name):
+        return scenarios[name].to_numpy(dtype=float)[:, np.newaxis]
+
+    n_days = len(market['VIX'])
+    days_since = np.arange(n_days) - column('shock_day')  # (scenarios, days)
+    shocked = days_since >= 0
+
+    spike_log = np.log1p(column('vix_spike'))
+    ramp_days = np.maximum(column('vix_ramp_days'), 1.0)
+    decay_days = np.maximum(column('vix_decay_days'), 0.0)
+    ramp_share = np.clip((days_since + 1) / ramp_days, 0.0, 1.0)
+    decay_share = np.clip((days_since - ramp_days + 1) / (decay_days + 1), 0.0, 1.0)
+    vix_factor = np.where(shocked & (days_since < ramp_days + decay_days),
+                          np.exp(spike_log * np.minimum(ramp_share, 1.0 - decay_share)), 1.0)
+
+    gap = column('sp500_gap')
+    return {
+        'VIX': market['VIX'] * vix_factor,
+        'SOFR_Rate': market['SOFR_Rate'] + np.where(shocked, column('sofr_shift'), 0.0),
+        'S&P500': market['S&P500'] * np.where(shocked, 1.0 + gap, 1.0),
+        'SP500_Return': np.where(days_since == 0, (1.0 + market['SP500_Return']) * (1.0 + gap) - 1.0,
+                                 market['SP500_Return']),
+    }
+
+
+def _stress_chunk(market, scenarios, settings, initial_capital, cost_model):
+    """Runs one chunk of scenarios and returns its Model A and Model B metric tables."""
+    cfg = types.SimpleNamespace(**settings)
+    n_scenarios = len(scenarios)
+    paths = apply_shocks(market, scenarios)
+    sofr_rates = np.nan_to_num(paths['SOFR_Rate'], nan=0.0)
+    with np.errstate(invalid='ignore'):
+        rfr_annual = np.nanmean(paths['SOFR_Rate'], axis=1)
+
+    short, cover_momentum, cover_absolute_vix = signal_generation.compute_vix_momentum_signal_arrays(
+        paths['VIX'], int(cfg.MOMENTUM_LOOKBACK_PERIOD), cfg.VIX_PCT_CHANGE_THRESHOLD_UP,
+        cfg.VIX_PCT_CHANGE_THRESHOLD_DOWN, cfg.N_CONSECUTIVE_UP_DAYS_TO_SHORT, cfg.N_CONSECUTIVE_DOWN_DAYS_TO_COVER,
+        cfg.VIX_ABSOLUTE_COVER_THRESHOLD)
+
+    values_a = simulation_engine.model_a_value_matrix(paths['SP500_Return'], initial_capital, cfg.EQUITY_ALLOC_A)
+    arrays = simulation_engine.model_b_param_arrays(
+        {name: np.full(n_scenarios, getattr(cfg, name)) for name in simulation_engine.MODEL_B_SWEEP_PARAMS}, cfg)
+    values_b = simulation_engine.model_b_value_matrix(
+        paths['SP500_Return'], paths['S&P500'], sofr_rates, short, cover_momentum, cover_absolute_vix, initial_capital,
+        arrays, cost_model)
+
+    metrics_a = risk_metrics.calculate_metrics_batch(values_a, rfr_annual, initial_capital, cfg.TRADING_DAYS_PER_YEAR)
+    metrics_b = risk_metrics.calculate_metrics_batch(values_b, rfr_annual, initial_capital, cfg.TRADING_DAYS_PER_YEAR)
+    return metrics_a.drop(columns="Portfolio"), metrics_b.drop(columns="Portfolio")
+
+
+def run_stress_tests(df_data, cfg, templates=SHOCK_TEMPLATES, shock_days=None, n_shock_dates=20,
+                     chunk_size=500, max_workers=None):
+    """
+    Runs Model A and Model B under every scenario built from `templates`.
+
+    df_data: prepared market frame (rows with missing S&P 500 or VIX data dropped).
+    shock_days: row positions where shocks start; by default n_shock_dates evenly
+    spaced days after the momentum lookback. Chunks of chunk_size scenarios run on a
+    process pool (max_workers=None uses every core; 1 runs in-process). Model B
+    runs on the batched engine with the cost model selected by cfg.CFD_COST_MODEL,
+    priced on the shocked prices and SOFR.
+
+    Returns {'scenarios': ..., 'A': metrics, 'B': metrics}, row-aligned, with the
+    unshocked baseline in row 0. Each scenario's risk-free rate is its mean SOFR.
+    """
+    market = {col: df_data[col].to_numpy(dtype=float) for col in ['SP500_Return', 'S&P500', 'VIX', 'SOFR_Rate']}
+    n_days = len(df_data)
+    if shock_days is None:
+        shock_days = np.unique(np.linspace(min(cfg.MOMENTUM_LOOKBACK_PERIOD, n_days - 1), n_days - 1,
+                                           n_shock_dates).astype(int))
+    scenarios = build_scenarios(templates, shock_days)
+    settings = {name: getattr(cfg, name) for name in MONTE_CARLO_SETTINGS}
+    cost_model = cost_model_from_config(cfg)
+
+    jobs = [(market, scenarios.iloc[start:start + chunk_size], settings, cfg.INITIAL_CAPITAL, cost_model)
+            for start in range(0, len(scenarios), chunk_size)]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(jobs))
+
+    print(f"--- Stress tests: {len(scenarios)} scenarios x {n_days} days in {len(jobs)} chunk(s) "
+          f"on {max_workers} worker(s) ---")
+    if max_workers <= 1:
+        results = [_stress_chunk(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_stress_chunk, *zip(*jobs)))
+
+    scenarios = scenarios.assign(shock_date=df_data['date'].to_numpy()[scenarios['shock_day']]) \
+        if 'date' in df_data.columns else scenarios
+    return {
+        'scenarios': scenarios,
+        'A': pd.concat([metrics_a for metrics_a, _ in results], ignore_index=True),
+        'B': pd.concat([metrics_b for _, metrics_b in results], ignore_index=True),
+    }
+
+
+def stress_test_table(results, model='B', metrics=None):
+    """Scenario x metric table for one model, with each metric's change from the baseline row."""
+    metrics = metrics or risk_metrics.METRIC_NAMES
+    table = results[model][metrics]
+    changes = (table - table.iloc[0]).add_suffix(' vs Baseline')
+    return pd.concat([results['scenarios'], table, changes], axis=1)
+
+
+def summarize_stress_tests(results, metrics=('Total Return', 'Max Drawdown', 'Sharpe Ratio')):
+    """Per template: median and worst value of each metric for Model A and Model B."""
+    rows = []
+    for name, rows_idx in results['scenarios'].groupby('Scenario', sort=False).groups.items():
+        row = {'Scenario': name, 'Count': len(rows_idx)}
+        for metric in metrics:
+            for model in ('A', 'B'):
+                values = results[model].loc[rows_idx, metric]
+                row[f"{model} {metric} Median"] = values.median()
+                row[f"{model} {metric} Worst"] = values.min()
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('Scenario')
+
+
+if __name__ == '__main__':
+    import config as cfg
+    import data_loader
+
+    df_market_data = data_loader.load_and_prepare_market_data(cfg)
+    if df_market_data.empty:
+        print("Exiting due to data loading issues.")
+    else:
+        df_stress_source = df_market_data.dropna(subset=['SP500_Return', 'S&P500', 'VIX']).reset_index(drop=True)
+        summary = summarize_stress_tests(run_stress_tests(df_stress_source, cfg))
+        print(summary.T.to_string(float_format=lambda x: f"{x:.4f}"))
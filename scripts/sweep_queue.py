@@ -0,0 +1,400 @@
+# sweep_queue.py
+# Resumable sweep queue backed by a local SQLite work ledger.
+#
+# A sweep definition (parameter grid + the base config values it was created with)
+# is split into chunks of configuration indices. Workers -- any number of
+# processes, on one host or several hosts sharing the ledger file -- claim a
+# pending chunk, evaluate it with experiment_runner.evaluate_config_chunk and write
+# its metrics back in one transaction. Result rows are keyed by (sweep, config
+# index), so writing a chunk twice is harmless: a worker whose claim went stale and
+# was handed to someone else can still finish without duplicating work. Claims
+# without a heartbeat for `stale_after` seconds and failed chunks (up to
+# max_attempts) go back to pending, so a crashed run resumes where it stopped.
+# The definition also stores a fingerprint of the market data it was created on;
+# a worker whose prepared data differs refuses to run rather than mix results.
+#
+# Note: SQLite relies on file locking; on network filesystems make sure locking
+# is supported (or give each host its own ledger).
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import risk_metrics
+import simulation_engine
+from cfd_cost_model import FlatCostModel, cost_model_from_config, cost_model_from_dict
+from experiment_runner import EXPERIMENT_PARAMS, SHARED_MARKET_COLUMNS, evaluate_config_chunk, market_arrays
+
+SWEEP_BASE_SETTINGS = EXPERIMENT_PARAMS + ['INITIAL_CAPITAL', 'TRADING_DAYS_PER_YEAR']
+_METRIC_COLUMNS = [f"m{i}" for i in range(len(risk_metrics.METRIC_NAMES))]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sweeps (
+    sweep_id TEXT PRIMARY KEY,
+    definition TEXT NOT NULL,
+    n_configs INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS work_items (
+    sweep_id TEXT NOT NULL,
+    chunk_id INTEGER NOT NULL,
+    start_index INTEGER NOT NULL,
+    stop_index INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    claimed_at REAL,
+    heartbeat_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (sweep_id, chunk_id)
+);
+CREATE INDEX IF NOT EXISTS work_items_status ON work_items (sweep_id, status, chunk_id);
+CREATE TABLE IF NOT EXISTS results (
+    sweep_id TEXT NOT NULL,
+    config_index INTEGER NOT NULL,
+    {', '.join(f'{col} REAL' for col in _METRIC_COLUMNS)},
+    PRIMARY KEY (sweep_id, config_index)
+);
+"""
+
+
+def prepare_sweep_frame(df_market_data):
+    """Drops rows missing any market column a sweep uses (as main_analysis.prepare_simulation_frame does)."""
+    return df_market_data.dropna(subset=SHARED_MARKET_COLUMNS).reset_index(drop=True)
+
+
+def market_fingerprint(df_data, rfr_annual=None):
+    """
+    Row count, date range, risk-free rate and a SHA-256 of the prepared market arrays,
+    so every host of a sweep can check it evaluates the same data.
+    """
+    if rfr_annual is None:
+        rfr_annual = float(df_data['SOFR_Rate'].mean())
+    digest = hashlib.sha256()
+    for col, values in market_arrays(df_data).items():
+        digest.update(col.encode())
+        digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    dates = pd.to_datetime(df_data['date']) if 'date' in df_data.columns and len(df_data) else None
+    return {
+        'rows': len(df_data),
+        'first_date': None if dates is None else str(dates.iloc[0].date()),
+        'last_date': None if dates is None else str(dates.iloc[-1].date()),
+        'rfr_annual': float(rfr_annual),
+        'sha256': digest.hexdigest(),
+    }
+
+
+def grid_size(param_grid):
+    return int(np.prod([len(values) for values in param_grid.values()], dtype=np.int64)) if param_grid else 1
+
+
+def grid_configs(param_grid, indices):
+    """
+    The configurations at `indices` of a grid as {name: (n,) array}, numbered in the
+    same order as parameter_sweep.expand_param_grid but without expanding the grid.
+    """
+    if not param_grid:
+        return {}
+    positions = np.unravel_index(np.asarray(indices), [len(values) for values in param_grid.values()])
+    return {name: np.asarray(values, dtype=float)[pos]
+            for (name, values), pos in zip(param_grid.items(), positions)}
+
+
+class SweepLedger:
+    """SQLite ledger of sweeps, their work items (chunks) and per-configuration results."""
+
+    def __init__(self, path, timeout=60.0):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _transaction(self):
+        return _ImmediateTransaction(self.conn)
+
+    def create_sweep(self, sweep_id, param_grid, cfg, df_data, chunk_size=256, rfr_annual=None):
+        """
+        Registers a sweep and its work items. Re-creating an existing sweep with the
+        same definition is a no-op (so a launcher can be re-run safely); a different
+        definition under the same id raises ValueError. The sweep runs with cfg's CFD
+        cost model; flat-cost parameters can only be swept with flat costs.
+        df_data: the prepared market frame (see prepare_sweep_frame) workers must use;
+        its market_fingerprint is stored with the definition.
+        """
+        unknown = set(param_grid) - set(EXPERIMENT_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameter(s): {sorted(unknown)}. Use names from EXPERIMENT_PARAMS.")
+        cost_model = cost_model_from_config(cfg)
+        flat_swept = set(param_grid) & set(simulation_engine.FLAT_COST_PARAMS)
+        if flat_swept and not isinstance(cost_model, FlatCostModel):
+            raise ValueError(f"{sorted(flat_swept)} only apply to the flat CFD cost model, not '{cost_model.name}'.")
+        # The grid is stored as ordered pairs: its order defines the configuration numbering.
+        definition = {
+            'grid': [[name, [float(v) for v in np.atleast_1d(values)]] for name, values in param_grid.items()],
+            'base': {name: float(getattr(cfg, name)) for name in SWEEP_BASE_SETTINGS},
+            'cost_model': cost_model.as_dict(),
+            'market': market_fingerprint(df_data, rfr_annual),
+        }
+        definition_json = json.dumps(definition, sort_keys=True)
+        n_configs = grid_size(dict(definition['grid']))
+
+        with self._transaction() as conn:
+            row = conn.execute("SELECT definition FROM sweeps WHERE sweep_id = ?", (sweep_id,)).fetchone()
+            if row is not None:
+                if row[0] != definition_json:
+                    raise ValueError(f"Sweep '{sweep_id}' already exists with a different definition.")
+                return n_configs
+            conn.execute("INSERT INTO sweeps VALUES (?, ?, ?, ?, ?)",
+                         (sweep_id, definition_json, n_configs, chunk_size, time.time()))
+            conn.executemany(
+                "INSERT INTO work_items (sweep_id, chunk_id, start_index, stop_index) VALUES (?, ?, ?, ?)",
+                ((sweep_id, chunk_id, start, min(start + chunk_size, n_configs))
+                 for chunk_id, start in enumerate(range(0, n_configs, chunk_size))))
+        print(f"Sweep '{sweep_id}' created: {n_configs} configurations in chunks of {chunk_size}.")
+        return n_configs
+
+    def definition(self, sweep_id):
+        """
+        {'grid': {name: values} in numbering order, 'base': {name: value}, 'cost_model': as_dict(),
+        'market': market_fingerprint} of a sweep.
+        """
+        row = self.conn.execute("SELECT definition FROM sweeps WHERE sweep_id = ?", (sweep_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No sweep '{sweep_id}' in ledger {self.path}.")
+        definition = json.loads(row[0])
+        definition['grid'] = dict(definition['grid'])
+        return definition
+
+    @staticmethod
+    def _requeue_stale(conn, sweep_id, stale_after):
+        return conn.execute("UPDATE work_items SET status = 'pending', worker = NULL "
+                            "WHERE sweep_id = ? AND status = 'claimed' AND heartbeat_at < ?",
+                            (sweep_id, time.time() - stale_after)).rowcount
+
+    def requeue_stale(self, sweep_id, stale_after):
+        """Returns claims without a heartbeat for stale_after seconds to pending."""
+        with self._transaction() as conn:
+            return self._requeue_stale(conn, sweep_id, stale_after)
+
+    def claim(self, sweep_id, worker, stale_after=600.0):
+        """Claims the next pending chunk (re-queueing stale claims first); returns (chunk_id, start, stop) or None."""
+        with self._transaction() as conn:
+            self._requeue_stale(conn, sweep_id, stale_after)
+            row = conn.execute("SELECT chunk_id, start_index, stop_index FROM work_items "
+                               "WHERE sweep_id = ? AND status = 'pending' ORDER BY chunk_id LIMIT 1",
+                               (sweep_id,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute("UPDATE work_items SET status = 'claimed', worker = ?, claimed_at = ?, heartbeat_at = ?, "
+                         "attempts = attempts + 1 WHERE sweep_id = ? AND chunk_id = ?",
+                         (worker, now, now, sweep_id, row[0]))
+        return row
+
+    def heartbeat(self, sweep_id, chunk_id, worker):
+        with self._transaction() as conn:
+            conn.execute("UPDATE work_items SET heartbeat_at = ? WHERE sweep_id = ? AND chunk_id = ? AND worker = ?",
+                         (time.time(), sweep_id, chunk_id, worker))
+
+    def complete(self, sweep_id, chunk_id, start, metrics):
+        """Writes a chunk's metrics rows and marks it done, atomically and idempotently."""
+        rows = [(sweep_id, start + i, *map(float, metric_row)) for i, metric_row in enumerate(metrics)]
+        placeholders = ', '.join('?' * (2 + len(_METRIC_COLUMNS)))
+        with self._transaction() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO results VALUES ({placeholders})", rows)
+            conn.execute("UPDATE work_items SET status = 'done', error = NULL WHERE sweep_id = ? AND chunk_id = ?",
+                         (sweep_id, chunk_id))
+
+    def fail(self, sweep_id, chunk_id, worker, error, max_attempts=3):
+        """
+        Records a failure of worker's claim; the chunk is re-queued until it has been
+        attempted max_attempts times. A claim that went stale and was re-claimed by
+        another worker is left alone.
+        """
+        with self._transaction() as conn:
+            conn.execute("UPDATE work_items SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                         "worker = NULL, error = ? "
+                         "WHERE sweep_id = ? AND chunk_id = ? AND status = 'claimed' AND worker = ?",
+                         (max_attempts, str(error), sweep_id, chunk_id, worker))
+
+    def retry_failed(self, sweep_id):
+        with self._transaction() as conn:
+            return conn.execute("UPDATE work_items SET status = 'pending', attempts = 0 "
+                                "WHERE sweep_id = ? AND status = 'failed'", (sweep_id,)).rowcount
+
+    def progress(self, sweep_id):
+        """{status: chunk count} for a sweep."""
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM work_items WHERE sweep_id = ? GROUP BY status",
+                                 (sweep_id,)).fetchall()
+        return {status: count for status, count in rows}
+
+    def results_frame(self, sweep_id):
+        """Completed configurations with their grid parameters and metrics, in configuration order."""
+        definition = self.definition(sweep_id)
+        df_results = pd.read_sql_query(
+            f"SELECT config_index, {', '.join(_METRIC_COLUMNS)} FROM results WHERE sweep_id = ? ORDER BY config_index",
+            self.conn, params=(sweep_id,))
+        df_results.columns = ['config_index'] + risk_metrics.METRIC_NAMES
+        if df_results.empty:
+            return df_results
+        params = pd.DataFrame(grid_configs(definition['grid'], df_results['config_index'].to_numpy()),
+                              index=df_results.index)
+        return pd.concat([df_results[['config_index']], params, df_results[risk_metrics.METRIC_NAMES]], axis=1)
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK, so claims never race between processes."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class _Heartbeat:
+    """
+    Refreshes a claim's heartbeat every `interval` seconds from a background thread
+    while the chunk is evaluated. The thread has its own ledger connection (sqlite3
+    connections cannot be shared between threads).
+    """
+
+    def __init__(self, ledger_path, sweep_id, chunk_id, worker, interval):
+        self.args = (sweep_id, chunk_id, worker)
+        self.ledger_path = ledger_path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        with SweepLedger(self.ledger_path) as ledger:
+            while not self.stopped.wait(self.interval):
+                try:
+                    ledger.heartbeat(*self.args)
+                except sqlite3.Error as e:
+                    print(f"Worker {self.args[2]}: heartbeat for chunk {self.args[1]} failed: {e}")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stopped.set()
+        self.thread.join()
+
+
+def chunk_params(definition, start, stop):
+    """{name: (n,) array} for every EXPERIMENT_PARAMS name: grid values, else the sweep's base value."""
+    params = grid_configs(definition['grid'], np.arange(start, stop))
+    for name in EXPERIMENT_PARAMS:
+        if name not in params:
+            params[name] = np.full(stop - start, definition['base'][name])
+    return params
+
+
+def run_sweep_worker(ledger_path, sweep_id, df_data, worker=None, stale_after=600.0, max_attempts=3,
+                     max_chunks=None, rfr_annual=None):
+    """
+    Claims and evaluates chunks of a sweep until none are pending (or max_chunks
+    were processed). The claim's heartbeat is refreshed every stale_after / 3 seconds
+    while a chunk runs, so only workers that died lose their chunks.
+    df_data must match the sweep's market fingerprint (ValueError otherwise).
+    Returns the number of chunks completed by this worker.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    market = market_arrays(df_data)
+    if rfr_annual is None:
+        rfr_annual = float(df_data['SOFR_Rate'].mean())
+    completed = 0
+    with SweepLedger(ledger_path) as ledger:
+        definition = ledger.definition(sweep_id)
+        fingerprint = market_fingerprint(df_data, rfr_annual)
+        if 'market' in definition and definition['market'] != fingerprint:
+            raise ValueError(f"Worker {worker}: market data {fingerprint} differs from the data sweep '{sweep_id}' "
+                             f"was created on {definition['market']}; refusing to run.")
+        base = definition['base']
+        # Flat rates come from chunk_params per configuration; sweeps from before cost models were stored are flat.
+        cost_model = (cost_model_from_dict(definition['cost_model']) if 'cost_model' in definition else
+                      FlatCostModel(base['BROKER_FEE_ANNUALIZED'], base['SPREAD_COST_PERCENT'],
+                                    base['CFD_INITIAL_MARGIN_PERCENT']))
+        while max_chunks is None or completed < max_chunks:
+            item = ledger.claim(sweep_id, worker, stale_after)
+            if item is None:
+                break
+            chunk_id, start, stop = item
+            try:
+                with _Heartbeat(ledger_path, sweep_id, chunk_id, worker, stale_after / 3):
+                    metrics = evaluate_config_chunk(market, chunk_params(definition, start, stop),
+                                                    base['INITIAL_CAPITAL'], rfr_annual,
+                                                    int(base['TRADING_DAYS_PER_YEAR']), cost_model)
+            except Exception as e:
+                print(f"Worker {worker}: chunk {chunk_id} failed: {e}")
+                ledger.fail(sweep_id, chunk_id, worker, e, max_attempts)
+                continue
+            ledger.complete(sweep_id, chunk_id, start, metrics)
+            completed += 1
+        print(f"Worker {worker}: completed {completed} chunk(s). Progress: {ledger.progress(sweep_id)}")
+    return completed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumable Model B sweep queue.")
+    parser.add_argument('ledger', help="SQLite ledger file")
+    parser.add_argument('sweep_id')
+    sub = parser.add_subparsers(dest='command', required=True)
+    create = sub.add_parser('create', help="expand a sweep into work items")
+    create.add_argument('grid', help='JSON grid, e.g. \'{"EQUITY_ALLOC_B": [0.6, 0.8]}\'')
+    create.add_argument('--chunk-size', type=int, default=256)
+    work = sub.add_parser('work', help="claim and run chunks until the sweep is drained")
+    work.add_argument('--stale-after', type=float, default=600.0)
+    work.add_argument('--max-chunks', type=int)
+    sub.add_parser('status', help="print chunk counts by status")
+    export = sub.add_parser('export', help="write completed results to CSV")
+    export.add_argument('csv_path')
+    args = parser.parse_args(argv)
+
+    import config as cfg
+    if args.command in ('create', 'work'):
+        import data_loader
+        df_market_data = data_loader.load_and_prepare_market_data(cfg)
+        if df_market_data.empty:
+            print("Exiting due to data loading issues.")
+            return
+        df_sweep = prepare_sweep_frame(df_market_data)
+    if args.command == 'create':
+        with SweepLedger(args.ledger) as ledger:
+            ledger.create_sweep(args.sweep_id, json.loads(args.grid), cfg, df_sweep, args.chunk_size)
+    elif args.command == 'work':
+        run_sweep_worker(args.ledger, args.sweep_id, df_sweep, stale_after=args.stale_after,
+                         max_chunks=args.max_chunks)
+    elif args.command == 'status':
+        with SweepLedger(args.ledger) as ledger:
+            print(ledger.progress(args.sweep_id))
+    elif args.command == 'export':
+        with SweepLedger(args.ledger) as ledger:
+            ledger.results_frame(args.sweep_id).to_csv(args.csv_path, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+# walk_forward.py
+# Walk-forward optimisation of the VIX momentum signal parameters.
+#
+# Train/test windows slide over the data; on every train window each point of a
+# signal-parameter grid is run through Model B, the best one by a risk_metrics
+# objective is kept, and it trades the following test window out-of-sample.
+# Work shared between folds is done once:
+#   - the signals only look backwards, so one signal tensor over the whole history
+#     (generate_vix_momentum_signal_tensor, which itself shares the VIX changes and
+#     streaks between parameter sets) is sliced by every fold;
+#   - within a train window, grid points whose signals coincide there give the same
+#     Model B path, so only the distinct signal patterns are simulated.
+# Folds are independent and run on a process pool; the market columns and signal
+# tensors are placed in shared memory once and mapped by every worker. The chosen
+# parameters' signals are stitched into one out-of-sample series and Model B is run
+# over it once, so the hedge carries across fold boundaries as it would live.
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import experiment_runner
+import risk_metrics
+import signal_generation
+import simulation_engine
+from cfd_cost_model import cost_model_from_config
+
+SIGNAL_COLUMNS = ['Short_Signal_Today', 'Cover_Signal_Momentum_Today', 'Cover_Signal_Absolute_VIX_Today']
+
+
+def walk_forward_folds(n_days, train_days, test_days, step_days=None, anchored=False, start_day=0):
+    """
+    DataFrame of (train_start, train_end, test_start, test_end) row positions, end-exclusive.
+    Rolling windows of train_days by default; anchored=True grows the train window from start_day.
+    The last test window is truncated at n_days.
+    """
+    step_days = step_days or test_days
+    rows = []
+    train_start = start_day
+    test_start = start_day + train_days
+    while test_start < n_days:
+        rows.append({'train_start': start_day if anchored else train_start, 'train_end': test_start,
+                     'test_start': test_start, 'test_end': min(test_start + test_days, n_days)})
+        train_start += step_days
+        test_start += step_days
+    return pd.DataFrame(rows, columns=['train_start', 'train_end', 'test_start', 'test_end'])
+
+
+def signal_param_grid(param_grid, cfg):
+    """The six signal parameter lists for generate_vix_momentum_signal_tensor, cfg values where not swept."""
+    unknown = set(param_grid) - set(signal_generation.SIGNAL_PARAM_NAMES)
+    if unknown:
+        raise ValueError(f"Walk-forward grids only cover signal parameters; got {sorted(unknown)}")
+    return [np.atleast_1d(param_grid.get(name, getattr(cfg, name))) for name in signal_generation.SIGNAL_PARAM_NAMES]
+
+
+def evaluate_train_window(arrays, train_start, train_end, settings, rfr_annual):
+    """
+    Objective value of every grid point on one train window.
+    arrays: market arrays plus the (configs, days) signal tensors under SIGNAL_COLUMNS.
+    settings: Model B parameters, 'cost_model' and the objective.
+    Returns (objective values, number of distinct signal patterns simulated).
+    """
+    window = slice(train_start, train_end)
+    signals = [arrays[col][:, window] for col in SIGNAL_COLUMNS]
+    packed = np.packbits(np.concatenate(signals, axis=1), axis=1)
+    _, first_rows, pattern = np.unique(packed, axis=0, return_index=True, return_inverse=True)
+    n_patterns = len(first_rows)
+
+    params = {name: np.full(n_patterns, settings[name]) for name in simulation_engine.MODEL_B_SWEEP_PARAMS}
+    model_b = simulation_engine.model_b_param_arrays(params, None)
+    values = simulation_engine.model_b_value_matrix(
+        arrays['SP500_Return'][window], arrays['S&P500'][window], arrays['SOFR_Rate'][window],
+        signals[0][first_rows], signals[1][first_rows], signals[2][first_rows], settings['INITIAL_CAPITAL'],
+        model_b, settings['cost_model'])
+    metrics = risk_metrics.calculate_metrics_batch(values, rfr_annual, settings['INITIAL_CAPITAL'],
+                                                   settings['TRADING_DAYS_PER_YEAR'])
+    objective = metrics[settings['objective']].to_numpy(dtype=float)
+    return objective[pattern.ravel()], n_patterns
+
+
+def _select_fold(fold, train_start, train_end, settings, rfr_annual, arrays=None):
+    """Best grid point for one fold; pool tasks use the shared arrays attached to the worker."""
+    if arrays is None:
+        arrays = experiment_runner.attached_arrays()
+    objective, n_patterns = evaluate_train_window(arrays, train_start, train_end, settings, rfr_annual)
+    score = objective if settings['maximize'] else -objective
+    score = np.where(np.isnan(score), -np.inf, score)
+    best = int(np.argmax(score))
+    return fold, best, objective[best], n_patterns
+
+
+def run_walk_forward(df_data, cfg, param_grid, train_days=504, test_days=63, step_days=None, anchored=False,
+                     objective='Sharpe Ratio', maximize=True, max_workers=None):
+    """
+    Walk-forward optimisation of the signal parameters in param_grid
+    ({name from SIGNAL_PARAM_NAMES: [values]}, others from cfg) for Model B.
+
+    df_data: prepared market frame (as for generate_vix_momentum_signals).
+    Each fold picks the grid point with the best `objective` (a risk_metrics metric)
+    on its train window, starting Model B flat with INITIAL_CAPITAL. Train windows
+    (batched engine) and out-of-sample runs use the cost model selected by
+    cfg.CFD_COST_MODEL.
+
+    Returns a dict with:
+      'folds'   one row per fold: window dates, chosen parameters, train objective,
+                distinct signal patterns simulated and out-of-sample metrics;
+      'values'  out-of-sample Model B values over all test windows (stitched signals);
+      'metrics' out-of-sample metrics of the walk-forward Model B, Model B with the
+                cfg parameters and Model A over the same days;
+      'stats'   folds, grid size, wall time.
+    """
+    started = time.perf_counter()
+    cost_model = cost_model_from_config(cfg)
+    df_data = df_data.reset_index(drop=True)
+    tensor = signal_generation.generate_vix_momentum_signal_tensor(df_data, *signal_param_grid(param_grid, cfg))
+    grid = tensor['params']
+    folds = walk_forward_folds(len(df_data), train_days, test_days, step_days, anchored)
+    if folds.empty:
+        print("Walk-forward: not enough data for one train and test window.")
+        return {'folds': folds, 'values': pd.Series(dtype=float), 'metrics': pd.DataFrame(), 'stats': {}}
+
+    arrays = experiment_runner.market_arrays(df_data, ['SP500_Return', 'S&P500', 'SOFR_Rate'])
+    arrays.update({col: tensor[col] for col in SIGNAL_COLUMNS})
+    settings = {name: float(getattr(cfg, name)) for name in simulation_engine.MODEL_B_SWEEP_PARAMS}
+    settings.update(INITIAL_CAPITAL=float(cfg.INITIAL_CAPITAL), TRADING_DAYS_PER_YEAR=cfg.TRADING_DAYS_PER_YEAR,
+                    objective=objective, maximize=maximize, cost_model=cost_model)
+    sofr = df_data['SOFR_Rate'].to_numpy(dtype=float)
+    jobs = [(fold.Index, fold.train_start, fold.train_end, settings, np.nanmean(sofr[fold.train_start:fold.train_end]))
+            for fold in folds.itertuples()]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(jobs))
+    print(f"--- Walk-forward: {len(folds)} folds x {len(grid)} parameter sets on {max_workers} worker(s) ---")
+    if max_workers <= 1:
+        selections = [_select_fold(*job, arrays=arrays) for job in jobs]
+    else:
+        with experiment_runner.SharedMarketData(arrays) as shared:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=experiment_runner._attach_shared_market_data,
+                                     initargs=(shared.specs,)) as executor:
+                selections = list(executor.map(_select_fold, *zip(*jobs)))
+    selections.sort()
+    best_rows = np.array([best for _, best, _, _ in selections])
+
+    # Stitch the chosen parameters' signals over the test windows and trade them once.
+    oos = slice(folds['test_start'].iloc[0], folds['test_end'].iloc[-1])
+    df_oos = df_data.copy()
+    for col in SIGNAL_COLUMNS:
+        stitched = np.zeros(len(df_data), dtype=bool)
+        for fold, best in zip(folds.itertuples(), best_rows):
+            stitched[fold.test_start:fold.test_end] = tensor[col][best, fold.test_start:fold.test_end]
+        df_oos[col] = stitched
+    df_oos = df_oos.iloc[oos].reset_index(drop=True)
+    values_wf = simulation_engine.simulate_portfolio_B_momentum_arrays(df_oos, cfg.INITIAL_CAPITAL, cfg,
+                                                                       cost_model=cost_model)
+
+    df_fixed = signal_generation.generate_vix_momentum_signals(df_data, cfg).iloc[oos].reset_index(drop=True)
+    values_fixed = simulation_engine.simulate_portfolio_B_momentum_arrays(df_fixed, cfg.INITIAL_CAPITAL, cfg,
+                                                                          cost_model=cost_model)
+    values_a = simulation_engine.simulate_portfolio_A(df_oos, cfg.INITIAL_CAPITAL, cfg.EQUITY_ALLOC_A)
+    rfr_oos = df_oos['SOFR_Rate'].mean()
+    metrics = risk_metrics.calculate_metrics_batch(
+        np.vstack([values_wf.to_numpy(), values_fixed.to_numpy(), values_a.to_numpy()]), rfr_oos,
+        cfg.INITIAL_CAPITAL, cfg.TRADING_DAYS_PER_YEAR,
+        portfolio_names=["B (Walk-Forward)", "B (Config Params)", cfg.PORTFOLIO_A_LABEL]).set_index("Portfolio")
+
+    # Per-fold out-of-sample metrics from the stitched run, each starting from the previous fold's close.
+    fold_rows = []
+    values_array = values_wf.to_numpy()
+    for (fold, best, train_objective, n_patterns), window in zip(selections, folds.itertuples()):
+        start, end = window.test_start - oos.start, window.test_end - oos.start
+        fold_capital = values_array[start - 1] if start > 0 else float(cfg.INITIAL_CAPITAL)
+        fold_values = values_wf.iloc[start:end].reset_index(drop=True)
+        fold_metrics = risk_metrics.calculate_metrics_summary(
+            "OOS", fold_values, fold_values.pct_change().fillna(0), df_oos['SOFR_Rate'].iloc[start:end].mean(),
+            fold_capital, cfg.TRADING_DAYS_PER_YEAR)
+        fold_rows.append({
+            'fold': fold,
+            'train_start': df_data['date'].iloc[window.train_start], 'train_end': df_data['date'].iloc[window.train_end - 1],
+            'test_start': df_data['date'].iloc[window.test_start], 'test_end': df_data['date'].iloc[window.test_end - 1],
+            **grid.iloc[best].to_dict(),
+            f'Train {objective}': train_objective, 'Signal Patterns': n_patterns,
+            'OOS Total Return': fold_metrics['Total Return'], 'OOS Max Drawdown': fold_metrics['Max Drawdown'],
+            f'OOS {objective}': fold_metrics.get(objective, np.nan),
+        })
+
+    elapsed = time.perf_counter() - started
+    stats = {'folds': len(folds), 'grid_size': len(grid), 'workers': max_workers, 'seconds': elapsed,
+             'simulated_patterns': int(sum(n for _, _, _, n in selections))}
+    print(f"Walk-forward complete in {elapsed:.2f}s ({stats['simulated_patterns']} distinct signal patterns "
+          f"simulated for {len(folds) * len(grid)} fold/parameter pairs).")
+    return {
+        'folds': pd.DataFrame(fold_rows),
+        'values': pd.Series(values_wf.to_numpy(), index=df_oos['date']),
+        'metrics': metrics,
+        'stats': stats,
+    }
+
+
+if __name__ == '__main__':
+    import config as cfg
+    import data_loader
+
+    df_market_data = data_loader.load_and_prepare_market_data(cfg)
+    if df_market_data.empty:
+        print("Exiting due to data loading issues.")
+    else:
+        df_walk = df_market_data.dropna(subset=['SP500_Return', 'S&P500', 'VIX']).reset_index(drop=True)
+        walk_forward_grid = {
+            'MOMENTUM_LOOKBACK_PERIOD': [3, 5, 10, 15, 20],
+            'VIX_PCT_CHANGE_THRESHOLD_UP': [0.0, 0.02, 0.05, 0.10, 0.15],
+            'VIX_PCT_CHANGE_THRESHOLD_DOWN': [0.0, -0.02, -0.05, -0.10, -0.15],
+            'N_CONSECUTIVE_UP_DAYS_TO_SHORT': [1, 2, 3, 4],
+            'N_CONSECUTIVE_DOWN_DAYS_TO_COVER': [1, 2, 3, 4],
+            'VIX_ABSOLUTE_COVER_THRESHOLD': [15, 18, 20],
+        }
+        result = run_walk_forward(df_walk, cfg, walk_forward_grid)
+        print(result['folds'].to_string(index=False))
+        print(result['metrics'].T.to_string(float_format=lambda x: f"{x:.4f}"))
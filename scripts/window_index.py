@@ -0,0 +1,162 @@
+import pandas as pd
+import numpy as np
+
+
+class WindowIndex:
+    """
+    Query index over the value paths of one full simulation run, built once in O(n log n).
+    Answers total return and volatility (prefix sums) and trough and peak (sparse tables)
+    for any [start, end] date window in O(1). Max drawdown and recovery take
+    O(log n) (sparse-table blocks merged left to right). Every query is vectorised
+    over the portfolios. A window's returns include its first day, measured from the
+    previous close (or the initial capital), as a fresh simulation of that window
+    would see it.
+    """
+
+    def __init__(self, dates, portfolio_values, initial_capital, names=None):
+        self.dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ns]')
+        values = np.atleast_2d(np.asarray(portfolio_values, dtype=float))
+        self.names = list(names) if names is not None else [f"Portfolio {k}" for k in range(values.shape[0])]
+        self.initial_capital = float(initial_capital)
+        # Position 0 is the starting capital, so day t lives at position t + 1.
+        self.values = np.concatenate([np.full((values.shape[0], 1), self.initial_capital), values], axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_returns = np.log(self.values[:, 1:] / self.values[:, :-1])
+            returns = np.expm1(log_returns)
+        # Centred prefix sums keep the windowed variance subtraction well conditioned.
+        self._return_offset = np.nanmean(returns, axis=1, keepdims=True) if returns.shape[1] else np.zeros((len(values), 1))
+        centred = returns - self._return_offset
+        zeros = np.zeros((values.shape[0], 1))
+        self._prefix_log = np.concatenate([zeros, np.cumsum(log_returns, axis=1)], axis=1)
+        self._prefix_sum = np.concatenate([zeros, np.cumsum(centred, axis=1)], axis=1)
+        self._prefix_sq = np.concatenate([zeros, np.cumsum(centred * centred, axis=1)], axis=1)
+        self._build_sparse_tables()
+
+    def _build_sparse_tables(self):
+        """Level k holds argmin, argmax and max drawdown of values[i : i + 2**k]."""
+        values = self.values
+        n_points = values.shape[1]
+        rows = np.arange(values.shape[0])[:, np.newaxis]
+        positions = np.broadcast_to(np.arange(n_points), values.shape)
+        self._argmin, self._argmax, self._mdd = [positions.copy()], [positions.copy()], [np.zeros(values.shape)]
+        k = 1
+        while (1 << k) <= n_points:
+            half = 1 << (k - 1)
+            width = n_points - (1 << k) + 1
+            left_min, right_min = self._argmin[-1][:, :width], self._argmin[-1][:, half:half + width]
+            left_max, right_max = self._argmax[-1][:, :width], self._argmax[-1][:, half:half + width]
+            # Ties keep the earliest position (same as idxmin/idxmax).
+            self._argmin.append(np.where(values[rows, right_min] < values[rows, left_min], right_min, left_min))
+            self._argmax.append(np.where(values[rows, right_max] > values[rows, left_max], right_max, left_max))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                across = values[rows, right_min] / values[rows, left_max] - 1.0
+            self._mdd.append(np.minimum(np.minimum(self._mdd[-1][:, :width], self._mdd[-1][:, half:half + width]), across))
+            k += 1
+
+    def positions(self, start_date, end_date):
+        """Day positions (first, last) of the trading days inside [start_date, end_date]; None if empty."""
+        first = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start_date)), 'left'))
+        last = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end_date)), 'right')) - 1
+        return (first, last) if first <= last else None
+
+    def position_of(self, date):
+        """Day position of an exact trading date, or None if it is not in the run."""
+        pos = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date)), 'left'))
+        return pos if pos < len(self.dates) and self.dates[pos] == np.datetime64(pd.Timestamp(date)) else None
+
+    def _range_arg(self, table, lo, hi, prefer_right):
+        """Sparse-table arg query over value points [lo, hi] (inclusive)."""
+        k = (hi - lo + 1).bit_length() - 1
+        rows = np.arange(self.values.shape[0])
+        left, right = table[k][:, lo], table[k][:, hi - (1 << k) + 1]
+        better = prefer_right(self.values[rows, right], self.values[rows, left])
+        return np.where(better, right, left)
+
+    def _window_points(self, start_date, end_date):
+        days = self.positions(start_date, end_date)
+        if days is None:
+            return None
+        return days[0] + 1, days[1] + 1
+
+    def total_return(self, start_date, end_date):
+        """Return over the window, from the close before its first day to its last day."""
+        points = self._window_points(start_date, end_date)
+        if points is None:
+            return np.full(len(self.names), np.nan)
+        lo, hi = points
+        return np.expm1(self._prefix_log[:, hi] - self._prefix_log[:, lo - 1])
+
+    def volatility(self, start_date, end_date, trading_days_per_year):
+        """Annualized volatility (ddof=1) of the window's daily returns."""
+        points = self._window_points(start_date, end_date)
+        if points is None:
+            return np.full(len(self.names), np.nan)
+        lo, hi = points
+        n = hi - lo + 1
+        if n < 2:
+            return np.zeros(len(self.names)) if n == 1 else np.full(len(self.names), np.nan)
+        sum_x = self._prefix_sum[:, hi] - self._prefix_sum[:, lo - 1]
+        sum_x2 = self._prefix_sq[:, hi] - self._prefix_sq[:, lo - 1]
+        variance = np.maximum((sum_x2 - sum_x * sum_x / n) / (n - 1), 0.0)
+        return np.sqrt(variance) * np.sqrt(trading_days_per_year)
+
+    def trough(self, start_date, end_date):
+        """(values, dates) of each portfolio's lowest close in the window (first occurrence)."""
+        points = self._window_points(start_date, end_date)
+        if points is None:
+            return np.full(len(self.names), np.nan), np.full(len(self.names), np.datetime64('NaT'), dtype='datetime64[ns]')
+        pos = self._range_arg(self._argmin, *points, prefer_right=np.less)
+        return self.values[np.arange(len(self.names)), pos], self.dates[pos - 1]
+
+    def peak(self, start_date, end_date):
+        """(values, dates) of each portfolio's highest close in the window (first occurrence)."""
+        points = self._window_points(start_date, end_date)
+        if points is None:
+            return np.full(len(self.names), np.nan), np.full(len(self.names), np.datetime64('NaT'), dtype='datetime64[ns]')
+        pos = self._range_arg(self._argmax, *points, prefer_right=np.greater)
+        return self.values[np.arange(len(self.names)), pos], self.dates[pos - 1]
+
+    def max_drawdown(self, start_date, end_date):
+        """Max drawdown within the window; the close before its first day counts as the first peak."""
+        points = self._window_points(start_date, end_date)
+        if points is None:
+            return np.full(len(self.names), np.nan)
+        lo, hi = points[0] - 1, points[1]
+        rows = np.arange(self.values.shape[0])
+        k = (hi - lo + 1).bit_length() - 1
+        mdd = self._mdd[k][:, lo].copy()
+        running_max = self.values[rows, self._argmax[k][:, lo]]
+        lo += 1 << k
+        # Merge the remaining disjoint power-of-two blocks: mdd = min(mdd_A, mdd_B, min_B / max_A - 1).
+        while lo <= hi:
+            k = (hi - lo + 1).bit_length() - 1
+            block_min = self.values[rows, self._argmin[k][:, lo]]
+            block_max = self.values[rows, self._argmax[k][:, lo]]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mdd = np.minimum(np.minimum(mdd, self._mdd[k][:, lo]), block_min / running_max - 1.0)
+            running_max = np.maximum(running_max, block_max)
+            lo += 1 << k
+        return mdd
+
+    def recovery(self, trough_start_date, trough_end_date, end_date):
+        """Return from each portfolio's trough in [trough_start, trough_end] to the close on end_date."""
+        trough_values, _ = self.trough(trough_start_date, trough_end_date)
+        end_pos = self.position_of(end_date)
+        if end_pos is None:
+            return np.full(len(self.names), np.nan)
+        end_values = self.values[:, end_pos + 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(trough_values > 0, end_values / trough_values - 1, np.nan)
+
+    def window_summary(self, start_date, end_date, trading_days_per_year):
+        """Total return, volatility, trough and max drawdown of every portfolio for one window."""
+        trough_values, trough_dates = self.trough(start_date, end_date)
+        return pd.DataFrame({
+            "Portfolio": self.names,
+            "Total Return": self.total_return(start_date, end_date),
+            "Annualized Volatility": self.volatility(start_date, end_date, trading_days_per_year),
+            "Max Drawdown": self.max_drawdown(start_date, end_date),
+            "Trough Value": trough_values,
+            "Trough Date": trough_dates,
+        })
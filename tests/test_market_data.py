@@ -0,0 +1,201 @@
+import os
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import data_loader
+from columnar_store import ColumnarStore, write_columnar_store
+from market_data_cache import MarketDataCache
+from market_data_fetcher import FMPFetcher, FMPStubServer, parse_fmp_historical
+
+
+def close_frame(start, end, first_close=100.0):
+    dates = pd.bdate_range(start, end)
+    return pd.DataFrame({'date': dates, 'close': first_close + pd.RangeIndex(len(dates)).to_numpy(dtype=float)})
+
+
+def assert_closes_equal(df, expected):
+    # Parsed and cached frames may carry different datetime resolutions; compare values.
+    assert list(df.columns) == ['date', 'close']
+    assert list(pd.to_datetime(df['date'])) == list(pd.to_datetime(expected['date']))
+    assert df['close'].tolist() == expected['close'].tolist()
+
+
+def stub_fetcher(stub, **kwargs):
+    return FMPFetcher('test-key', base_url=stub.base_url, backoff_seconds=0.0, timeout=5, **kwargs)
+
+
+def test_parse_fmp_historical_sorts_oldest_first():
+    data = {'symbol': 'X', 'historical': [{'date': '2024-01-03', 'close': '12.5', 'open': 1.0},
+                                          {'date': '2024-01-02', 'close': 11.0, 'open': 1.0}]}
+    df = parse_fmp_historical('X', data, '2024-01-01', '2024-01-05')
+    assert list(df.columns) == ['date', 'close']
+    assert list(df['date']) == [pd.Timestamp('2024-01-02'), pd.Timestamp('2024-01-03')]
+    assert list(df['close']) == [11.0, 12.5]
+
+
+@pytest.mark.parametrize('data', [{}, None, {'historical': []}, {'historical': [{'date': '2024-01-02'}]}])
+def test_parse_fmp_historical_empty_or_malformed(data):
+    df = parse_fmp_historical('X', data, '2024-01-01', '2024-01-05')
+    assert df.empty
+    assert list(df.columns) == ['date', 'close']
+
+
+def test_stub_filters_range_and_returns_newest_first():
+    with FMPStubServer({'X': close_frame('2024-01-01', '2024-01-31')}) as stub:
+        response = stub_fetcher(stub).session.get(f"{stub.base_url}/historical-price-full/X",
+                                                  params={'from': '2024-01-08', 'to': '2024-01-12'})
+        unknown = stub_fetcher(stub).session.get(f"{stub.base_url}/historical-price-full/Y")
+    dates = [row['date'] for row in response.json()['historical']]
+    assert dates == ['2024-01-12', '2024-01-11', '2024-01-10', '2024-01-09', '2024-01-08']
+    assert unknown.status_code == 200 and unknown.json() == {}
+    assert stub.request_counts == {'X': 1, 'Y': 1}
+
+
+@pytest.mark.parametrize('fail_status', [429, 500, 503])
+def test_fetch_retries_transient_errors(fail_status):
+    df_x = close_frame('2024-01-01', '2024-01-31')
+    with FMPStubServer({'X': df_x}, fail_first=2, fail_status=fail_status) as stub:
+        fetcher = stub_fetcher(stub, max_retries=3)
+        df = fetcher.fetch('X', '2024-01-01', '2024-01-31')
+    assert_closes_equal(df, df_x)
+    assert stub.request_counts['X'] == 3
+    stats = fetcher.stats_frame().iloc[0]
+    assert stats['attempts'] == 3 and stats['error'] is None and stats['rows'] == len(df_x)
+
+
+def test_fetch_returns_none_once_retries_are_exhausted():
+    with FMPStubServer({'X': close_frame('2024-01-01', '2024-01-31')}, fail_first=10) as stub:
+        fetcher = stub_fetcher(stub, max_retries=2)
+        assert fetcher.fetch('X', '2024-01-01', '2024-01-31') is None
+    assert stub.request_counts['X'] == 3
+    assert fetcher.stats_frame().iloc[0]['error'].startswith('503')
+
+
+def test_fetch_does_not_retry_client_errors():
+    with FMPStubServer({}, fail_first=10, fail_status=404) as stub:
+        fetcher = stub_fetcher(stub, max_retries=3)
+        assert fetcher.fetch('X', '2024-01-01', '2024-01-31') is None
+    assert stub.request_counts['X'] == 1
+
+
+def test_successful_empty_response_is_an_empty_frame():
+    with FMPStubServer({'X': close_frame('2024-01-01', '2024-01-31')}) as stub:
+        df = stub_fetcher(stub).fetch('X', '2024-03-01', '2024-03-31')
+    assert df is not None and df.empty
+
+
+@pytest.mark.parametrize('backend', ['threads', 'asyncio'])
+def test_fetch_many_keeps_job_order(backend):
+    frames = {'X': close_frame('2024-01-01', '2024-01-31', 100.0), 'Y': close_frame('2024-01-01', '2024-01-31', 50.0)}
+    jobs = [('Y', '2024-01-01', '2024-01-15'), ('X', '2024-01-10', '2024-01-31'), ('Y', '2024-01-16', '2024-01-31')]
+    with FMPStubServer(frames, latency_seconds=0.01) as stub:
+        results = stub_fetcher(stub, backend=backend).fetch_many(jobs)
+    for (symbol, from_date, to_date), df in zip(jobs, results):
+        expected = frames[symbol][(frames[symbol]['date'] >= from_date) & (frames[symbol]['date'] <= to_date)]
+        assert_closes_equal(df, expected)
+
+
+def test_cache_fetches_only_uncovered_gaps(tmp_path):
+    df_x = close_frame('2024-01-01', '2024-03-29')
+    cache = MarketDataCache(str(tmp_path))
+    seeded = df_x[(df_x['date'] >= '2024-02-01') & (df_x['date'] <= '2024-02-29')]
+    cache.merge('X', seeded, '2024-02-01', '2024-02-29')
+    assert cache.missing_ranges('X', '2024-01-01', '2024-03-29') == [('2024-01-01', '2024-01-31'),
+                                                                      ('2024-03-01', '2024-03-29')]
+
+    with FMPStubServer({'X': df_x}) as stub:
+        histories = data_loader.fetch_close_histories(['X'], '2024-01-01', '2024-03-29', stub_fetcher(stub), cache)
+        assert stub.request_counts == {'X': 2}
+        data_loader.fetch_close_histories(['X'], '2024-01-01', '2024-03-29', stub_fetcher(stub), cache)
+        assert stub.request_counts == {'X': 2}  # Second run is served from disk
+    assert_closes_equal(histories['X'], df_x)
+    assert cache.missing_ranges('X', '2024-01-01', '2024-03-29') == []
+
+
+def test_cache_marks_empty_gap_covered_but_not_failed_gap(tmp_path):
+    df_x = close_frame('2024-01-01', '2024-01-31')
+    cache = MarketDataCache(str(tmp_path / 'ok'))
+    cache.merge('X', df_x, '2024-01-01', '2024-01-31')
+    with FMPStubServer({'X': df_x}) as stub:
+        data_loader.fetch_close_histories(['X'], '2024-01-01', '2024-02-09', stub_fetcher(stub), cache)
+    assert cache.missing_ranges('X', '2024-01-01', '2024-02-09') == []
+
+    failing_cache = MarketDataCache(str(tmp_path / 'failed'))
+    with FMPStubServer({'X': df_x}, fail_first=10) as stub:
+        histories = data_loader.fetch_close_histories(['X'], '2024-01-01', '2024-01-31',
+                                                      stub_fetcher(stub, max_retries=0), failing_cache)
+    assert histories['X'].empty
+    assert failing_cache.missing_ranges('X', '2024-01-01', '2024-01-31') == [('2024-01-01', '2024-01-31')]
+
+
+def test_missing_ranges_skips_weekend_only_gaps(tmp_path):
+    cache = MarketDataCache(str(tmp_path))
+    cache.merge('X', close_frame('2024-01-01', '2024-01-05'), '2024-01-01', '2024-01-05')
+    assert cache.missing_ranges('X', '2024-01-01', '2024-01-07') == []
+    assert cache.missing_ranges('X', '2024-01-01', '2024-01-08') == [('2024-01-06', '2024-01-08')]
+
+
+def market_data_cfg(tmp_path, base_url, end_date='2024-03-29'):
+    return types.SimpleNamespace(
+        FMP_API_KEY='test-key', FMP_BASE_URL=base_url, FETCH_MAX_RETRIES=0, FETCH_BACKOFF_SECONDS=0.0,
+        MARKET_DATA_CACHE_DIR=str(tmp_path / 'cache'), MARKET_DATA_SEED_CSV=None,
+        MARKET_DATA_STORE_DIR=str(tmp_path / 'store'), START_DATE='2024-01-01', END_DATE=end_date,
+        SOFR_CSV_FILEPATH=str(tmp_path / 'missing_sofr.csv'), TARGET_SOFR_COL_NAME='SOFR_Rate')
+
+
+def test_store_written_only_for_a_fully_fetched_window(tmp_path):
+    frames = {'^GSPC': close_frame('2024-01-01', '2024-03-29', 4000.0),
+              '^VIX': close_frame('2024-01-01', '2024-03-29', 15.0)}
+    with FMPStubServer(frames, fail_first=1) as stub:
+        cfg = market_data_cfg(tmp_path, stub.base_url)
+        cache = MarketDataCache(cfg.MARKET_DATA_CACHE_DIR)
+        cache.merge('^GSPC', frames['^GSPC'][frames['^GSPC']['date'] <= '2024-01-31'], '2024-01-01', '2024-01-31')
+        cache.merge('^VIX', frames['^VIX'], '2024-01-01', '2024-03-29')
+
+        df_partial = data_loader.load_and_prepare_market_data(cfg)  # The ^GSPC gap request fails
+        assert len(df_partial) == len(pd.bdate_range('2024-01-01', '2024-01-31'))
+        assert data_loader.load_market_data_store(cfg) is None
+
+        df_full = data_loader.load_and_prepare_market_data(cfg)  # Retried and now complete
+        assert len(df_full) == len(frames['^GSPC'])
+    df_stored = data_loader.load_market_data_store(cfg)
+    assert df_stored is not None and len(df_stored) == len(df_full)
+
+    cache.merge('^VIX', frames['^VIX'].assign(close=frames['^VIX']['close'] + 1.0), '2024-01-01', '2024-03-29')
+    assert data_loader.load_market_data_store(cfg) is None  # Cache content changed
+
+
+def test_store_not_written_while_the_window_reaches_today(tmp_path):
+    frames = {'^GSPC': close_frame('2024-01-01', '2024-03-29', 4000.0),
+              '^VIX': close_frame('2024-01-01', '2024-03-29', 15.0)}
+    end_date = str((pd.Timestamp.today() + pd.Timedelta(days=7)).date())
+    with FMPStubServer(frames) as stub:
+        cfg = market_data_cfg(tmp_path, stub.base_url, end_date=end_date)
+        assert not data_loader.load_and_prepare_market_data(cfg).empty
+    assert data_loader.load_market_data_store(cfg) is None
+
+
+def test_market_data_cached_only_once_the_cache_covers_the_window(tmp_path):
+    frames = {'^GSPC': close_frame('2024-01-01', '2024-03-29', 4000.0),
+              '^VIX': close_frame('2024-01-01', '2024-03-29', 15.0)}
+    with FMPStubServer(frames, fail_first=1) as stub:
+        cfg = market_data_cfg(tmp_path, stub.base_url)
+        assert not data_loader.market_data_cached(cfg)
+        data_loader.load_and_prepare_market_data(cfg)  # One symbol's request fails
+        assert not data_loader.market_data_cached(cfg)
+        data_loader.load_and_prepare_market_data(cfg)
+    assert data_loader.market_data_cached(cfg)
+    assert not data_loader.market_data_cached(types.SimpleNamespace(**{**vars(cfg), 'MARKET_DATA_CACHE_DIR': None}))
+
+
+def test_concurrent_store_writers_leave_one_complete_store(tmp_path):
+    path = tmp_path / 'store'
+    frames = [close_frame('2024-01-01', '2024-03-29', 100.0 * k) for k in range(1, 9)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda df: [write_columnar_store(df, path) for _ in range(5)], frames))
+    df = ColumnarStore(path).to_frame()
+    assert any(df['close'].tolist() == frame['close'].tolist() for frame in frames)
+    assert os.listdir(tmp_path) == ['store']  # no build or old directories left behind
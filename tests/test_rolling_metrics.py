@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import risk_metrics
+import rolling_metrics
+
+
+@pytest.fixture
+def values():
+    rng = np.random.default_rng(7)
+    return 100.0 * np.cumprod(1.0 + rng.normal(0.0, 0.01, 300))
+
+
+@pytest.mark.parametrize('min_periods', [None, 15])
+def test_rolling_volatility_skips_nan_returns_like_pandas(values, min_periods):
+    returns = risk_metrics.portfolio_returns_matrix(values, 100.0)[0]
+    returns[[3, 50, 51, 120]] = np.nan
+    expected = pd.Series(returns).rolling(21, min_periods=min_periods or 21).std() * np.sqrt(252)
+    np.testing.assert_allclose(rolling_metrics.rolling_volatility(returns, 21, 252, min_periods), expected,
+                               rtol=0, atol=1e-12)
+
+
+def test_nan_only_affects_windows_containing_it(values):
+    metrics = rolling_metrics.calculate_rolling_metrics(values, 21, 0.02, 0.0, 252)  # day 0 has no return
+    for name, series in metrics.items():
+        assert not np.isnan(series[21:]).any(), name
+    with_capital = rolling_metrics.calculate_rolling_metrics(values, 21, 0.02, 100.0, 252)
+    np.testing.assert_allclose(metrics["Rolling Volatility"][41:], with_capital["Rolling Volatility"][41:],
+                               rtol=1e-9)
+
+
+def test_rolling_max_drawdown_matches_brute_force(values):
+    values = values.copy()
+    values[[30, 200]] = np.nan
+    drawdown = rolling_metrics.rolling_max_drawdown(values, 10, 100.0, min_periods=5)
+    with_start = np.concatenate([[100.0], values])
+    assert np.isnan(drawdown[:4]).all()  # fewer than min_periods values
+    for end in range(5, len(with_start)):
+        window = with_start[max(0, end - 10):end + 1]
+        window = window[~np.isnan(window)]
+        assert drawdown[end - 1] == pytest.approx((window / np.maximum.accumulate(window) - 1).min(), abs=1e-12)
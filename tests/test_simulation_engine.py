@@ -0,0 +1,99 @@
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import simulation_engine
+from cfd_cost_model import TieredCostModel
+from event_simulation import DailyRebalance, simulate_portfolio_B_events
+
+TIERED_COSTS = {'lot_size': 1.0, 'broker_annual_financing_fee': 0.025, 'days_in_year_financing': 360,
+                'borrowing_cost_annual': 0.005, 'avg_spread_points': 0.5,
+                'margin_tiers': [{'limit': 5, 'rate': 0.05}, {'limit': 50, 'rate': 0.1}, {'limit': 1e9, 'rate': 0.2}]}
+
+
+def model_b_cfg(**overrides):
+    cfg = types.SimpleNamespace(EQUITY_ALLOC_B=0.8, MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM=0.5,
+                                CFD_INITIAL_MARGIN_PERCENT=0.1, BROKER_FEE_ANNUALIZED=0.02,
+                                SPREAD_COST_PERCENT=0.001, CFD_COST_MODEL='flat', CFD_TIERED_COSTS=TIERED_COSTS)
+    for name, value in overrides.items():
+        setattr(cfg, name, value)
+    cfg.CASH_ALLOC_B = 1.0 - cfg.EQUITY_ALLOC_B
+    return cfg
+
+
+def signal_frame(n_days=250, seed=0):
+    """Random walk market with frequent hedge signals, a missing SOFR day and a missing price day."""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.012, n_days)
+    prices = 3000.0 * np.cumprod(1.0 + returns)
+    df = pd.DataFrame({
+        'date': pd.bdate_range('2022-01-03', periods=n_days),
+        'SP500_Return': returns, 'S&P500': prices,
+        'SOFR_Rate': rng.uniform(0.0, 0.05, n_days),
+        'Short_Signal_Today': rng.random(n_days) < 0.15,
+        'Cover_Signal_Momentum_Today': rng.random(n_days) < 0.1,
+        'Cover_Signal_Absolute_VIX_Today': rng.random(n_days) < 0.05,
+    })
+    df.loc[7, 'SOFR_Rate'] = np.nan
+    df.loc[11, ['SP500_Return', 'S&P500']] = np.nan
+    return df
+
+
+SWEEP = pd.DataFrame({'MODEL_B_FIXED_HEDGE_RATIO_MOMENTUM': [0.25, 0.5, 1.0],
+                      'EQUITY_ALLOC_B': [0.6, 0.8, 0.7]})
+
+
+def test_batch_matches_array_engine_with_tiered_costs():
+    df, cfg = signal_frame(), model_b_cfg(CFD_COST_MODEL='tiered')
+    values = simulation_engine.simulate_portfolio_B_batch(df, 100_000.0, SWEEP, cfg)
+    for k, row in SWEEP.iterrows():
+        expected = simulation_engine.simulate_portfolio_B_momentum_arrays(df, 100_000.0, model_b_cfg(**row),
+                                                                          cost_model=TieredCostModel(TIERED_COSTS))
+        np.testing.assert_array_equal(values[k], expected.to_numpy())
+
+
+def test_batch_rejects_flat_cost_sweeps_under_tiered_costs():
+    params = SWEEP.assign(SPREAD_COST_PERCENT=[0.0, 0.001, 0.002])
+    with pytest.raises(ValueError, match='SPREAD_COST_PERCENT'):
+        simulation_engine.simulate_portfolio_B_batch(signal_frame(), 100_000.0, params,
+                                                     model_b_cfg(CFD_COST_MODEL='tiered'))
+
+
+@pytest.mark.parametrize('use_compiled', [False, True])
+def test_array_engine_matches_row_loop(use_compiled):
+    if use_compiled and simulation_engine._model_b_kernel_compiled is None:
+        pytest.skip('numba is not installed')
+    df, cfg = signal_frame(), model_b_cfg()
+    expected = simulation_engine.simulate_portfolio_B_momentum(df, 100_000.0, cfg)
+    values = simulation_engine.simulate_portfolio_B_momentum_arrays(df, 100_000.0, cfg, use_compiled=use_compiled)
+    np.testing.assert_array_equal(values.to_numpy(), expected.to_numpy())
+
+
+def test_batch_matches_row_loop_with_swept_flat_costs():
+    df, cfg = signal_frame(), model_b_cfg()
+    params = SWEEP.assign(CFD_INITIAL_MARGIN_PERCENT=[0.05, 0.1, 0.2], BROKER_FEE_ANNUALIZED=[0.0, 0.02, 0.04],
+                          SPREAD_COST_PERCENT=[0.0, 0.001, 0.003])
+    values = simulation_engine.simulate_portfolio_B_batch(df, 100_000.0, params, cfg)
+    for k, row in params.iterrows():
+        expected = simulation_engine.simulate_portfolio_B_momentum(df, 100_000.0, model_b_cfg(**row))
+        np.testing.assert_array_equal(values[k], expected.to_numpy())
+
+
+def test_stepped_simulator_resumes_from_checkpoint(tmp_path):
+    df, cfg = signal_frame(), model_b_cfg()
+    expected = simulation_engine.simulate_portfolio_B_momentum(df, 100_000.0, cfg)
+    simulator = simulation_engine.ModelBSimulator(100_000.0, cfg)
+    first = simulator.run(df.iloc[:120])
+    simulator.save_checkpoint(tmp_path / 'model_b.json')
+    rest = simulation_engine.ModelBSimulator.from_checkpoint(tmp_path / 'model_b.json').run(df.iloc[120:])
+    np.testing.assert_array_equal(pd.concat([first, rest]).to_numpy(), expected.to_numpy())
+
+
+def test_event_engine_with_daily_policy_matches_row_loop():
+    df, cfg = signal_frame(), model_b_cfg()
+    expected = simulation_engine.simulate_portfolio_B_momentum(df, 100_000.0, cfg)
+    result = simulate_portfolio_B_events(df, 100_000.0, cfg, policy=DailyRebalance())
+    np.testing.assert_allclose(result['values'].to_numpy(), expected.to_numpy(), rtol=1e-12, atol=0)
+    assert result['final_value'] == pytest.approx(expected.iloc[-1], rel=1e-12)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import risk_metrics
+from streaming_metrics import MetricsAccumulator
+
+
+def fat_tailed_values(n_days, seed):
+    rng = np.random.default_rng(seed)
+    return 100_000.0 * np.cumprod(1.0 + np.clip(rng.standard_t(3, n_days) * 0.01, -0.5, 0.5))
+
+
+def batch_metrics(values):
+    series = pd.Series(values)
+    return risk_metrics.calculate_metrics_summary("Portfolio", series, series.pct_change().fillna(0), 0.02,
+                                                  100_000.0, 252)
+
+
+def streamed_metrics(values, chunk=250):
+    accumulator = MetricsAccumulator(100_000.0, 0.02, 252)
+    for start in range(0, len(values), chunk):
+        accumulator.update(values[start:start + chunk])
+    return accumulator.metrics()
+
+
+@pytest.mark.parametrize('n_days, rtol', [(1_340, 1e-12), (20_000, 5e-3)])
+def test_tail_metrics_within_documented_error(n_days, rtol):
+    for seed in range(5):
+        values = fat_tailed_values(n_days, seed)
+        expected, metrics = batch_metrics(values), streamed_metrics(values)
+        assert metrics["Daily VaR 95%"] == pytest.approx(expected["Daily VaR 95%"], rel=rtol)
+        assert metrics["Daily CVaR 95%"] == pytest.approx(expected["Daily CVaR 95%"], rel=max(rtol / 50, 1e-12))
+
+
+def test_accumulator_matches_batch_metrics_across_merged_segments():
+    values = fat_tailed_values(1_340, seed=11)
+    expected = batch_metrics(values)
+    head = MetricsAccumulator(100_000.0, 0.02, 252).update(values[:600])
+    tail = MetricsAccumulator(head.last_value, 0.02, 252).update(values[600:])
+    metrics = head.merge(tail).metrics()
+    for name in risk_metrics.METRIC_NAMES:
+        assert metrics[name] == pytest.approx(expected[name], rel=1e-9, abs=1e-12), name